@@ -0,0 +1,185 @@
+# ==============================================
+# dcm_cli.py - headless DCM
+# ==============================================
+
+# Same storage, parameter and serial layers as the GUI, without Tk or matplotlib,
+# for scripts and bench machines with no display.
+#
+#   python dcm_cli.py list
+#   python dcm_cli.py validate [PATIENT_ID]
+#   python dcm_cli.py program PATIENT_ID MODE [--port COM5]
+#   python dcm_cli.py record PATIENT_ID SECONDS [--port COM7] [--publish 8765]
+#
+# Exit codes: 0 ok, 1 invalid / not found, 2 pacemaker not reachable
+
+import argparse
+import sys
+import threading
+from helper import storage, param_schema, packet_cache
+from helper.serial_comm import PacemakerSerial
+# the egram modules are only imported by "record"
+
+PROGRAM_PORT = "COM5"
+TELEMETRY_PORT = "COM7"
+BAUD = 115200
+
+
+def find_patient(patient_id):
+    for patient in storage.iter_patients():
+        if patient.get("id") == patient_id:
+            return patient
+    return None
+
+
+def patient_modes(patient):
+    return patient.get("device", {}).get("modes", {})
+
+
+# -----------------------------
+# list / validate
+# -----------------------------
+def list_patients(args):
+    count = 0
+    for patient in storage.iter_patients():
+        device = patient.get("device", {})
+        modes = ", ".join(patient_modes(patient)) or "-"
+        print(f"{patient.get('id', ''):<8} {patient.get('name', ''):<20} "
+              f"{device.get('model', ''):<10} {device.get('serial', ''):<10} {modes}")
+        count += 1
+    print(f"{count} patient(s)")
+    return 0
+
+
+def validate_patients(args):
+    if args.patient_id:
+        patient = find_patient(args.patient_id)
+        if patient is None:
+            print(f"Patient {args.patient_id} not found")
+            return 1
+        patients = [patient]
+    else:
+        patients = storage.iter_patients()
+
+    invalid = 0
+    for patient in patients:
+        for mode, mode_data in patient_modes(patient).items():
+            errors = param_schema.validate(mode_data.get("parameters", {}))
+            if errors:
+                invalid += 1
+                print(f"{patient.get('id')} {mode}:")
+                for error in errors:
+                    print(f"  {error['message']}")
+    print("All parameters valid" if not invalid else f"{invalid} invalid parameter set(s)")
+    return 1 if invalid else 0
+
+
+# -----------------------------
+# program
+# -----------------------------
+def program_device(args):
+    patient = find_patient(args.patient_id)
+    if patient is None:
+        print(f"Patient {args.patient_id} not found")
+        return 1
+    if args.mode not in patient_modes(patient):
+        print(f"Patient {args.patient_id} has no {args.mode} parameters stored")
+        return 1
+
+    errors = param_schema.validate(patient_modes(patient)[args.mode].get("parameters", {}))
+    if errors:
+        for error in errors:
+            print(f"  {error['message']}")
+        return 1
+
+    packet = packet_cache.packet_for(patient, args.mode)
+    link = PacemakerSerial(port=args.port, baud=args.baud)
+    if not link.connect():
+        return 2
+    try:
+        link.write_packet(packet)
+    finally:
+        link.close()
+    print(f"Programmed {args.mode} for {args.patient_id}: {list(packet)}")
+    return 0
+
+
+# -----------------------------
+# record
+# -----------------------------
+def record_session(link, patient_id, seconds, settings=None, publisher=None):
+    # runs the GUI's DevicePipeline (egram/device_supervisor.py) on this thread
+    # for the given time, on an open PacemakerSerial: same framing, stamping,
+    # beat detection and flushing as the GUI. Returns the finished session's
+    # metadata; publisher (a TelemetryServer) gets every stamped payload
+    from egram.device_supervisor import DevicePipeline
+
+    pipeline = DevicePipeline(patient_id, link.port, patient_id, baud=link.baud, settings=settings,
+                              publisher=publisher, transport=link)
+    timer = threading.Timer(seconds, pipeline.stop_event.set)
+    timer.start()
+    try:
+        pipeline.run()
+    finally:
+        timer.cancel()
+    if pipeline.session is None:
+        raise RuntimeError(f"Telemetry on {link.port} could not be read")
+    return dict(pipeline.session.refresh().meta(), packets_received=pipeline.counts["packets"])
+
+
+def record_telemetry(args):
+    patient = find_patient(args.patient_id)
+    if patient is None:
+        print(f"Patient {args.patient_id} not found")
+        return 1
+
+    publisher = None
+    if args.publish is not None:
+        from egram.telemetry_server import TelemetryServer
+        publisher = TelemetryServer(port=args.publish)
+        publisher.start()
+
+    link = PacemakerSerial(port=args.port, baud=args.baud)
+    if not link.connect():
+        return 2
+    try:
+        session = record_session(link, args.patient_id, args.seconds,
+                                 {"patient_name": patient.get("name", "")}, publisher)
+    finally:
+        link.close()
+        if publisher:
+            publisher.stop()
+    print(f"Recorded {session['packets_received']} packet(s) to {session['session_id']}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless Pacemaker DCM")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sub.add_parser("list", help="list stored patients").set_defaults(run=list_patients)
+
+    val = sub.add_parser("validate", help="validate stored parameters")
+    val.add_argument("patient_id", nargs="?")
+    val.set_defaults(run=validate_patients)
+
+    prog = sub.add_parser("program", help="send a stored mode's parameters to the pacemaker")
+    prog.add_argument("patient_id")
+    prog.add_argument("mode", choices=param_schema.MODES)
+    prog.add_argument("--port", default=PROGRAM_PORT)
+    prog.add_argument("--baud", type=int, default=BAUD)
+    prog.set_defaults(run=program_device)
+
+    rec = sub.add_parser("record", help="record egram telemetry to a new session")
+    rec.add_argument("patient_id")
+    rec.add_argument("seconds", type=float)
+    rec.add_argument("--port", default=TELEMETRY_PORT)
+    rec.add_argument("--baud", type=int, default=BAUD)
+    rec.add_argument("--publish", type=int, metavar="PORT", help="fan live telemetry out on this local TCP port")
+    rec.set_defaults(run=record_telemetry)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,298 @@
+# -----------------------------------------------------------------------------
+# ACQUISITION PROCESS
+# runs a DevicePipeline (serial port -> framer -> decoder -> session writer) in
+# a child process of its own, so matplotlib redraws and everything else in the
+# GUI process can no longer hold the GIL while the port is being read.
+#
+# Decoded samples are published into a multiprocessing.shared_memory ring:
+#   header  int64[HEADER_SIZE]        see HEADER_FIELDS
+#   data    float64[channel][capacity][2]   (t ms, value mV)
+# The child is the only writer. Like a seqlock, every write first raises the
+# channel's "writing" counter to the sequence number it will end at, then
+# fills the slots, then bumps the channel's sequence counter. A reader that
+# sees seq N can trust every slot below N, except the ones a write started
+# since may be overwriting, which read_since() drops by checking the writing
+# counter after copying. The GUI maps the ring read-only.
+# Markers go through a bounded queue and the session the child opened is
+# handed back once through another, so Review works as with DevicePipeline.
+# -----------------------------------------------------------------------------
+
+import multiprocessing as mp
+import queue
+import time
+from collections import deque
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from egram.device_supervisor import DevicePipeline, CHANNELS, BAUD
+from egram.beat_detector import BEAT_ABBR
+from egram.egram_storage import SessionHandle
+
+# samples kept per channel (60 s at 500 Hz)
+RING_CAPACITY = 30000
+
+# live markers waiting for the GUI; more are dropped (the session keeps them all)
+MARKER_QUEUE_SIZE = 200
+
+# heart rates are kept in tenths of a bpm, 0 = no rate
+HEADER_FIELDS = ["capacity", "status", "packets", "heartbeat_ms", "writer_pid",
+                 "seq_atrial", "seq_ventricular", "seq_surface",
+                 "hr_atrial", "hr_ventricular",
+                 "writing_atrial", "writing_ventricular", "writing_surface"]
+HEADER_SIZE = len(HEADER_FIELDS)
+FIELD = {name: i for i, name in enumerate(HEADER_FIELDS)}
+SEQ = {channel: FIELD["seq_" + channel] for channel in CHANNELS}
+WRITING = {channel: FIELD["writing_" + channel] for channel in CHANNELS}
+
+STATUSES = ["idle", "connecting", "connected", "reconnecting", "stopped"]
+STATUS_CODES = {status: i for i, status in enumerate(STATUSES)}
+
+
+# -----------------------------------------------------------------------------
+# the shared ring
+# -----------------------------------------------------------------------------
+class SampleRing:
+    def __init__(self, shm, readonly=False):
+        self.shm = shm
+        self.name = shm.name
+        self.header = np.ndarray((HEADER_SIZE,), dtype=np.int64, buffer=shm.buf)
+        capacity = int(self.header[FIELD["capacity"]])
+        self.capacity = capacity
+        self.data = np.ndarray((len(CHANNELS), capacity, 2), dtype=np.float64,
+                               buffer=shm.buf, offset=self.header.nbytes)
+        if readonly:
+            self.header.flags.writeable = False
+            self.data.flags.writeable = False
+
+    @classmethod
+    def create(cls, capacity=RING_CAPACITY):
+        size = HEADER_SIZE * 8 + len(CHANNELS) * capacity * 2 * 8
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        header = np.ndarray((HEADER_SIZE,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[FIELD["capacity"]] = capacity
+        del header
+        return cls(shm)
+
+    @classmethod
+    def attach(cls, name, readonly=True):
+        return cls(shared_memory.SharedMemory(name=name), readonly=readonly)
+
+    def close(self):
+        # numpy views must go before the mapping can be closed
+        self.header = self.data = None
+        self.shm.close()
+
+    def unlink(self):
+        self.shm.unlink()
+
+    # -------------------------------------------------------------------------
+    # writer side (acquisition process only)
+    # -------------------------------------------------------------------------
+    def write(self, channel, samples):
+        if not samples:
+            return
+        row = CHANNELS.index(channel)
+        seq = int(self.header[SEQ[channel]])
+        block = np.array([(s["t"], s["value"]) for s in samples], dtype=np.float64)[-self.capacity:]
+        start = (seq + len(samples) - len(block)) % self.capacity
+        first = min(len(block), self.capacity - start)
+        self.header[WRITING[channel]] = seq + len(samples)
+        self.data[row, start:start + first] = block[:first]
+        self.data[row, :len(block) - first] = block[first:]
+        self.header[SEQ[channel]] = seq + len(samples)
+
+    def set(self, field, value):
+        self.header[FIELD[field]] = value
+
+    def get(self, field):
+        return int(self.header[FIELD[field]])
+
+    # publisher interface used by DevicePipeline (same as TelemetryServer)
+    def publish_payload(self, payload):
+        for channel in CHANNELS:
+            self.write(channel, payload.get(channel, []))
+        self.header[FIELD["packets"]] += 1
+        self.header[FIELD["heartbeat_ms"]] = int(time.time() * 1000)
+        for channel, rate in payload.get("heart_rate", {}).items():
+            self.header[FIELD["hr_" + channel]] = round((rate or 0) * 10)
+
+    def publish_status(self, status):
+        self.set("status", STATUS_CODES.get(status, 0))
+
+    # -------------------------------------------------------------------------
+    # reader side
+    # -------------------------------------------------------------------------
+    def seq(self, channel):
+        return int(self.header[SEQ[channel]])
+
+    def read_since(self, channel, since):
+        # returns (seq, array of (t, value) rows written after `since`); samples
+        # the writer has overwritten, or is overwriting, are skipped, never
+        # returned torn
+        row = CHANNELS.index(channel)
+        seq = self.seq(channel)
+        start = max(since, seq - self.capacity)
+        if start >= seq:
+            return seq, np.empty((0, 2))
+        idx = np.arange(start, seq) % self.capacity
+        block = self.data[row, idx].copy()
+
+        # slots below (writing - capacity) were or are being overwritten,
+        # whether by a write that finished or one still in progress
+        lapped = int(self.header[WRITING[channel]]) - self.capacity - start
+        if lapped > 0:
+            block = block[lapped:]
+        return seq, block
+
+
+# -----------------------------------------------------------------------------
+# child process
+# -----------------------------------------------------------------------------
+def run_acquisition(ring_name, stop_event, marker_queue, session_queue, device_id, port, patient_id, baud, settings):
+    ring = SampleRing.attach(ring_name, readonly=False)
+    ring.set("writer_pid", mp.current_process().pid)
+    # the GUI only drains markers of the selected device: never wait on it at exit
+    marker_queue.cancel_join_thread()
+
+    class Publisher:
+        # samples go to the ring; markers are rare and go through a queue
+        session_sent = False
+
+        def publish_payload(self, payload):
+            ring.publish_payload(payload)
+            for marker in payload.get("markers", []):
+                try:
+                    marker_queue.put_nowait(marker)
+                except queue.Full:
+                    break
+
+        def publish_status(self, status):
+            ring.publish_status(status)
+            if status == "connected" and not self.session_sent:
+                # the session is opened (or resumed) on the first connect
+                session = pipeline.session
+                session_queue.put({"session_id": session.session_id, "patient_id": session.patient_id,
+                                   "start_time": session.start_time, "settings": session.settings})
+                self.session_sent = True
+
+    pipeline = DevicePipeline(device_id, port, patient_id, baud=baud, settings=settings, publisher=Publisher())
+    pipeline.stop_event = stop_event
+    try:
+        pipeline.run()
+    finally:
+        ring.publish_status("stopped")
+        ring.close()
+
+
+# -----------------------------------------------------------------------------
+# GUI side handle (same reading interface as DevicePipeline)
+# -----------------------------------------------------------------------------
+class AcquisitionProcess:
+    def __init__(self, device_id, port, patient_id, baud=BAUD, settings=None, capacity=RING_CAPACITY):
+        self.device_id = device_id
+        self.port = port
+        self.patient_id = patient_id
+        self.baud = baud
+        self.settings = settings or {}
+        self.capacity = capacity
+        self.context = mp.get_context("spawn")   # never fork a process that runs Tk
+        self.process = None
+        self.ring = None
+        self.view = None
+        self.stop_event = None
+        self.marker_queue = None
+        self.session_queue = None
+        self.session_handle = None
+        self.markers = deque(maxlen=200)
+        self.marker_count = 0
+
+    def start(self):
+        if self.is_running():
+            if not self.stop_event.is_set():
+                return
+            # stop(wait=False) was called: let the child finish its session first
+            self.process.join()
+        self.close_ring()
+        self.ring = SampleRing.create(self.capacity)
+        self.view = SampleRing.attach(self.ring.name)
+        self.stop_event = self.context.Event()
+        self.marker_queue = self.context.Queue(MARKER_QUEUE_SIZE)
+        self.session_queue = self.context.Queue()
+        self.session_handle = None
+        self.process = self.context.Process(
+            target=run_acquisition, name=f"acquisition-{self.device_id}", daemon=True,
+            args=(self.ring.name, self.stop_event, self.marker_queue, self.session_queue, self.device_id,
+                  self.port, self.patient_id, self.baud, self.settings))
+        self.process.start()
+
+    def stop(self, wait=True):
+        if self.stop_event is not None:
+            self.stop_event.set()
+        if wait and self.process is not None:
+            self.process.join(timeout=10)
+            if self.process.is_alive():
+                self.process.terminate()
+                self.process.join()
+            self.close_ring()
+
+    def is_running(self):
+        return self.process is not None and self.process.is_alive()
+
+    def close_ring(self):
+        # the ring outlives the child so the last samples stay readable
+        if self.view is not None:
+            self.view.close()
+            self.view = None
+        if self.ring is not None:
+            self.ring.close()
+            self.ring.unlink()
+            self.ring = None
+
+    @property
+    def session(self):
+        # SessionHandle of the child's session once it has connected, as on DevicePipeline
+        if self.session_handle is None and self.session_queue is not None:
+            try:
+                self.session_handle = SessionHandle.from_entry(self.session_queue.get_nowait())
+            except queue.Empty:
+                pass
+        return self.session_handle
+
+    @property
+    def status(self):
+        if self.view is None:
+            return "idle"
+        return STATUSES[self.view.get("status")]
+
+    def samples_since(self, channel, count):
+        if self.view is None:
+            return count, []
+        seq, block = self.view.read_since(channel, count)
+        return seq, [{"t": int(t), "value": float(value)} for t, value in block]
+
+    def heart_rates(self):
+        if self.view is None:
+            return {}
+        return {channel: self.view.get("hr_" + channel) / 10 or None for channel in BEAT_ABBR}
+
+    def markers_since(self, count):
+        while self.marker_queue is not None:
+            try:
+                self.markers.append(self.marker_queue.get_nowait())
+            except queue.Empty:
+                break
+            self.marker_count += 1
+        new = min(self.marker_count - count, len(self.markers))
+        return self.marker_count, list(self.markers)[-new:] if new > 0 else []
+
+    def stats(self):
+        stats = {"device_id": self.device_id, "port": self.port, "patient_id": self.patient_id,
+                 "status": self.status, "process": "acquisition"}
+        if self.view is not None:
+            stats["packets"] = self.view.get("packets")
+            stats["heartbeat_ms"] = self.view.get("heartbeat_ms")
+            stats["pid"] = self.view.get("writer_pid")
+            stats.update({"seq_" + channel: self.view.seq(channel) for channel in CHANNELS})
+        return stats
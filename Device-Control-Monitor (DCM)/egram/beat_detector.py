@@ -0,0 +1,152 @@
+# -----------------------------------------------------------------------------
+# BEAT DETECTOR
+# streaming Pan-Tompkins style detection of sensed beats on one egram channel
+# plus a rolling heart rate, fed with sample batches as they arrive:
+#   band-pass 5-15 Hz -> derivative -> square -> 150 ms moving integration
+#   -> peaks above an adaptive threshold (signal / noise peak levels)
+# Every stage keeps its own few values of state, so each sample costs the
+# same however long the recording runs, and results don't depend on how the
+# samples were split into batches. Refractory period and RR intervals are
+# counted in samples at the session's sampling rate; packet timestamps are
+# only used to stamp the beats.
+# -----------------------------------------------------------------------------
+
+import math
+from collections import deque
+
+# marker abbreviation of a detected beat per channel (R wave / P wave)
+BEAT_ABBR = {"ventricular": "R", "atrial": "P"}
+
+LOW_HZ = 5.0
+HIGH_HZ = 15.0
+WINDOW_MS = 150
+REFRACTORY_MS = 200
+LEARN_MS = 2000
+RR_BEATS = 8
+MAX_RR_MS = 3000        # a longer gap restarts the rate average
+
+
+# -----------------------------------------------------------------------------
+# second order IIR sections (RBJ cookbook, transposed direct form II)
+# -----------------------------------------------------------------------------
+class Biquad:
+    def __init__(self, b, a):
+        self.b0, self.b1, self.b2 = (c / a[0] for c in b)
+        self.a1, self.a2 = a[1] / a[0], a[2] / a[0]
+        self.z1 = self.z2 = 0.0
+
+    def step(self, x):
+        y = self.b0 * x + self.z1
+        self.z1 = self.b1 * x - self.a1 * y + self.z2
+        self.z2 = self.b2 * x - self.a2 * y
+        return y
+
+
+def highpass(fs, f0, q=math.sqrt(0.5)):
+    w = 2 * math.pi * f0 / fs
+    alpha, cos_w = math.sin(w) / (2 * q), math.cos(w)
+    return Biquad([(1 + cos_w) / 2, -(1 + cos_w), (1 + cos_w) / 2], [1 + alpha, -2 * cos_w, 1 - alpha])
+
+
+def lowpass(fs, f0, q=math.sqrt(0.5)):
+    w = 2 * math.pi * f0 / fs
+    alpha, cos_w = math.sin(w) / (2 * q), math.cos(w)
+    return Biquad([(1 - cos_w) / 2, 1 - cos_w, (1 - cos_w) / 2], [1 + alpha, -2 * cos_w, 1 - alpha])
+
+
+# -----------------------------------------------------------------------------
+# one channel
+# -----------------------------------------------------------------------------
+class BeatDetector:
+    def __init__(self, channel, fs=500):
+        self.channel = channel
+        self.fs = fs
+        self.filters = [highpass(fs, LOW_HZ), lowpass(fs, HIGH_HZ)]
+        self.recent = deque([0.0] * 4, maxlen=4)           # band-passed x[n-1..n-4]
+
+        self.window = deque(maxlen=max(1, int(WINDOW_MS * fs / 1000)))
+        self.window_sum = 0.0
+        self.before = self.last = 0.0                      # integrated y[n-2], y[n-1]
+
+        # the integrated peak lags the QRS by about a third of the window
+        self.times = deque(maxlen=self.window.maxlen // 3 + 2)
+        self.n = 0
+
+        self.learn_samples = int(LEARN_MS * fs / 1000)
+        self.learn_max = 0.0
+        self.learn_sum = 0.0
+        self.spki = self.npki = self.threshold = 0.0
+
+        self.refractory = int(REFRACTORY_MS * fs / 1000)
+        self.last_beat = None
+        self.rr = deque(maxlen=RR_BEATS)
+        self.heart_rate = None
+
+    def current_rate(self):
+        # rolling rate in bpm, None before two beats or after MAX_RR_MS without one
+        if self.last_beat is None or (self.n - self.last_beat) * 1000 / self.fs > MAX_RR_MS:
+            return None
+        return self.heart_rate
+
+    def process(self, samples):
+        # samples: [{"t": ms, "value": mV}, ...]; returns the beats found in them
+        beats = []
+        for sample in samples:
+            beat = self.step(sample.get("t", 0), sample.get("value"))
+            if beat:
+                beats.append(beat)
+        return beats
+
+    def step(self, t, value):
+        x = 0.0 if value is None or value != value else float(value)
+        for f in self.filters:
+            x = f.step(x)
+
+        r = self.recent
+        slope = (2 * x + r[0] - r[2] - 2 * r[3]) / 8        # r[0] = x[n-1] ... r[3] = x[n-4]
+        r.appendleft(x)
+
+        squared = slope * slope
+        if len(self.window) == self.window.maxlen:
+            self.window_sum -= self.window[0]
+        self.window.append(squared)
+        self.window_sum += squared
+        y = self.window_sum / self.window.maxlen
+
+        self.times.append(t)
+        self.n += 1
+        beat = None
+        if self.n <= self.learn_samples:
+            self.learn_max = max(self.learn_max, y)
+            self.learn_sum += y
+            if self.n == self.learn_samples:
+                self.spki = 0.25 * self.learn_max
+                self.npki = 0.5 * self.learn_sum / self.learn_samples
+                self.threshold = self.npki + 0.25 * (self.spki - self.npki)
+        elif self.last > self.before and self.last >= y:
+            beat = self.peak(self.last, self.n - 1, self.times[0])
+
+        self.before, self.last = self.last, y
+        return beat
+
+    def peak(self, level, n, t):
+        if level > self.threshold and (self.last_beat is None or n - self.last_beat >= self.refractory):
+            if self.last_beat is not None:
+                rr_ms = (n - self.last_beat) * 1000 / self.fs
+                if rr_ms > MAX_RR_MS:
+                    self.rr.clear()
+                else:
+                    self.rr.append(rr_ms)
+            self.last_beat = n
+            self.heart_rate = 60000 / (sum(self.rr) / len(self.rr)) if self.rr else None
+            self.spki = 0.125 * level + 0.875 * self.spki
+            beat = {"channel": self.channel, "abbr": BEAT_ABBR.get(self.channel, "B"), "timestamp_ms": t,
+                    "source": "detector",
+                    "heart_rate_bpm": round(self.heart_rate, 1) if self.heart_rate else None}
+        else:
+            if self.last_beat is not None and n - self.last_beat < self.refractory:
+                return None     # the tail of the last QRS, or a T wave
+            self.npki = 0.125 * level + 0.875 * self.npki
+            beat = None
+        self.threshold = self.npki + 0.25 * (self.spki - self.npki)
+        return beat
@@ -0,0 +1,95 @@
+# -----------------------------------------------------------------------------
+# COLUMN FILES
+# fixed-width binary columns opened with numpy.memmap, so a recorded session
+# can be replayed without json.load-ing the egram database or building a dict
+# per sample. Opening is constant time and a time range is a zero-copy slice.
+#
+# File layout:
+#   magic "EGCOL" | version u8 | pad u16 | header length u32 | header JSON
+#   (padded to ALIGN) | column 0 | column 1 | ...   every column ALIGN aligned
+# header JSON: {"count": n, "columns": [[name, numpy dtype str], ...], "meta": {}}
+# -----------------------------------------------------------------------------
+
+import json
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"EGCOL"
+VERSION = 1
+PREFIX = struct.Struct("<5sBxxI")
+ALIGN = 64
+
+SAMPLE_COLUMNS = [("t", "<i8"), ("value", "<f4")]
+
+
+def aligned(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+
+# -----------------------------------------------------------------------------
+# writing (whole file at once, swapped in so readers never see half a file)
+# -----------------------------------------------------------------------------
+def write_columns(path, columns, dtypes, meta=None):
+    # columns: {name: sequence}, dtypes: [(name, dtype str), ...] in file order
+    arrays = [np.ascontiguousarray(columns[name], dtype=dtype) for name, dtype in dtypes]
+    count = len(arrays[0]) if arrays else 0
+    if any(len(a) != count for a in arrays):
+        raise ValueError("columns must all have the same length")
+
+    header = json.dumps({"count": count, "columns": [list(d) for d in dtypes], "meta": meta or {}}).encode("utf-8")
+    os.makedirs(os.path.dirname(os.fspath(path)) or ".", exist_ok=True)
+    tmp_path = os.fspath(path) + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(PREFIX.pack(MAGIC, VERSION, len(header)))
+        f.write(header)
+        for array in arrays:
+            f.write(b"\0" * (aligned(f.tell()) - f.tell()))
+            f.write(array.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return path
+
+
+def write_samples(path, samples, meta=None):
+    # samples: [{"t": ms, "value": mV}, ...] as kept in egram.json
+    return write_columns(path, {
+        "t": [s.get("t", 0) for s in samples],
+        "value": [np.nan if s.get("value") is None else s["value"] for s in samples],
+    }, SAMPLE_COLUMNS, meta)
+
+
+# -----------------------------------------------------------------------------
+# reading
+# -----------------------------------------------------------------------------
+def read_header(path):
+    with open(path, "rb") as f:
+        magic, version, length = PREFIX.unpack(f.read(PREFIX.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a column file")
+        return json.loads(f.read(length).decode("utf-8")), PREFIX.size + length
+
+
+def open_columns(path):
+    # returns (read-only memmaps {name: array}, meta); nothing is read yet
+    header, offset = read_header(path)
+    count = header["count"]
+    columns = {}
+    for name, dtype in header["columns"]:
+        offset = aligned(offset)
+        if count:
+            columns[name] = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+        else:
+            columns[name] = np.empty(0, dtype=dtype)     # mmap can't map zero bytes
+        offset += count * np.dtype(dtype).itemsize
+    return columns, header["meta"]
+
+
+def time_slice(columns, t_start=None, t_end=None, key="t"):
+    # views of every column for t_start <= t < t_end (column `key` must be sorted)
+    t = columns[key]
+    lo = 0 if t_start is None else int(np.searchsorted(t, t_start, side="left"))
+    hi = len(t) if t_end is None else int(np.searchsorted(t, t_end, side="left"))
+    return {name: column[lo:hi] for name, column in columns.items()}
@@ -0,0 +1,293 @@
+# -----------------------------------------------------------------------------
+# DEVICE SUPERVISOR
+# one DCM process monitoring several pacemakers at once (bench / test lab).
+# Every device gets its own pipeline on its own thread:
+#   transport (PacemakerSerial) -> framer -> decoder -> beat detectors -> session writer
+# plus a small live window the GUI can render from. Detected beats join the
+# device's markers (live and in the session) and give a live heart rate. The supervisor starts,
+# stops and reconnects pipelines, and the GUI switches between live devices
+# by selecting one - intake of the others keeps running.
+# -----------------------------------------------------------------------------
+
+import threading
+import time
+from collections import deque
+from helper import metrics
+from helper.serial_comm import PacemakerSerial
+from egram import egram_storage
+from egram.beat_detector import BeatDetector, BEAT_ABBR
+from egram.egram_utils import PacketFramer, parse_egram_packet, EGRAM_PACKET_SIZE
+
+BAUD = 115200
+
+# seconds between reconnect attempts when a port is missing / unplugged
+RECONNECT_SECONDS = 2.0
+
+# samples are written to the session once per this many seconds
+FLUSH_SECONDS = 1.0
+
+# live samples kept per channel for the GUI (10 s at 500 Hz)
+LIVE_SAMPLES = 5000
+
+CHANNELS = ["atrial", "ventricular", "surface"]
+
+
+# -----------------------------------------------------------------------------
+# one device
+# -----------------------------------------------------------------------------
+class DevicePipeline:
+    def __init__(self, device_id, port, patient_id, baud=BAUD, settings=None, publisher=None, transport=None):
+        self.device_id = device_id
+        self.port = port
+        self.patient_id = patient_id
+        self.settings = settings or {}
+        self.publisher = publisher
+        self.transport = transport or PacemakerSerial(port=port, baud=baud)
+        self.framer = PacketFramer(EGRAM_PACKET_SIZE)
+
+        self.session = None
+        self.status = "idle"
+        self.started = None
+        self.thread = None
+        self.stop_event = threading.Event()
+
+        # live window: per channel a deque of samples and the count ever added
+        self.lock = threading.Lock()
+        self.live = {channel: deque(maxlen=LIVE_SAMPLES) for channel in CHANNELS}
+        self.live_count = {channel: 0 for channel in CHANNELS}
+        self.markers = deque(maxlen=200)
+        self.marker_count = 0
+        self.pending = {channel: [] for channel in CHANNELS}
+        self.pending_markers = []
+        self.last_flush = 0.0
+
+        # one detector per channel with beats (see beat_detector.BEAT_ABBR)
+        fs = self.settings.get("sampling_rate_hz", 500)
+        self.detectors = {channel: BeatDetector(channel, fs) for channel in BEAT_ABBR}
+
+        self.metric = f"device.{device_id}."
+        self.counts = {"packets": 0, "bytes": 0, "reconnects": 0, "flushes": 0}
+
+    # -------------------------------------------------------------------------
+    # start / stop
+    # -------------------------------------------------------------------------
+    def start(self):
+        if self.is_running():
+            if not self.stop_event.is_set():
+                return
+            # stop(wait=False) was called: let the last run finish its session first
+            self.thread.join()
+        # the last run finished its session; connect() opens the next one
+        self.session = None
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name=f"device-{self.device_id}", daemon=True)
+        self.thread.start()
+
+    def stop(self, wait=True):
+        self.stop_event.set()
+        if wait and self.thread:
+            self.thread.join(timeout=5)
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def set_status(self, status):
+        self.status = status
+        metrics.set_gauge(self.metric + "status", status)
+        if self.publisher:
+            self.publisher.publish_status(status)
+
+    # -------------------------------------------------------------------------
+    # intake thread
+    # -------------------------------------------------------------------------
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                ser = self.transport.ser
+                if ser is None or not ser.is_open or self.session is None:
+                    if not self.connect():
+                        self.stop_event.wait(RECONNECT_SECONDS)
+                    continue
+                try:
+                    data = ser.read(max(1, ser.in_waiting))
+                except Exception as e:
+                    print(f"[DEVICE {self.device_id}] read failed:", e)
+                    self.transport.close()
+                    self.transport.ser = None
+                    self.set_status("reconnecting")
+                    continue
+                if data:
+                    self.counts["bytes"] += len(data)
+                    metrics.increment(self.metric + "bytes", len(data))
+                    for packet in self.framer.feed(data):
+                        self.handle_packet(packet)
+                if time.monotonic() - self.last_flush >= FLUSH_SECONDS:
+                    self.flush()
+        finally:
+            self.finish()
+
+    def connect(self):
+        # a transport handed in already open (e.g. a test loop://) is used as is
+        ser = self.transport.ser
+        if ser is None or not ser.is_open:
+            self.set_status("connecting")
+            if not self.transport.connect():
+                self.counts["reconnects"] += 1
+                metrics.increment(self.metric + "connect_failures")
+                self.set_status("reconnecting")
+                return False
+
+        if self.session is None:
+            # an unfinished session of this patient (e.g. after a crash) is resumed
+            self.session = egram_storage.get_or_start_session(self.patient_id, dict(self.settings, device_id=self.device_id))
+            self.started = time.monotonic() - self.session.elapsed_seconds()
+            self.last_flush = time.monotonic()
+        self.session.set_telemetry("connected")
+        self.set_status("connected")
+        return True
+
+    def handle_packet(self, packet):
+        payload = parse_egram_packet(packet, debug=False)
+        if payload is None:
+            metrics.increment(self.metric + "decode_errors")
+            return
+        self.counts["packets"] += 1
+        metrics.increment(self.metric + "packets")
+
+        # stamp samples with ms since the session started
+        t = int((time.monotonic() - self.started) * 1000)
+        stamped = {channel: [{"t": t, "value": sample["value"]} for sample in payload.get(channel, [])]
+                   for channel in CHANNELS}
+        beats = []
+        for channel, detector in self.detectors.items():
+            beats.extend(detector.process(stamped[channel]))
+        stamped["markers"] = payload.get("markers", []) + beats
+        stamped["heart_rate"] = self.heart_rates()
+        with self.lock:
+            for channel in CHANNELS:
+                self.live[channel].extend(stamped[channel])
+                self.live_count[channel] += len(stamped[channel])
+                self.pending[channel].extend(stamped[channel])
+            self.markers.extend(stamped["markers"])
+            self.marker_count += len(stamped["markers"])
+            self.pending_markers.extend(stamped["markers"])
+        if self.publisher:
+            self.publisher.publish_payload(stamped)
+
+    def flush(self):
+        if self.session is None:
+            return
+        with self.lock:
+            pending = {channel: samples for channel, samples in self.pending.items() if samples}
+            self.pending = {channel: [] for channel in CHANNELS}
+            markers, self.pending_markers = self.pending_markers, []
+        started = time.perf_counter()
+        for channel, samples in pending.items():
+            self.session.add_samples(channel, samples)
+        if markers:
+            self.session.add_markers(markers)
+        self.last_flush = time.monotonic()
+        if pending:
+            self.counts["flushes"] += 1
+            metrics.observe(self.metric + "flush_ms", (time.perf_counter() - started) * 1000)
+
+    def finish(self):
+        try:
+            self.flush()
+            if self.session is not None:
+                self.session.set_telemetry("disconnected")
+                self.session.finish()
+        finally:
+            self.transport.close()
+            self.set_status("stopped")
+
+    # -------------------------------------------------------------------------
+    # reading the live window (any thread, e.g. the Tk loop)
+    # -------------------------------------------------------------------------
+    def samples_since(self, channel, count):
+        # returns (new count, samples added after `count` that are still in the window)
+        with self.lock:
+            total = self.live_count[channel]
+            new = min(total - count, len(self.live[channel]))
+            samples = list(self.live[channel])[-new:] if new > 0 else []
+            return total, samples
+
+    def markers_since(self, count):
+        with self.lock:
+            new = min(self.marker_count - count, len(self.markers))
+            return self.marker_count, list(self.markers)[-new:] if new > 0 else []
+
+    def heart_rates(self):
+        # {channel: bpm or None} from the beat detectors
+        return {channel: detector.current_rate() for channel, detector in self.detectors.items()}
+
+    def stats(self):
+        return dict(self.counts, device_id=self.device_id, port=self.port, patient_id=self.patient_id,
+                    status=self.status, skipped_bytes=self.framer.skipped,
+                    session_id=self.session.session_id if self.session else None)
+
+
+# -----------------------------------------------------------------------------
+# all devices of this DCM
+# -----------------------------------------------------------------------------
+class DeviceSupervisor:
+    def __init__(self, publisher=None):
+        self.publisher = publisher
+        self.pipelines = {}
+        self.selected_id = None
+        self.lock = threading.Lock()
+
+    def add_device(self, device_id, port, patient_id, process=False, **options):
+        # process=True runs the pipeline in its own acquisition process
+        # (egram/acquisition.py) and reads it back through shared memory
+        with self.lock:
+            if device_id in self.pipelines:
+                raise ValueError(f"Device {device_id} is already being monitored")
+            if process:
+                from egram.acquisition import AcquisitionProcess
+                pipeline = AcquisitionProcess(device_id, port, patient_id, **options)
+            else:
+                options.setdefault("publisher", self.publisher)
+                pipeline = DevicePipeline(device_id, port, patient_id, **options)
+            self.pipelines[device_id] = pipeline
+            if self.selected_id is None:
+                self.selected_id = device_id
+        metrics.set_gauge("devices.count", len(self.pipelines))
+        return pipeline
+
+    def get(self, device_id):
+        return self.pipelines.get(device_id)
+
+    def device_ids(self):
+        return list(self.pipelines)
+
+    def start(self, device_id):
+        self.pipelines[device_id].start()
+
+    def stop(self, device_id, wait=True):
+        self.pipelines[device_id].stop(wait)
+
+    def remove(self, device_id):
+        self.stop(device_id)
+        with self.lock:
+            del self.pipelines[device_id]
+            if self.selected_id == device_id:
+                self.selected_id = next(iter(self.pipelines), None)
+        metrics.set_gauge("devices.count", len(self.pipelines))
+
+    def select(self, device_id):
+        if device_id not in self.pipelines:
+            raise KeyError(device_id)
+        self.selected_id = device_id
+
+    def selected(self):
+        return self.pipelines.get(self.selected_id)
+
+    def stop_all(self):
+        for pipeline in list(self.pipelines.values()):
+            pipeline.stop(wait=False)
+        for pipeline in list(self.pipelines.values()):
+            pipeline.stop()
+
+    def stats(self):
+        return {device_id: pipeline.stats() for device_id, pipeline in self.pipelines.items()}
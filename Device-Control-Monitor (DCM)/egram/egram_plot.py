@@ -146,6 +146,26 @@ class EgramPlot:
 
 
 
+    def plot_overview(self, channel, overview):
+        # stored session view from session_tiers.get_overview: a min/max band
+        # per bucket (so spikes stay visible) with the mean drawn through it
+        ax = {"atrial": self.ax_atrial, "ventricular": self.ax_vent, "surface": self.ax_surface}[channel]
+        color = {"atrial": "cyan", "ventricular": "lime", "surface": "magenta"}[channel]
+        ax.cla()
+        ax.set_facecolor(BG_COLOR)
+        ax.set_visible(True)
+        if len(overview["t"]):
+            ax.fill_between(overview["t"], overview["min"], overview["max"], step="post", color=color, alpha=0.4, linewidth=0)
+            ax.plot(overview["t"], overview["mean"], color=color, linewidth=0.8, drawstyle="steps-post")
+            ax.set_xlim(overview["t"][0], overview["t"][-1] + max(overview["tier"], 1))
+        tier = f"{overview['tier']} ms buckets" if overview["tier"] else "raw samples"
+        ax.set_title(f"{channel.capitalize()} ({tier})", color=AXIS_LABEL_COLOR)
+        ax.set_xlabel("Time (ms)", color=AXIS_LABEL_COLOR)
+        ax.set_ylabel("mV", color=AXIS_LABEL_COLOR)
+        ax.tick_params(colors=AXIS_LABEL_COLOR)
+        ax.grid(True, color=GRID_COLOR)
+        return ax
+
     def adjust_xlim(self):
         latest = 0
         for buf in [self.atrial_buf, self.vent_buf, self.surface_buf]:
@@ -6,13 +6,106 @@
 
 import os
 import uuid
+import numpy as np
 from datetime import datetime, timezone
-from helper.storage import load_json, save_json
+from helper.storage import load_json, update_json, VersionConflictError
+from egram import column_store, sample_codec, session_segments
 
 
 # Path to JSON file
 EGRAM_FILE = os.path.join("data", "egram.json")
 
+CHANNELS = ["atrial", "ventricular", "surface"]
+
+
+# -----------------------------------------------------------------------------
+# finished sessions keep their samples in compressed files next to egram.json
+# (egram/sample_codec.py):  egram_sessions/<session_id>/<channel>.egz
+# sessions finished before that have uncompressed <channel>.col column files.
+# While a session records, its samples go to egram_sessions/<session_id>/segments
+# (egram/session_segments.py) and the channel's "storage" is "segments".
+# -----------------------------------------------------------------------------
+def sessions_dir(egram_file=None):
+    return os.path.join(os.path.dirname(os.fspath(egram_file or EGRAM_FILE)), "egram_sessions")
+
+
+def session_dir(session_id, root=None):
+    return os.path.join(root or sessions_dir(), session_id)
+
+
+def channel_file(session_id, channel, ext=".egz", root=None):
+    return os.path.join(session_dir(session_id, root), channel + ext)
+
+
+# (t, values) chunks of a channel's stored samples, or None if nothing is stored
+def iter_channel_file(session_id, channel, root=None):
+    path = channel_file(session_id, channel, root=root)
+    if os.path.exists(path):
+        return sample_codec.iter_chunks(path)
+    path = channel_file(session_id, channel, ".col", root)
+    if os.path.exists(path):
+        columns, _ = column_store.open_columns(path)
+        step = sample_codec.CHUNK_SAMPLES
+        return ((columns["t"][i:i + step], columns["value"][i:i + step]) for i in range(0, len(columns["t"]), step))
+    directory = session_dir(session_id, root)
+    if session_segments.has_segments(directory, channel):
+        return session_segments.iter_range(directory, channel)
+    return None
+
+
+# (t, values) arrays of a channel's stored samples, or None if nothing is stored
+def read_channel_file(session_id, channel, root=None):
+    path = channel_file(session_id, channel, ".col", root)
+    if not os.path.exists(channel_file(session_id, channel, root=root)) and os.path.exists(path):
+        columns, _ = column_store.open_columns(path)
+        return columns["t"], columns["value"]
+    chunks = iter_channel_file(session_id, channel, root)
+    if chunks is None:
+        return None
+    chunks = list(chunks)
+    if not chunks:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    return np.concatenate([t for t, _ in chunks]), np.concatenate([values for _, values in chunks])
+
+
+# -----------------------------------------------------------------------------
+# latest unfinished session of every patient, kept next to egram.json so a
+# session can be resumed without loading egram.json:
+#   {patient_id: {"session_id", "patient_id", "start_time", "settings"}}
+# create_session adds a patient's entry and finish_session takes it out again.
+# -----------------------------------------------------------------------------
+def open_index_file():
+    return os.path.join(os.path.dirname(os.fspath(EGRAM_FILE)), "egram_open.json")
+
+
+def index_entry(session):
+    return {key: session.get(key) for key in ("session_id", "patient_id", "start_time", "settings")}
+
+
+# built once from egram.json (streamed, samples are only counted) for files
+# written before the index existed
+def rebuild_open_index():
+    index = {}
+    if os.path.exists(EGRAM_FILE):
+        from egram import legacy_egram
+        for session in legacy_egram.iter_sessions(EGRAM_FILE):
+            if session.get("end_time") is None:
+                index[session.get("patient_id")] = index_entry(session)
+    return index
+
+
+def update_open_index(change):
+    path = open_index_file()
+    default = {} if os.path.exists(path) else rebuild_open_index()
+    return update_json(path, default, change)
+
+
+def open_sessions():
+    path = open_index_file()
+    if not os.path.exists(path):
+        update_open_index(lambda index: index)
+    return load_json(path, {})
+
 
 # -----------------------------------------------------------------------------
 # internal helper for timestamps
@@ -33,8 +126,63 @@ def load_sessions():
 # -----------------------------------------------------------------------------
 # save all sessions to disk
 # -----------------------------------------------------------------------------
+# merged into what is on disk rather than overwriting it, so sessions written by
+# another DCM in the meantime survive. A session that was changed both here and
+# there (its version moved on since data was loaded) raises VersionConflictError.
 def save_sessions(data):
-    save_json(EGRAM_FILE, data)
+    def merge(current):
+        stored = {}
+        for s in current.get("egram_sessions", []):
+            stored[s.get("session_id")] = s
+
+        merged = current.get("egram_sessions", [])
+        for s in data.get("egram_sessions", []):
+            drop_stored_samples(s)
+            old = stored.get(s.get("session_id"))
+            if old is None:
+                merged.append(s)
+                continue
+            if old == s:
+                continue
+            if old.get("version", 0) != s.get("version", 0):
+                raise VersionConflictError(
+                    f"Session {s.get('session_id')} was changed by another DCM since it was loaded."
+                )
+            s["version"] = s.get("version", 0) + 1
+            merged[merged.index(old)] = s
+
+        return {"egram_sessions": merged}
+
+    update_json(EGRAM_FILE, {"egram_sessions": []}, merge)
+
+
+# a session from get_session has its stored samples expanded in front of the
+# ones still kept in the JSON ("expanded" = how many); only the latter are saved back
+def drop_stored_samples(session):
+    for entry in session.get("channels", {}).values():
+        expanded = entry.pop("expanded", 0)
+        if expanded:
+            entry["samples"] = entry["samples"][expanded:]
+
+
+# -----------------------------------------------------------------------------
+# change one session in place on disk
+# -----------------------------------------------------------------------------
+# change(session) runs on the freshest copy while the file is locked
+def update_session(session_id, change):
+    result = {}
+
+    def apply(data):
+        for s in data.get("egram_sessions", []):
+            if s.get("session_id") == session_id:
+                change(s)
+                s["version"] = s.get("version", 0) + 1
+                result["session"] = s
+                return data
+        raise ValueError("Session not found")
+
+    update_json(EGRAM_FILE, {"egram_sessions": []}, apply)
+    return result["session"]
 
 
 # -----------------------------------------------------------------------------
@@ -46,6 +194,13 @@ def get_session(session_id):
 
     for s in sessions:
         if s.get("session_id") == session_id:
+            # callers of get_session expect every sample as a dict
+            for channel in CHANNELS:
+                entry = s["channels"][channel]
+                if entry.get("storage"):
+                    stored = file_samples(session_id, channel)
+                    entry["samples"] = stored + entry["samples"]
+                    entry["expanded"] = len(stored)
             return s
 
     return None
@@ -55,9 +210,6 @@ def get_session(session_id):
 # create a new EGRAM session
 # -----------------------------------------------------------------------------
 def create_session(patient_id, settings):
-    data = load_sessions()
-    sessions = data.get("egram_sessions", [])
-
     session_id = "EGRAM_" + uuid.uuid4().hex[:8].upper()
     now = time_now()
 
@@ -111,8 +263,17 @@ def create_session(patient_id, settings):
         }
     }
 
-    sessions.append(session)
-    save_sessions({"egram_sessions": sessions})
+    def append(data):
+        data.setdefault("egram_sessions", []).append(session)
+        return data
+
+    update_json(EGRAM_FILE, {"egram_sessions": []}, append)
+
+    def index(data):
+        data[patient_id] = index_entry(session)
+        return data
+
+    update_open_index(index)
 
     return session
 
@@ -120,109 +281,304 @@ def create_session(patient_id, settings):
 # -----------------------------------------------------------------------------
 # add samples to a session channel
 # -----------------------------------------------------------------------------
+# samples are appended to the session's open segment; egram.json is only
+# touched by the first samples of a channel, which mark it as segmented
 def add_samples(session_id, channel, samples):
-    data = load_sessions()
-    sessions = data.get("egram_sessions", [])
+    if channel not in CHANNELS:
+        raise ValueError("Invalid channel")
 
-    # find session
-    target = None
-    for s in sessions:
-        if s.get("session_id") == session_id:
-            target = s
-            break
+    directory = session_dir(session_id)
+    if not session_segments.started(directory, channel):
+        segmented = {}
 
-    if target is None:
-        raise ValueError("Session not found")
+        def change(target):
+            entry = target["channels"][channel]
+            entry["enabled"] = True
+            if entry.get("storage") not in (None, "segments"):
+                # finished already: late samples stay in the JSON
+                entry["samples"].extend(samples)
+                return
+            # samples recorded before segments existed move along
+            append_segment_samples(directory, channel, entry["samples"])
+            entry["samples"] = []
+            entry["storage"] = "segments"
+            segmented[channel] = True
 
-    if channel not in ["atrial", "ventricular", "surface"]:
-        raise ValueError("Invalid channel")
+        update_session(session_id, change)
+        if not segmented:
+            return
+
+    append_segment_samples(directory, channel, samples)
 
-    target["channels"][channel]["enabled"] = True
-    target["channels"][channel]["samples"].extend(samples)
 
-    save_sessions({"egram_sessions": sessions})
+def append_segment_samples(directory, channel, samples):
+    session_segments.append(directory, channel,
+                            [s.get("t", 0) for s in samples],
+                            [np.nan if s.get("value") is None else s["value"] for s in samples])
 
 
 # -----------------------------------------------------------------------------
 # append a marker to a session
 # -----------------------------------------------------------------------------
 def add_marker(session_id, marker):
-    data = load_sessions()
-    sessions = data.get("egram_sessions", [])
-
-    target = None
-    for s in sessions:
-        if s.get("session_id") == session_id:
-            target = s
-            break
+    update_session(session_id, lambda target: target["markers"].append(marker))
 
-    if target is None:
-        raise ValueError("Session not found")
 
-    target["markers"].append(marker)
-    save_sessions({"egram_sessions": sessions})
+# several markers (e.g. detected beats since the last flush); they go to the
+# session's marker log and reach egram.json when the session is finished
+def add_markers(session_id, markers):
+    session_segments.append_markers(session_dir(session_id), markers)
 
 
 # -----------------------------------------------------------------------------
 # update telemetry status
 # -----------------------------------------------------------------------------
 def set_telemetry(session_id, status):
-    data = load_sessions()
-    sessions = data.get("egram_sessions", [])
-
-    target = None
-    for s in sessions:
-        if s.get("session_id") == session_id:
-            target = s
-            break
-
-    if target is None:
-        raise ValueError("Session not found")
+    def change(target):
+        target["telemetry_status_log"].append({
+            "time": time_now(),
+            "status": status
+        })
 
-    target["telemetry_status_log"].append({
-        "time": time_now(),
-        "status": status
-    })
-
-    save_sessions({"egram_sessions": sessions})
+    update_session(session_id, change)
 
 
 # -----------------------------------------------------------------------------
 # finalize a session
 # -----------------------------------------------------------------------------
+# samples move out of egram.json into compressed sample files, so the JSON
+# only keeps the session's metadata and markers
 def finish_session(session_id):
-    data = load_sessions()
-    sessions = data.get("egram_sessions", [])
+    # out of the open index first: a crash in between leaves an unfinished
+    # session that is no longer resumed, never a finished one that is
+    def unindex(data):
+        return {patient: entry for patient, entry in data.items() if entry.get("session_id") != session_id}
+
+    update_open_index(unindex)
+
+    directory = session_dir(session_id)
+    logged = session_segments.read_markers(directory)
+
+    def change(target):
+        target["end_time"] = time_now()
+        target["markers"].extend(logged)
+        for channel in CHANNELS:
+            entry = target["channels"][channel]
+            if entry.get("storage") == "segments":
+                # the sealed segments become the session's one sample file
+                entry["count"] = session_segments.join(directory, channel, channel_file(session_id, channel))
+                entry["storage"] = "compressed"
+                continue
+            if not entry["samples"]:
+                continue
+            samples = stored_samples(target, channel)
+            sample_codec.write_samples(channel_file(session_id, channel), samples)
+            legacy = channel_file(session_id, channel, ".col")
+            if os.path.exists(legacy):
+                os.remove(legacy)
+            entry["storage"] = "compressed"
+            entry["count"] = len(samples)
+            entry["samples"] = []
+
+    session = update_session(session_id, change)
+    session_segments.remove(directory)
+
+    # zoomed-out views read min/max/mean tiers built off the GUI thread
+    if any(entry.get("storage") for entry in session["channels"].values()):
+        from egram import session_tiers
+        session_tiers.build_in_background(session_id)
+    return session
 
-    target = None
-    for s in sessions:
-        if s.get("session_id") == session_id:
-            target = s
-            break
 
-    if target is None:
+# -----------------------------------------------------------------------------
+# reading samples of a session
+# -----------------------------------------------------------------------------
+# all samples of one channel as dicts: what is in the sample file or segments
+# (if any) followed by whatever is still in egram.json
+def stored_samples(session, channel):
+    entry = session["channels"][channel]
+    samples = []
+    if entry.get("storage"):
+        samples = file_samples(session["session_id"], channel)
+    return samples + entry["samples"]
+
+
+def file_samples(session_id, channel):
+    stored = read_channel_file(session_id, channel)
+    if stored is None:
+        return []
+    return [{"t": int(t), "value": None if v != v else float(v)} for t, v in zip(*stored)]
+
+
+# samples of one channel with t_start <= t < t_end (either end may be None) as
+# {"t": ms array, "value": mV array}. For a finished session only the chunks
+# of its sample file that overlap the range are read and decoded.
+def get_samples(session_id, channel, t_start=None, t_end=None):
+    chunks = list(iter_samples(session_id, channel, t_start, t_end))
+    if not chunks:
+        return {"t": np.empty(0, dtype=np.int64), "value": np.empty(0, dtype=np.float64)}
+    return {"t": np.concatenate([c["t"] for c in chunks]),
+            "value": np.concatenate([c["value"] for c in chunks])}
+
+
+# same as get_samples, one stored chunk at a time
+def iter_samples(session_id, channel, t_start=None, t_end=None):
+    if channel not in CHANNELS:
+        raise ValueError("Invalid channel")
+    path = channel_file(session_id, channel)
+    if os.path.exists(path):
+        for t, values in sample_codec.iter_range(path, t_start, t_end):
+            yield {"t": t, "value": values}
+        return
+    directory = session_dir(session_id)
+    if session_segments.has_segments(directory, channel):
+        for t, values in session_segments.iter_range(directory, channel, t_start, t_end):
+            yield {"t": t, "value": values}
+        return
+
+    window = column_store.time_slice(open_channel(session_id, channel), t_start, t_end)
+    if len(window["t"]):
+        yield window
+
+
+# columns {"t": ms, "value": mV} of a finished session's channel as numpy arrays
+# (column_store.time_slice picks a time range out of them)
+def open_channel(session_id, channel):
+    if channel not in CHANNELS:
+        raise ValueError("Invalid channel")
+    stored = read_channel_file(session_id, channel)
+    if stored is not None:
+        return {"t": stored[0], "value": stored[1]}
+
+    # not finished yet (or recorded before column files): stream them out of the JSON
+    if read_session_meta(session_id) is None:
         raise ValueError("Session not found")
+    from egram import legacy_egram
+    samples = list(legacy_egram.iter_samples(session_id, channel, EGRAM_FILE))
+    return {
+        "t": np.array([s.get("t", 0) for s in samples], dtype=np.int64),
+        "value": np.array([np.nan if s.get("value") is None else s["value"] for s in samples], dtype=np.float32),
+    }
 
-    target["end_time"] = time_now()
-    save_sessions({"egram_sessions": sessions})
 
-    return target
+# metadata of one session without its samples (channels carry a "count"),
+# streamed so the samples of other sessions are never held either
+def read_session_meta(session_id):
+    if not os.path.exists(EGRAM_FILE):
+        return None
+    from egram import legacy_egram
+    for session in legacy_egram.iter_sessions(EGRAM_FILE):
+        if session.get("session_id") == session_id:
+            return session
+    return None
 
 
 # -----------------------------------------------------------------------------
-# get active session or create one
+# session handle
 # -----------------------------------------------------------------------------
-def get_or_start_session(patient_id, settings=None):
-    data = load_sessions()
-    sessions = data.get("egram_sessions", [])
+# what callers hold on to instead of the session dict: the id and the
+# metadata known when the session was opened. Channels, markers and the
+# status log are read from disk the first time they are asked for (and again
+# after refresh()); samples are only ever read as a time range.
+class SessionHandle:
+    def __init__(self, session_id, patient_id=None, start_time=None, settings=None):
+        self.session_id = session_id
+        self.patient_id = patient_id
+        self.start_time = start_time
+        self.settings = settings or {}
+        self.loaded = None
+
+    @classmethod
+    def from_entry(cls, entry):
+        return cls(entry["session_id"], entry.get("patient_id"), entry.get("start_time"), entry.get("settings"))
+
+    def __repr__(self):
+        return f"SessionHandle({self.session_id!r}, patient_id={self.patient_id!r})"
+
+    # -------------------------------------------------------------------------
+    # lazily loaded parts
+    # -------------------------------------------------------------------------
+    def meta(self):
+        if self.loaded is None:
+            self.loaded = read_session_meta(self.session_id)
+            if self.loaded is None:
+                raise ValueError("Session not found")
+            directory = session_dir(self.session_id)
+            for channel, entry in self.loaded.get("channels", {}).items():
+                if entry.get("storage") == "segments":
+                    entry["count"] = session_segments.count(directory, channel)
+            if self.loaded.get("end_time") is None:
+                self.loaded["markers"] = self.loaded.get("markers", []) + session_segments.read_markers(directory)
+        return self.loaded
+
+    def refresh(self):
+        self.loaded = None
+        return self
+
+    @property
+    def end_time(self):
+        return self.meta().get("end_time")
+
+    @property
+    def channels(self):
+        # {channel: {"enabled", "count", "storage" if finished}}
+        return self.meta().get("channels", {})
+
+    @property
+    def markers(self):
+        return self.meta().get("markers", [])
+
+    @property
+    def status_log(self):
+        return self.meta().get("telemetry_status_log", [])
+
+    def elapsed_seconds(self):
+        # wall clock time since start_time; new samples continue from here
+        started = datetime.fromisoformat(self.start_time)
+        return max((datetime.now(timezone.utc) - started).total_seconds(), 0.0)
+
+    def samples(self, channel, t_start=None, t_end=None):
+        return get_samples(self.session_id, channel, t_start, t_end)
+
+    def overview(self, channel, t_start, t_end, pixels):
+        from egram import session_tiers
+        return session_tiers.get_overview(self.session_id, channel, t_start, t_end, pixels)
+
+    # -------------------------------------------------------------------------
+    # writing (straight to disk, the cached metadata is dropped)
+    # -------------------------------------------------------------------------
+    def add_samples(self, channel, samples):
+        add_samples(self.session_id, channel, samples)
+        self.loaded = None
+
+    def add_marker(self, marker):
+        add_marker(self.session_id, marker)
+        self.loaded = None
+
+    def add_markers(self, markers):
+        add_markers(self.session_id, markers)
+        self.loaded = None
+
+    def set_telemetry(self, status):
+        set_telemetry(self.session_id, status)
+        self.loaded = None
+
+    def finish(self):
+        finish_session(self.session_id)
+        self.loaded = None
+        return self
 
-    # return last unfinished session
-    for s in reversed(sessions):
-        if s.get("patient_id") == patient_id and s.get("end_time") is None:
-            return s
 
-    # else, create a new one
-    return create_session(patient_id, settings or {})
+# -----------------------------------------------------------------------------
+# get active session or create one
+# -----------------------------------------------------------------------------
+# resumes the patient's latest unfinished session from the open index
+# (egram.json is not read) or starts a new one; returns a SessionHandle
+def get_or_start_session(patient_id, settings=None):
+    entry = open_sessions().get(patient_id)
+    if entry:
+        return SessionHandle.from_entry(entry)
+    return SessionHandle.from_entry(create_session(patient_id, settings or {}))
 
 
 # -----------------------------------------------------------------------------
@@ -81,6 +81,17 @@ def format_marker_label(marker):
     return label
 
 
+def format_heart_rates(rates):
+    # {"ventricular": bpm, "atrial": bpm or None} -> "HR: V 72  A 72 bpm"
+    parts = []
+    for channel, letter in (("ventricular", "V"), ("atrial", "A")):
+        if rates.get(channel):
+            parts.append(f"{letter} {rates[channel]:.0f}")
+    if not parts:
+        return "HR: --"
+    return "HR: " + "  ".join(parts) + " bpm"
+
+
 # -----------------------------------------------------------------------------
 # placeholder for raw ADC → mv conversion
 # will update later once microcontroller protocol is confirmed
@@ -129,23 +140,86 @@ def append_and_trim(existing, new_samples, window_ms):
     combined = trim_window(combined, window_ms)
     return combined
 
-def read_egram_packets(serial_port, running_flag, packet_size, on_packet):
-    buffer = bytearray()
+def read_egram_packets(serial_port, running_flag, packet_size, on_packet, debug=True):
+    framer = PacketFramer(packet_size)
 
     while running_flag():
         if serial_port.in_waiting:
-            buffer += serial_port.read(serial_port.in_waiting)
+            for packet in framer.feed(serial_port.read(serial_port.in_waiting)):
+                if debug:
+                    print(f"[DEBUG] Packet received ({len(packet)} bytes): {list(packet)}")
 
-            while len(buffer) >= packet_size:
-                if not (buffer[0] == 0xAA and buffer[1] == 0x22):
-                    buffer.pop(0)
-                    continue
+                on_packet(packet)
 
-                packet = buffer[:packet_size]
-                buffer = buffer[packet_size:]
+        time.sleep(0.001)
 
-                print(f"[DEBUG] Packet received ({len(packet)} bytes): {list(packet)}")
 
-                on_packet(packet)
+# -----------------------------------------------------------------------------
+# split a raw byte stream into fixed-size packets starting with 0xAA 0x22
+# bytes before a header are skipped (counted in .skipped) to resync
+# -----------------------------------------------------------------------------
+EGRAM_HEADER = b"\xaa\x22"
+
+
+class PacketFramer:
+    def __init__(self, packet_size=20, header=EGRAM_HEADER):
+        self.packet_size = packet_size
+        self.header = header
+        self.buffer = bytearray()
+        self.skipped = 0
+
+    def feed(self, data):
+        self.buffer += data
+        packets = []
+        while len(self.buffer) >= self.packet_size:
+            start = self.buffer.find(self.header)
+            if start < 0:
+                # keep a possible first header byte at the end
+                keep = 1 if self.buffer[-1:] == self.header[:1] else 0
+                self.skipped += len(self.buffer) - keep
+                del self.buffer[:len(self.buffer) - keep]
+                break
+            if start:
+                self.skipped += start
+                del self.buffer[:start]
+                continue
+            packets.append(bytes(self.buffer[:self.packet_size]))
+            del self.buffer[:self.packet_size]
+        return packets
+
+
+# -----------------------------------------------------------------------------
+# parse a telemetry packet (20 bytes from MCU)
+# shared by the egram screen and the headless CLI, so no GUI imports here
+# -----------------------------------------------------------------------------
+EGRAM_PACKET_SIZE = 20
+
+# the MCU sends signed 8-bit samples in tenths of a mV
+COUNTS_PER_MV = 10.0
+
+
+def parse_egram_packet(packet_bytes, debug=True):
+    if len(packet_bytes) != EGRAM_PACKET_SIZE:
+        if debug:
+            print("[DEBUG] Packet ignored: wrong length", len(packet_bytes))
+        return None
+
+    if packet_bytes[0] != 0xAA or packet_bytes[1] != 0x22:
+        if debug:
+            print("[DEBUG] Packet ignored: wrong header", packet_bytes[:2])
+        return None
+
+    vent_raw = int.from_bytes(packet_bytes[18:19], byteorder="big", signed=True)
+    atr_raw  = int.from_bytes(packet_bytes[19:20], byteorder="big", signed=True)
+
+    vent_mV = vent_raw / COUNTS_PER_MV
+    atr_mV  = atr_raw / COUNTS_PER_MV
+
+    if debug:
+        print(f"[DEBUG] Parsed Packet → atrial: {atr_mV} mV, ventricular: {vent_mV} mV")
 
-        time.sleep(0.001)
\ No newline at end of file
+    return {
+        "atrial": [{"t": 0, "value": atr_mV}],
+        "ventricular": [{"t": 0, "value": vent_mV}],
+        "markers": []
+    }
@@ -0,0 +1,221 @@
+# -----------------------------------------------------------------------------
+# LEGACY EGRAM FILES
+# reads egram.json files that still hold every sample inline, without
+# json.load-ing them: sessions are walked with helper.json_stream's pull
+# parser, so memory stays bounded by one session's metadata.
+#
+#   python -m egram.legacy_egram list [FILE]      sessions with sample counts
+#   python -m egram.legacy_egram migrate [FILE]   move samples to .egz files
+#
+# Migration streams every channel's samples into sample_codec files (as
+# finish_session does) and then swaps in an egram.json without them. It can
+# be run again after a crash: channels already stored are left alone.
+# Old recordings restart t at 0 with every packet; migrated timestamps are
+# rebased so they only ever increase, which range reads and tiers rely on.
+# -----------------------------------------------------------------------------
+
+import os
+import sys
+
+import numpy as np
+
+from helper.file_lock import locked
+from helper.json_stream import StreamReader
+from helper.storage import replace_json
+from egram import egram_storage, sample_codec
+
+# samples handed to a sample file writer at a time
+BATCH = 4096
+
+
+# -----------------------------------------------------------------------------
+# walking the file
+# -----------------------------------------------------------------------------
+def read_session(reader, on_samples=None):
+    # reads one session object; samples are passed to on_samples(session_id,
+    # channel, batch) in batches (or skipped) and only counted in the result
+    session = {}
+    for name in reader.members():
+        if name != "channels":
+            session[name] = reader.value()
+            continue
+
+        session["channels"] = {}
+        for channel in reader.members():
+            entry = {}
+            inline = 0
+            for key in reader.members():
+                if key != "samples":
+                    entry[key] = reader.value()
+                elif on_samples is None:
+                    inline = count_items(reader)
+                elif "session_id" in session:
+                    inline = stream_samples(reader, lambda batch: on_samples(session["session_id"], channel, batch))
+                else:
+                    # the legacy layout puts session_id first; if it doesn't,
+                    # this session's samples are held until the id is known
+                    entry["samples"] = reader.value()
+                    inline = len(entry["samples"])
+            # a channel already in a sample file keeps the count stored with it
+            if not entry.get("storage"):
+                entry["count"] = inline
+            session["channels"][channel] = entry
+
+    for channel, entry in session.get("channels", {}).items():
+        held = entry.pop("samples", None)
+        for start in range(0, len(held or []), BATCH):
+            on_samples(session["session_id"], channel, held[start:start + BATCH])
+    return session
+
+
+def count_items(reader):
+    count = 0
+    for _ in reader.items():
+        reader.skip()
+        count += 1
+    return count
+
+
+def stream_samples(reader, emit):
+    batch = []
+    count = 0
+    for _ in reader.items():
+        batch.append(reader.value())
+        if len(batch) == BATCH:
+            emit(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        emit(batch)
+        count += len(batch)
+    return count
+
+
+def sessions(reader):
+    # positions the reader on every item of "egram_sessions" in turn
+    for name in reader.members():
+        if name != "egram_sessions":
+            reader.skip()
+            continue
+        yield from reader.items()
+
+
+def iter_sessions(path=None, on_samples=None):
+    # yields every session's metadata; channels carry a "count" instead of samples
+    with open(path or egram_storage.EGRAM_FILE, "r") as f:
+        reader = StreamReader(f)
+        for _ in sessions(reader):
+            yield read_session(reader, on_samples)
+
+
+def list_session_meta(path=None):
+    return list(iter_sessions(path))
+
+
+def iter_samples(session_id, channel, path=None):
+    # streams one channel of one session, sample dict by sample dict
+    with open(path or egram_storage.EGRAM_FILE, "r") as f:
+        reader = StreamReader(f)
+        for _ in sessions(reader):
+            sid = None
+            held = []
+            for name in reader.members():
+                if name == "session_id":
+                    sid = reader.value()
+                elif name == "channels" and sid is None:
+                    # id not known yet, see read_session
+                    held = reader.value().get(channel, {}).get("samples", [])
+                elif name == "channels" and sid == session_id:
+                    for key in reader.members():
+                        if key != channel:
+                            reader.skip()
+                            continue
+                        for field in reader.members():
+                            if field != "samples":
+                                reader.skip()
+                                continue
+                            for _ in reader.items():
+                                yield reader.value()
+                    return
+                else:
+                    reader.skip()
+            if sid == session_id:
+                yield from held
+                return
+
+
+# -----------------------------------------------------------------------------
+# one-time migration
+# -----------------------------------------------------------------------------
+def rebase(t, state):
+    # every run of timestamps that goes back continues one sample step (the
+    # last step seen) after the end of the run before it; state carries the
+    # last raw t, offset and step from the previous batch of the channel
+    t = np.asarray(t, dtype=np.int64)
+    if not len(t):
+        return t
+    before = t[0] if state["raw"] is None else state["raw"]
+    delta = t - np.concatenate(([before], t[:-1]))
+    last_step = np.maximum.accumulate(np.where(delta > 0, np.arange(len(t)), -1))
+    step = np.where(last_step >= 0, delta[np.maximum(last_step, 0)], state["step"])
+    offset = state["offset"] + np.cumsum(np.where(delta < 0, step - delta, 0))
+    state.update(raw=int(t[-1]), offset=int(offset[-1]), step=int(step[-1]))
+    return t + offset
+
+
+def migrate(path=None):
+    path = path or egram_storage.EGRAM_FILE
+    # sample files go next to the file migrated, wherever that is
+    root = egram_storage.sessions_dir(path)
+    writers = {}
+    migrated = []
+    moved = 0
+
+    def write(session_id, channel, batch):
+        if channel not in writers:
+            final = egram_storage.channel_file(session_id, channel, root=root)
+            writers[channel] = (final, sample_codec.ChannelWriter(final + ".migrating"), {"raw": None, "offset": 0, "step": 1})
+        _, writer, state = writers[channel]
+        writer.append(rebase([s.get("t", 0) for s in batch], state),
+                      [float("nan") if s.get("value") is None else s["value"] for s in batch])
+
+    with locked(path):
+        for session in iter_sessions(path, write):
+            for channel, entry in session.get("channels", {}).items():
+                entry["samples"] = []
+                if channel not in writers:
+                    continue
+                final, writer, _ = writers.pop(channel)
+                writer.close()
+                if entry.get("storage"):
+                    # samples added after the channel was stored stay in the JSON
+                    t, values = sample_codec.read_channel(writer.path)
+                    entry["samples"] = [{"t": int(a), "value": None if b != b else float(b)} for a, b in zip(t, values)]
+                    os.remove(writer.path)
+                    continue
+                os.replace(writer.path, final)
+                entry["storage"] = "compressed"
+                moved += writer.count
+            migrated.append(session)
+        replace_json(path, {"egram_sessions": migrated})
+    return {"sessions": len(migrated), "samples": moved}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] not in ("list", "migrate") or len(argv) > 2:
+        print("usage: python -m egram.legacy_egram list|migrate [FILE]")
+        return 2
+    path = argv[1] if len(argv) == 2 else None
+    if argv[0] == "list":
+        for session in iter_sessions(path):
+            counts = {channel: entry.get("count", 0) for channel, entry in session.get("channels", {}).items()}
+            print(session.get("session_id"), session.get("patient_id"), session.get("start_time"), counts)
+    else:
+        result = migrate(path)
+        print(f"Migrated {result['samples']} samples in {result['sessions']} sessions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,348 @@
+# -----------------------------------------------------------------------------
+# SAMPLE CODEC
+# compact on-disk format for the samples of a finished egram session.
+# The device only sends signed 8-bit counts (see parse_egram_packet), so a
+# sample is stored as that int8 count plus one scale factor per file
+# (counts_per_mv), and timestamps as zigzag varint deltas. Every CHUNK_SAMPLES
+# samples are zlib compressed together. Encoding and decoding are vectorized.
+#
+# A chunk whose values are not exact int8 counts (e.g. samples typed in by a
+# test, or None gaps stored as NaN) falls back to float64 for that chunk only.
+#
+# File layout:
+#   magic "EGZ" | version u8 | header length u32 | header JSON
+#   chunk: encoding u8 | count u32 | t_first i64 | t_last i64 | blob length u32 | blob
+#   blob = zlib(varint deltas of t | count values (int8 or float64))
+#   index: per chunk t_first i64 | t_last i64 | file offset u64 | count u32
+#   trailer: index offset u64 | chunk count u32 | "EGZI"
+# The index lets a time-range read binary search the chunks it needs and
+# decode only those. Files without one are indexed by walking chunk headers.
+# -----------------------------------------------------------------------------
+
+import json
+import os
+import struct
+import zlib
+
+import numpy as np
+
+from egram.egram_utils import COUNTS_PER_MV
+
+MAGIC = b"EGZ"
+VERSION = 1
+PREFIX = struct.Struct("<3sBI")
+CHUNK = struct.Struct("<BIqqI")
+INDEX_ENTRY = struct.Struct("<qqQI")
+TRAILER = struct.Struct("<QI4s")
+INDEX_MAGIC = b"EGZI"
+
+INT8, FLOAT64 = 1, 2
+VALUE_DTYPES = {INT8: np.dtype("i1"), FLOAT64: np.dtype("<f8")}
+
+CHUNK_SAMPLES = 4096
+ZLIB_LEVEL = 6
+
+
+# -----------------------------------------------------------------------------
+# varints (LEB128) and zigzag, whole arrays at a time
+# -----------------------------------------------------------------------------
+def zigzag(values):
+    values = values.astype(np.int64)
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+
+def unzigzag(values):
+    return (values >> np.uint64(1)).view(np.int64) ^ -(values & np.uint64(1)).view(np.int64)
+
+
+def encode_varints(values):
+    values = values.astype(np.uint64)
+    nbytes = np.ones(len(values), dtype=np.int64)
+    for k in range(1, 10):
+        nbytes += values >= np.uint64(1 << (7 * k))
+    starts = np.cumsum(nbytes) - nbytes
+    out = np.empty(int(nbytes.sum()), dtype=np.uint8)
+    for k in range(int(nbytes.max(initial=0))):
+        mask = nbytes > k
+        byte = (values[mask] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = (nbytes[mask] > k + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[mask] + k] = byte | more
+    return out.tobytes()
+
+
+def decode_varints(data):
+    data = np.frombuffer(data, dtype=np.uint8)
+    if not len(data):
+        return np.empty(0, dtype=np.uint64)
+    ends = np.flatnonzero(data < 0x80)
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    group = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    shift = (7 * (np.arange(len(data)) - starts[group])).astype(np.uint64)
+    return np.add.reduceat((data & 0x7F).astype(np.uint64) << shift, starts)
+
+
+# -----------------------------------------------------------------------------
+# one chunk
+# -----------------------------------------------------------------------------
+def quantize(values, counts_per_mv):
+    # int8 counts if every value is exactly count / counts_per_mv, else None
+    with np.errstate(invalid="ignore"):
+        counts = np.rint(values * counts_per_mv)
+    if not np.all(np.isfinite(counts)) or counts.min(initial=0) < -128 or counts.max(initial=0) > 127:
+        return None
+    counts = counts.astype(np.int8)
+    if not np.array_equal(counts / counts_per_mv, values):
+        return None
+    return counts
+
+
+def encode_chunk(t, values, counts_per_mv=COUNTS_PER_MV):
+    t = np.asarray(t, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    counts = quantize(values, counts_per_mv)
+    if counts is not None:
+        encoding, value_bytes = INT8, counts.tobytes()
+    else:
+        encoding, value_bytes = FLOAT64, values.astype("<f8").tobytes()
+
+    deltas = np.diff(t, prepend=t[:1])
+    blob = zlib.compress(encode_varints(zigzag(deltas)) + value_bytes, ZLIB_LEVEL)
+    return CHUNK.pack(encoding, len(t), int(t[0]), int(t[-1]), len(blob)) + blob
+
+
+def decode_chunk(encoding, count, t_first, blob, counts_per_mv=COUNTS_PER_MV):
+    raw = zlib.decompress(blob)
+    value_size = count * VALUE_DTYPES[encoding].itemsize
+    t = t_first + np.cumsum(unzigzag(decode_varints(raw[:len(raw) - value_size])))
+    values = np.frombuffer(raw, dtype=VALUE_DTYPES[encoding], offset=len(raw) - value_size)
+    if encoding == INT8:
+        return t, values / counts_per_mv
+    return t, values.astype(np.float64)
+
+
+# -----------------------------------------------------------------------------
+# whole channel files
+# -----------------------------------------------------------------------------
+class ChannelWriter:
+    # writes a channel file incrementally: append() batches as they come, one
+    # chunk is encoded whenever chunk_samples are pending, close() adds the
+    # index and swaps the file in. Memory stays at about one chunk.
+    def __init__(self, path, counts_per_mv=COUNTS_PER_MV, chunk_samples=CHUNK_SAMPLES):
+        self.path = os.fspath(path)
+        self.tmp_path = self.path + ".tmp"
+        self.counts_per_mv = counts_per_mv
+        self.chunk_samples = chunk_samples
+        self.pending_t = []
+        self.pending_values = []
+        self.pending = 0
+        self.count = 0
+        self.index = []
+
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.f = open(self.tmp_path, "wb")
+        header = json.dumps({"counts_per_mv": counts_per_mv, "chunk_samples": chunk_samples}).encode("utf-8")
+        self.f.write(PREFIX.pack(MAGIC, VERSION, len(header)))
+        self.f.write(header)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def append(self, t, values):
+        t = np.asarray(t, dtype=np.int64)
+        if not len(t):
+            return
+        self.pending_t.append(t)
+        self.pending_values.append(np.asarray(values, dtype=np.float64))
+        self.pending += len(t)
+        if self.pending >= self.chunk_samples:
+            self.write_chunks(final=False)
+
+    def write_chunks(self, final):
+        t = np.concatenate(self.pending_t)
+        values = np.concatenate(self.pending_values)
+        start = 0
+        while len(t) - start >= self.chunk_samples or (final and start < len(t)):
+            end = min(start + self.chunk_samples, len(t))
+            self.index.append(INDEX_ENTRY.pack(int(t[start:end].min()), int(t[start:end].max()), self.f.tell(), end - start))
+            self.f.write(encode_chunk(t[start:end], values[start:end], self.counts_per_mv))
+            self.count += end - start
+            start = end
+        self.pending_t = [t[start:]]
+        self.pending_values = [values[start:]]
+        self.pending = len(t) - start
+
+    def close(self):
+        if self.pending:
+            self.write_chunks(final=True)
+        index_offset = self.f.tell()
+        self.f.write(b"".join(self.index))
+        self.f.write(TRAILER.pack(index_offset, len(self.index), INDEX_MAGIC))
+        self.f.flush()
+        os.fsync(self.f.fileno())
+        self.f.close()
+        os.replace(self.tmp_path, self.path)
+        return self.path
+
+    def abort(self):
+        self.f.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def copy_chunk(self, chunk, t_first, t_last, count):
+        # an already encoded chunk (header + blob) taken over as it is
+        if self.pending:
+            self.write_chunks(final=True)
+        self.index.append(INDEX_ENTRY.pack(t_first, t_last, self.f.tell(), count))
+        self.f.write(chunk)
+        self.count += count
+
+
+def join_channels(paths, path):
+    # one file with the chunks of every input file in order, none re-encoded;
+    # returns the number of samples
+    counts_per_mv = read_index(paths[0])["header"]["counts_per_mv"] if paths else COUNTS_PER_MV
+    with ChannelWriter(path, counts_per_mv) as writer:
+        for source in paths:
+            index = read_index(source)
+            if index["header"]["counts_per_mv"] != counts_per_mv:
+                raise ValueError(f"{source} is stored at a different scale")
+            with open(source, "rb") as f:
+                for t_first, t_last, offset, count in zip(index["t_first"], index["t_last"], index["offset"], index["count"]):
+                    f.seek(int(offset))
+                    head = f.read(CHUNK.size)
+                    writer.copy_chunk(head + f.read(CHUNK.unpack(head)[4]), int(t_first), int(t_last), int(count))
+    return writer.count
+
+
+def write_channel(path, t, values, counts_per_mv=COUNTS_PER_MV, chunk_samples=CHUNK_SAMPLES):
+    with ChannelWriter(path, counts_per_mv, chunk_samples) as writer:
+        writer.append(t, values)
+    return path
+
+
+def write_samples(path, samples, counts_per_mv=COUNTS_PER_MV):
+    # samples: [{"t": ms, "value": mV}, ...] as kept in egram.json
+    return write_channel(path,
+                         [s.get("t", 0) for s in samples],
+                         [np.nan if s.get("value") is None else s["value"] for s in samples],
+                         counts_per_mv)
+
+
+def read_header(f):
+    magic, version, length = PREFIX.unpack(f.read(PREFIX.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{getattr(f, 'name', 'file')} is not an egram sample file")
+    return json.loads(f.read(length).decode("utf-8"))
+
+
+# -----------------------------------------------------------------------------
+# chunk index (cached per file while the file is unchanged)
+# -----------------------------------------------------------------------------
+_indexes = {}
+
+
+def read_index(path):
+    # {"header": ..., "t_first", "t_last", "offset", "count": arrays, one entry per chunk}
+    path = os.fspath(path)
+    st = os.stat(path)
+    key = (st.st_ino, st.st_mtime_ns, st.st_size)
+    cached = _indexes.get(path)
+    if cached and cached[0] == key:
+        return cached[1]
+
+    with open(path, "rb") as f:
+        header = read_header(f)
+        data_start = f.tell()
+        entries = None
+        if st.st_size - data_start >= TRAILER.size:
+            f.seek(-TRAILER.size, os.SEEK_END)
+            index_offset, chunks, magic = TRAILER.unpack(f.read(TRAILER.size))
+            if magic == INDEX_MAGIC:
+                f.seek(index_offset)
+                entries = list(INDEX_ENTRY.iter_unpack(f.read(chunks * INDEX_ENTRY.size)))
+        if entries is None:
+            entries = []
+            f.seek(data_start)
+            while len(head := f.read(CHUNK.size)) == CHUNK.size:
+                encoding, count, t_first, t_last, length = CHUNK.unpack(head)
+                entries.append((t_first, t_last, f.tell() - CHUNK.size, count))
+                f.seek(length, os.SEEK_CUR)
+
+    columns = np.array(entries, dtype=np.int64).reshape(-1, 4)
+    index = {"header": header, "t_first": columns[:, 0], "t_last": columns[:, 1],
+             "offset": columns[:, 2], "count": columns[:, 3]}
+    # chunks in time order, none overlapping the next: a range read can bisect
+    index["sorted"] = bool(np.all(columns[1:, 0] >= columns[:-1, 1]) and np.all(columns[:, 1] >= columns[:, 0]))
+    _indexes[path] = (key, index)
+    return index
+
+
+def read_chunk(f, offset, counts_per_mv):
+    f.seek(offset)
+    encoding, count, t_first, t_last, length = CHUNK.unpack(f.read(CHUNK.size))
+    return decode_chunk(encoding, count, t_first, f.read(length), counts_per_mv)
+
+
+# -----------------------------------------------------------------------------
+# reading
+# -----------------------------------------------------------------------------
+def iter_range(path, t_start=None, t_end=None):
+    # yields (t, values) per chunk for t_start <= t < t_end; only chunks that
+    # overlap the range are read. Timestamps in recording order are bisected;
+    # a file or chunk whose timestamps go back (an old recording) is filtered
+    index = read_index(path)
+    if index["sorted"]:
+        first = 0 if t_start is None else int(np.searchsorted(index["t_last"], t_start, side="left"))
+        last = len(index["offset"]) if t_end is None else int(np.searchsorted(index["t_first"], t_end, side="left"))
+        offsets = index["offset"][first:last]
+    else:
+        overlap = np.ones(len(index["offset"]), dtype=bool)
+        if t_start is not None:
+            overlap &= index["t_last"] >= t_start
+        if t_end is not None:
+            overlap &= index["t_first"] < t_end
+        offsets = index["offset"][overlap]
+    if not len(offsets):
+        return
+    counts_per_mv = index["header"]["counts_per_mv"]
+    with open(path, "rb") as f:
+        for offset in offsets:
+            t, values = read_chunk(f, int(offset), counts_per_mv)
+            if t_start is None and t_end is None:
+                yield t, values
+            elif np.all(t[1:] >= t[:-1]):
+                lo = 0 if t_start is None else int(np.searchsorted(t, t_start, side="left"))
+                hi = len(t) if t_end is None else int(np.searchsorted(t, t_end, side="left"))
+                if hi > lo:
+                    yield t[lo:hi], values[lo:hi]
+            else:
+                keep = np.ones(len(t), dtype=bool)
+                if t_start is not None:
+                    keep &= t >= t_start
+                if t_end is not None:
+                    keep &= t < t_end
+                if keep.any():
+                    yield t[keep], values[keep]
+
+
+def iter_chunks(path):
+    # yields (t, values) arrays one chunk at a time
+    return iter_range(path)
+
+
+def read_range(path, t_start=None, t_end=None):
+    chunks = list(iter_range(path, t_start, t_end))
+    if not chunks:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    return (np.concatenate([t for t, _ in chunks]),
+            np.concatenate([values for _, values in chunks]))
+
+
+def read_channel(path):
+    return read_range(path)
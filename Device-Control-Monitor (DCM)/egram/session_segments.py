@@ -0,0 +1,286 @@
+# -----------------------------------------------------------------------------
+# SESSION SEGMENTS
+# samples of a session that is still recording, kept as a run of fixed-length
+# segments so an append (and recovering after a crash) costs the same ten
+# hours into a recording as ten seconds into it:
+#   <session dir>/segments/<channel>.<n>.open    raw records (t i64, value f64)
+#   <session dir>/segments/<channel>.<n>.egz     sealed, a sample_codec file
+#   <session dir>/segments/manifest.jsonl        one line per sealed segment
+#   <session dir>/segments/markers.jsonl         markers logged while recording
+# Segment n holds n * SEGMENT_MS <= t < (n + 1) * SEGMENT_MS. The first sample
+# past its end seals it: the records are compressed into an .egz that is never
+# written again, the segment is listed in the manifest and the .open file is
+# removed, in that order, so recover() can finish a seal a crash interrupted.
+# finish_session() joins the sealed files into the session's sample file
+# chunk by chunk, without decoding them, and folds the logged markers into
+# egram.json in the same write.
+# Appends to the open segment are fsynced in groups, at most COMMIT_SECONDS
+# apart (helper/durability.py), not once per batch.
+# -----------------------------------------------------------------------------
+
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+
+from egram import sample_codec
+from helper import durability
+
+SEGMENT_MS = 60_000
+COMMIT_SECONDS = 1.0
+RECORD = np.dtype([("t", "<i8"), ("value", "<f8")])
+
+# (session dir, channel) -> number of the segment open for appending (or None)
+_open = {}
+# session dirs whose marker log was checked for a torn tail by this process
+_marker_logs = set()
+_lock = threading.Lock()
+
+
+def segments_dir(directory):
+    return os.path.join(directory, "segments")
+
+
+def segment_file(directory, channel, n, ext):
+    return os.path.join(segments_dir(directory), f"{channel}.{n:06d}{ext}")
+
+
+def manifest_file(directory):
+    return os.path.join(segments_dir(directory), "manifest.jsonl")
+
+
+def markers_file(directory):
+    return os.path.join(segments_dir(directory), "markers.jsonl")
+
+
+# -----------------------------------------------------------------------------
+# manifest and files on disk
+# -----------------------------------------------------------------------------
+def read_lines(path):
+    # the JSON lines of a log; a line torn by a crash is skipped
+    entries = []
+    if not os.path.exists(path):
+        return entries
+    with open(path, "r") as f:
+        for line in f:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    return entries
+
+
+def repair_tail(path):
+    # a line cut short would swallow the next one appended after it
+    if os.path.exists(path):
+        with open(path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+
+def read_manifest(directory, channel=None):
+    # sealed segments in the order they were sealed
+    return [entry for entry in read_lines(manifest_file(directory))
+            if channel is None or entry["channel"] == channel]
+
+
+def add_to_manifest(directory, entry):
+    log = durability.open_log(manifest_file(directory))
+    log.commit(log.append((json.dumps(entry) + "\n").encode("utf-8")))
+
+
+def open_segments(directory, channel):
+    # [(n, path)] of the channel's .open files, oldest first
+    found = []
+    if not os.path.isdir(segments_dir(directory)):
+        return found
+    for name in os.listdir(segments_dir(directory)):
+        parts = name.split(".")
+        if len(parts) == 3 and parts[0] == channel and parts[2] == "open":
+            found.append((int(parts[1]), os.path.join(segments_dir(directory), name)))
+    return sorted(found)
+
+
+def read_records(path):
+    # whole records only: the last one may still be being written
+    with open(path, "rb") as f:
+        raw = f.read()
+    return np.frombuffer(raw[:len(raw) - len(raw) % RECORD.itemsize], dtype=RECORD)
+
+
+# -----------------------------------------------------------------------------
+# writing
+# -----------------------------------------------------------------------------
+def recover(directory, channel):
+    # state of a channel written by an earlier run; returns the open segment
+    repair_tail(manifest_file(directory))
+
+    sealed = {entry["segment"] for entry in read_manifest(directory, channel)}
+    current = None
+    for n, path in open_segments(directory, channel):
+        if n in sealed:
+            os.remove(path)         # sealed, the crash came before the remove
+            continue
+        if current is not None:
+            seal(directory, channel, current)
+        current = n
+
+    if current is not None:
+        path = segment_file(directory, channel, current, ".open")
+        size = os.path.getsize(path)
+        if size % RECORD.itemsize:
+            with open(path, "rb+") as f:
+                f.truncate(size - size % RECORD.itemsize)
+    return current
+
+
+def has_segments(directory, channel):
+    # read-only check for readers, which may be another process than the writer
+    return (directory, channel) in _open or bool(open_segments(directory, channel) or read_manifest(directory, channel))
+
+
+def started(directory, channel):
+    # True once the channel has segments (recovering them after a restart)
+    key = (directory, channel)
+    with _lock:
+        if key in _open:
+            return True
+        if not open_segments(directory, channel) and not read_manifest(directory, channel):
+            return False
+        _open[key] = recover(directory, channel)
+        return True
+
+
+def append(directory, channel, t, values):
+    t = np.asarray(t, dtype=np.int64)
+    if not len(t):
+        return
+    values = np.asarray(values, dtype=np.float64)
+    key = (directory, channel)
+    with _lock:
+        if key not in _open:
+            os.makedirs(segments_dir(directory), exist_ok=True)
+            _open[key] = recover(directory, channel)
+        current = _open[key]
+
+        # segments only move forward; a late sample goes into the open one
+        numbers = t // SEGMENT_MS
+        if current is not None:
+            numbers = np.maximum(numbers, current)
+        numbers = np.maximum.accumulate(numbers)
+        bounds = np.concatenate(([0], np.flatnonzero(np.diff(numbers)) + 1, [len(t)]))
+
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            n = int(numbers[start])
+            if current is not None and n != current:
+                seal(directory, channel, current)
+            current = n
+            records = np.empty(end - start, dtype=RECORD)
+            records["t"] = t[start:end]
+            records["value"] = values[start:end]
+            durability.open_log(segment_file(directory, channel, n, ".open"), COMMIT_SECONDS).append(records.tobytes())
+        _open[key] = current
+
+
+def seal(directory, channel, n):
+    path = segment_file(directory, channel, n, ".open")
+    durability.close_log(path)
+    records = read_records(path)
+    final = segment_file(directory, channel, n, ".egz")
+    sample_codec.write_channel(final, records["t"], records["value"])
+    add_to_manifest(directory, {
+        "channel": channel, "segment": n, "file": os.path.basename(final), "count": len(records),
+        "t_first": int(records["t"].min()) if len(records) else None,
+        "t_last": int(records["t"].max()) if len(records) else None,
+    })
+    os.remove(path)
+
+
+def seal_open(directory, channel):
+    key = (directory, channel)
+    with _lock:
+        current = _open.pop(key) if key in _open else recover(directory, channel)
+        if current is not None:
+            seal(directory, channel, current)
+
+
+# markers (e.g. detected beats) are appended like samples, not written into
+# egram.json on every flush
+def append_markers(directory, markers):
+    if not markers:
+        return
+    with _lock:
+        if directory not in _marker_logs:
+            os.makedirs(segments_dir(directory), exist_ok=True)
+            repair_tail(markers_file(directory))
+            _marker_logs.add(directory)
+    data = "".join(json.dumps(marker) + "\n" for marker in markers)
+    durability.open_log(markers_file(directory), COMMIT_SECONDS).append(data.encode("utf-8"))
+
+
+def read_markers(directory):
+    return read_lines(markers_file(directory))
+
+
+# -----------------------------------------------------------------------------
+# reading (safe while a writer appends and seals)
+# -----------------------------------------------------------------------------
+def iter_range(directory, channel, t_start=None, t_end=None):
+    # yields (t, values) for t_start <= t < t_end, sealed segments chunk by chunk
+    opened = open_segments(directory, channel)
+    entries = read_manifest(directory, channel)
+    for entry in entries:
+        if not entry["count"]:
+            continue
+        if t_end is not None and entry["t_first"] >= t_end:
+            continue
+        if t_start is not None and entry["t_last"] < t_start:
+            continue
+        yield from sample_codec.iter_range(os.path.join(segments_dir(directory), entry["file"]), t_start, t_end)
+
+    sealed = {entry["segment"] for entry in entries}
+    for n, path in opened:
+        if n in sealed:
+            continue
+        try:
+            records = read_records(path)
+        except FileNotFoundError:
+            continue
+        keep = np.ones(len(records), dtype=bool)
+        if t_start is not None:
+            keep &= records["t"] >= t_start
+        if t_end is not None:
+            keep &= records["t"] < t_end
+        if keep.any():
+            yield records["t"][keep], records["value"][keep]
+
+
+def count(directory, channel):
+    total = sum(entry["count"] for entry in read_manifest(directory, channel))
+    for _, path in open_segments(directory, channel):
+        total += os.path.getsize(path) // RECORD.itemsize
+    return total
+
+
+# -----------------------------------------------------------------------------
+# finishing
+# -----------------------------------------------------------------------------
+def join(directory, channel, path):
+    # seals the open segment and writes every sealed one into one sample file
+    seal_open(directory, channel)
+    files = [os.path.join(segments_dir(directory), entry["file"])
+             for entry in read_manifest(directory, channel) if entry["count"]]
+    return sample_codec.join_channels(files, path)
+
+
+def remove(directory):
+    with _lock:
+        for key in [key for key in _open if key[0] == directory]:
+            del _open[key]
+        _marker_logs.discard(directory)
+    durability.close_log(manifest_file(directory))
+    durability.close_log(markers_file(directory))
+    shutil.rmtree(segments_dir(directory), ignore_errors=True)
@@ -0,0 +1,132 @@
+# -----------------------------------------------------------------------------
+# SESSION TIERS
+# min / max / mean pyramids of a finished session, one per bucket size in
+# TIERS_MS, so zoomed-out views never touch the raw samples. They are built
+# in the background when finish_session() runs and kept as memory-mapped
+# column files next to the sample file:
+#   egram_sessions/<session_id>/<channel>.<bucket>ms.col   (t, min, max, mean)
+# min and max are exact, so a pacing spike narrower than a bucket still shows
+# at every tier.
+# -----------------------------------------------------------------------------
+
+import os
+import threading
+
+import numpy as np
+
+from egram import column_store, egram_storage
+
+TIERS_MS = [10, 100, 1000, 10000]
+TIER_COLUMNS = [("t", "<i8"), ("min", "<f4"), ("max", "<f4"), ("mean", "<f4")]
+
+# session_id -> builder thread still running
+_builders = {}
+_builders_lock = threading.Lock()
+
+
+def tier_file(session_id, channel, bucket_ms, root=None):
+    return egram_storage.channel_file(session_id, channel, f".{bucket_ms}ms.col", root)
+
+
+# -----------------------------------------------------------------------------
+# building
+# -----------------------------------------------------------------------------
+def reduce_tier(rows, bucket_ms):
+    # rows (t, min, max, mean, count) merged into buckets of bucket_ms; a row
+    # is a raw sample (count 0 for a NaN gap) or a bucket of a finer tier
+    t = rows["t"]
+    if not len(t):
+        return {"t": np.empty(0, dtype=np.int64), "min": np.empty(0), "max": np.empty(0),
+                "mean": np.empty(0), "count": np.empty(0, dtype=np.int64)}
+    bucket = t // bucket_ms
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(bucket)) + 1))
+    counts = np.add.reduceat(rows["count"], starts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.add.reduceat(np.where(rows["count"] > 0, rows["mean"] * rows["count"], 0.0), starts) / counts
+    return {
+        "t": bucket[starts] * bucket_ms,
+        "min": np.fmin.reduceat(rows["min"], starts),
+        "max": np.fmax.reduceat(rows["max"], starts),
+        "mean": mean,
+        "count": counts,
+    }
+
+
+def build_tier(t, values, bucket_ms):
+    # one row per non-empty bucket: bucket start, min, max, mean (NaN gaps ignored)
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    return reduce_tier({"t": np.asarray(t), "min": values, "max": values, "mean": values,
+                        "count": valid.astype(np.int64)}, bucket_ms)
+
+
+def build_session_tiers(session_id, root=None):
+    # the finest tier is built one stored chunk at a time (a bucket cut by a
+    # chunk boundary is merged afterwards), every coarser one from the tier
+    # below it, so the channel's samples are never all in memory
+    for channel in egram_storage.CHANNELS:
+        chunks = egram_storage.iter_channel_file(session_id, channel, root)
+        if chunks is None:
+            continue
+        parts = [build_tier(t, values, TIERS_MS[0]) for t, values in chunks]
+        tier = reduce_tier({name: np.concatenate([part[name] for part in parts]) for name in parts[0]}, TIERS_MS[0]) \
+            if parts else build_tier([], [], TIERS_MS[0])
+        for bucket_ms in TIERS_MS:
+            tier = reduce_tier(tier, bucket_ms)
+            column_store.write_columns(tier_file(session_id, channel, bucket_ms, root), tier, TIER_COLUMNS,
+                                       {"bucket_ms": bucket_ms})
+
+
+def build_in_background(session_id):
+    # the directory is fixed now, not whenever the thread gets to run
+    root = egram_storage.sessions_dir()
+
+    def run():
+        try:
+            build_session_tiers(session_id, root)
+        except Exception as e:
+            print(f"[TIERS] {session_id} failed:", e)
+        finally:
+            with _builders_lock:
+                _builders.pop(session_id, None)
+
+    thread = threading.Thread(target=run, name=f"tiers-{session_id}", daemon=True)
+    with _builders_lock:
+        _builders[session_id] = thread
+    thread.start()
+    return thread
+
+
+def wait(session_id, timeout=None):
+    with _builders_lock:
+        thread = _builders.get(session_id)
+    if thread:
+        thread.join(timeout)
+
+
+# -----------------------------------------------------------------------------
+# choosing a tier for a view
+# -----------------------------------------------------------------------------
+def pick_tier(t_start, t_end, pixels):
+    # coarsest bucket that still gives every pixel its own bucket; 0 = raw samples
+    per_pixel = (t_end - t_start) / max(pixels, 1)
+    fitting = [bucket_ms for bucket_ms in TIERS_MS if bucket_ms <= per_pixel]
+    return fitting[-1] if fitting else 0
+
+
+def get_overview(session_id, channel, t_start, t_end, pixels):
+    # {"tier": bucket ms (0 = raw), "t", "min", "max", "mean"} for t_start <= t < t_end,
+    # at most a few rows per pixel however long the recording is
+    bucket_ms = pick_tier(t_start, t_end, pixels)
+    path = tier_file(session_id, channel, bucket_ms) if bucket_ms else None
+    if path and os.path.exists(path):
+        columns, _ = column_store.open_columns(path)
+        # the bucket holding t_start starts before it
+        view = column_store.time_slice(columns, t_start - bucket_ms + 1, t_end)
+        return dict(view, tier=bucket_ms)
+
+    # raw view, or tiers not built (yet): work from the samples in the range
+    samples = egram_storage.get_samples(session_id, channel, t_start, t_end)
+    if bucket_ms:
+        return dict(build_tier(samples["t"], samples["value"], bucket_ms), tier=bucket_ms)
+    return {"tier": 0, "t": samples["t"], "min": samples["value"], "max": samples["value"], "mean": samples["value"]}
@@ -0,0 +1,242 @@
+# -----------------------------------------------------------------------------
+# TELEMETRY FAN-OUT
+# publishes decoded egram batches and markers to any number of local viewers /
+# loggers over TCP. publish() never blocks the intake path: every subscriber has
+# its own bounded queue and sender thread, and a slow subscriber just loses its
+# oldest frames (drop-oldest backpressure).
+#
+#   python -m egram.telemetry_server listen [HOST] PORT     (print what arrives)
+#
+# Frame layout (little endian):
+#   magic "EG" | version u8 | type u8 | seq u32 | payload length u32 | payload
+#   SAMPLES payload: channel u8 | count u16 | count x (t u32 ms, value f32 mV)
+#   MARKER / STATUS payload: UTF-8 JSON
+# -----------------------------------------------------------------------------
+
+import json
+import socket
+import struct
+import sys
+import threading
+from collections import deque
+from helper import metrics
+
+MAGIC = b"EG"
+VERSION = 1
+HEADER = struct.Struct("<2sBBII")
+SAMPLES_HEAD = struct.Struct("<BH")
+SAMPLE = struct.Struct("<If")
+
+SAMPLES, MARKER, STATUS = 1, 2, 3
+CHANNELS = ["atrial", "ventricular", "surface"]
+CHANNEL_IDS = {name: i for i, name in enumerate(CHANNELS)}
+
+DEFAULT_HOST = "127.0.0.1"
+QUEUE_FRAMES = 256
+MAX_BATCH = 0xFFFF
+
+
+# -----------------------------------------------------------------------------
+# framing
+# -----------------------------------------------------------------------------
+def encode_frame(frame_type, seq, payload):
+    return HEADER.pack(MAGIC, VERSION, frame_type, seq & 0xFFFFFFFF, len(payload)) + payload
+
+
+def encode_samples(channel, samples):
+    body = [SAMPLES_HEAD.pack(CHANNEL_IDS[channel], len(samples))]
+    for sample in samples:
+        body.append(SAMPLE.pack(int(sample.get("t", 0)) & 0xFFFFFFFF, sample.get("value") or 0.0))
+    return b"".join(body)
+
+
+def decode_payload(frame_type, payload):
+    if frame_type == SAMPLES:
+        channel, count = SAMPLES_HEAD.unpack_from(payload)
+        samples = [{"t": t, "value": value}
+                   for t, value in SAMPLE.iter_unpack(payload[SAMPLES_HEAD.size:SAMPLES_HEAD.size + count * SAMPLE.size])]
+        return {"channel": CHANNELS[channel], "samples": samples}
+    return json.loads(payload.decode("utf-8"))
+
+
+def decode_frames(buffer):
+    # returns ([(type, seq, decoded payload), ...], leftover bytes)
+    frames = []
+    offset = 0
+    while len(buffer) - offset >= HEADER.size:
+        magic, version, frame_type, seq, length = HEADER.unpack_from(buffer, offset)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not a telemetry stream")
+        end = offset + HEADER.size + length
+        if end > len(buffer):
+            break
+        frames.append((frame_type, seq, decode_payload(frame_type, bytes(buffer[offset + HEADER.size:end]))))
+        offset = end
+    return frames, buffer[offset:]
+
+
+# -----------------------------------------------------------------------------
+# one connected viewer
+# -----------------------------------------------------------------------------
+class Subscriber:
+    def __init__(self, sock, address, queue_frames):
+        self.sock = sock
+        self.address = address
+        self.queue = deque(maxlen=queue_frames)
+        self.ready = threading.Condition()
+        self.dropped = 0
+        self.sent = 0
+        self.closed = False
+
+    def offer(self, frame):
+        # never blocks; drops this subscriber's oldest frame when it is full
+        with self.ready:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+                metrics.increment("telemetry.frames_dropped")
+            self.queue.append(frame)
+            self.ready.notify()
+
+    def send_loop(self, on_close):
+        try:
+            while True:
+                with self.ready:
+                    while not self.queue and not self.closed:
+                        self.ready.wait()
+                    if self.closed:
+                        return
+                    frames = list(self.queue)
+                    self.queue.clear()
+                self.sock.sendall(b"".join(frames))
+                self.sent += len(frames)
+        except OSError:
+            pass
+        finally:
+            on_close(self)
+
+    def close(self):
+        with self.ready:
+            self.closed = True
+            self.ready.notify()
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+
+# -----------------------------------------------------------------------------
+# the server
+# -----------------------------------------------------------------------------
+class TelemetryServer:
+    def __init__(self, host=DEFAULT_HOST, port=0, queue_frames=QUEUE_FRAMES):
+        self.host = host
+        self.port = port
+        self.queue_frames = queue_frames
+        self.listener = None
+        self.subscribers = []
+        self.lock = threading.Lock()
+        self.seq = 0
+        self.running = False
+
+    def start(self):
+        self.listener = socket.create_server((self.host, self.port))
+        self.port = self.listener.getsockname()[1]
+        self.running = True
+        threading.Thread(target=self.accept_loop, name="telemetry-accept", daemon=True).start()
+        print(f"[TELEMETRY] Publishing on {self.host}:{self.port}")
+        return self.port
+
+    def accept_loop(self):
+        while self.running:
+            try:
+                sock, address = self.listener.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            subscriber = Subscriber(sock, address, self.queue_frames)
+            with self.lock:
+                self.subscribers.append(subscriber)
+                metrics.set_gauge("telemetry.subscribers", len(self.subscribers))
+            threading.Thread(target=subscriber.send_loop, args=(self.remove,),
+                             name=f"telemetry-{address[1]}", daemon=True).start()
+
+    def remove(self, subscriber):
+        subscriber.close()
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+            metrics.set_gauge("telemetry.subscribers", len(self.subscribers))
+
+    def stop(self):
+        self.running = False
+        if self.listener:
+            self.listener.close()
+        with self.lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            self.remove(subscriber)
+
+    # -------------------------------------------------------------------------
+    # publishing (called from the intake thread)
+    # -------------------------------------------------------------------------
+    def publish(self, frame_type, payload):
+        # offered under the lock too, so every queue gets the frames in seq order
+        # even when several threads publish (offer never blocks)
+        with self.lock:
+            self.seq += 1
+            frame = encode_frame(frame_type, self.seq, payload)
+            for subscriber in self.subscribers:
+                subscriber.offer(frame)
+        metrics.increment("telemetry.frames_published")
+
+    def publish_samples(self, channel, samples):
+        for start in range(0, len(samples), MAX_BATCH):
+            self.publish(SAMPLES, encode_samples(channel, samples[start:start + MAX_BATCH]))
+
+    def publish_marker(self, marker):
+        self.publish(MARKER, json.dumps(marker).encode("utf-8"))
+
+    def publish_status(self, status):
+        self.publish(STATUS, json.dumps({"status": status}).encode("utf-8"))
+
+    def publish_payload(self, payload):
+        # payload as returned by egram_utils.parse_egram_packet
+        for channel in CHANNELS:
+            if payload.get(channel):
+                self.publish_samples(channel, payload[channel])
+        for marker in payload.get("markers", []):
+            self.publish_marker(marker)
+
+
+# -----------------------------------------------------------------------------
+# client side
+# -----------------------------------------------------------------------------
+def subscribe(host, port, timeout=None):
+    # yields (type, seq, decoded payload) until the server closes the connection
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        buffer = b""
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return
+            frames, buffer = decode_frames(buffer + chunk)
+            yield from frames
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] != "listen" or len(argv) not in (2, 3):
+        print("usage: python -m egram.telemetry_server listen [HOST] PORT")
+        return 2
+    host, port = (argv[1], int(argv[2])) if len(argv) == 3 else (DEFAULT_HOST, int(argv[1]))
+    last_seq = 0
+    for frame_type, seq, payload in subscribe(host, port):
+        if last_seq and seq != last_seq + 1:
+            print(f"... {seq - last_seq - 1} frame(s) dropped")
+        last_seq = seq
+        print(seq, payload)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
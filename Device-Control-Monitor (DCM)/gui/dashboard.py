@@ -1,45 +1,23 @@
 # DASHBOARD MODULE
+import copy
 import tkinter as tk
 from tkinter import messagebox
 from datetime import datetime
-from helper import storage, patient_helpers, param_helpers, gui_helpers
+from helper import storage, patient_helpers, param_helpers, param_schema, gui_helpers
 from helper.serial_comm import PacemakerSerial
-import struct
+from helper.patient_index import PatientIndex
+from gui.patient_picker import PatientPicker
+from gui.task_executor import TaskExecutor
 
 entry_bg = "#f8f8f8"
 entry_fg = "black"
 
-# Order of parameters in the data packet
-PACKET_ORDER = [
-    "Fixed16",             # Byte 1 = 0x16
-    "Fixed55",             # Byte 2 = 0x55
-    "mode",                # Byte 3
-    "Lower Rate Limit",    # Byte 4
-    "Upper Rate Limit",    # Byte 5
-    "Maximum Sensor Rate", # Byte 6
-    "Atrial Amplitude",    # Byte 7
-    "Ventricular Amplitude", # Byte 8
-    "Atrial Pulse Width",  # Byte 9
-    "Ventricular Pulse Width", # Byte 10
-    "Atrial Sensitivity",  # Byte 11
-    "Ventricular Sensitivity", # Byte 12
-    "VRP",                 # Byte 13
-    "ARP",                 # Byte 14
-    "Activity Threshold",  # Byte 15
-    "Reaction Time",       # Byte 16
-    "Response Factor",     # Byte 17
-    "Recovery Time"        # Byte 18
+# Order of parameters in the data packet (byte 1 = 0x16, byte 2 = 0x55, byte 3 = mode)
+PACKET_ORDER = ["Fixed16", "Fixed55", "mode"] + [
+    param_schema.SCHEMA_BY_KEY[key]["label"] for _, key, _ in param_schema.PACKET_FIELDS
 ]
 
-ACTIVITY_THRESHOLD_MAP = {
-    "V-Low": 1,
-    "Low": 2,
-    "Med-Low": 3,
-    "Med": 4,
-    "Med-High": 5,
-    "High": 6,
-    "V-High": 7
-}
+ACTIVITY_THRESHOLD_MAP = param_schema.SCHEMA_BY_KEY["activity_threshold"]["codes"]
 
 
 class Dashboard(tk.Frame):
@@ -54,7 +32,13 @@ class Dashboard(tk.Frame):
         self.patient_entries = {}
         self.param_entries = {}
         self.patient = None
-        self.patients = storage.load_all_patients()
+        try:
+            self.patients = storage.load_all_patients()
+        except storage.CorruptFileError as error:
+            # the damaged file stays as it is (nothing overwrites it) for recovery
+            messagebox.showerror("Patient Data Damaged", f"{error}\nPatients could not be loaded.")
+            self.patients = []
+        self.patient_index = PatientIndex(self.patients)
         self.current_mode = tk.StringVar(value="AOO")
 
         # Build UI
@@ -62,6 +46,9 @@ class Dashboard(tk.Frame):
         self.build_main_content()
         self.build_footer()
 
+        # storage and serial work runs here, off the Tk thread
+        self.tasks = TaskExecutor(self, on_busy=self.show_busy)
+
         # Load patients into dropdown
         self.refresh_patient_dropdown()
         self.update_mode_parameters()
@@ -89,11 +76,15 @@ class Dashboard(tk.Frame):
         button_frame = tk.Frame(header)
         button_frame.grid(row=1, column=1, sticky="e")
 
-        connect_btn = tk.Button(button_frame, text="Connect", command=self.connect_pacemaker)
-        connect_btn.pack(side="left", padx=5)
+        self.connect_btn = tk.Button(button_frame, text="Connect", command=self.connect_pacemaker)
+        self.connect_btn.pack(side="left", padx=5)
+
+        self.quit_btn = tk.Button(button_frame, text="Quit", command=self.disconnect_pacemaker)
+        self.quit_btn.pack(side="left", padx=5)
 
-        quit_btn = tk.Button(button_frame, text="Quit", command=self.disconnect_pacemaker)
-        quit_btn.pack(side="left", padx=5)
+        # Busy indicator for background work (saving, connecting, ...)
+        self.busy_label = tk.Label(header, text="", font=("Arial", 10), fg="gray")
+        self.busy_label.grid(row=1, column=0, sticky="w")
 
     # -----------------------------
     # Main Content Section
@@ -110,12 +101,12 @@ class Dashboard(tk.Frame):
 
         tk.Label(selector_frame, text="Select Patient:").pack(side="left", padx=5)
         self.patient_var = tk.StringVar()
-        self.patient_dropdown = tk.OptionMenu(selector_frame, self.patient_var, "")
+        self.patient_dropdown = tk.Button(selector_frame, textvariable=self.patient_var, command=self.open_patient_picker)
         self.patient_dropdown.pack(side="left")
 
         # pacing mode dropdown 
         tk.Label(selector_frame, text="Pacing Mode:").pack(side="left", padx=(15, 5))
-        self.mode_dropdown = tk.OptionMenu(selector_frame, self.current_mode, "AOO", "VOO", "AAI", "VVI", "AOOR", "VOOR", "AAIR", "VVIR")
+        self.mode_dropdown = tk.OptionMenu(selector_frame, self.current_mode, *param_schema.MODES)
         self.mode_dropdown.pack(side="left")
         self.current_mode.trace_add("write", lambda *args: self.update_mode_parameters()) # keeps watch of what mode is selected, calls the update param function when changes
 
@@ -166,7 +157,7 @@ class Dashboard(tk.Frame):
                 dropdown = tk.OptionMenu(
                     param_frame,
                     self.activity_threshold_var,
-                    "V-Low", "Low", "Med-Low", "Med", "Med-High", "High", "V-High"
+                    *param_schema.ACTIVITY_THRESHOLDS
                 )
                 dropdown.grid(row=i, column=1, padx=5, pady=5)
 
@@ -189,7 +180,22 @@ class Dashboard(tk.Frame):
     def build_footer(self):
         footer = tk.Frame(self)
         footer.grid(row=2, column=0, sticky="ew", padx=10, pady=10)
-        gui_helpers.create_footer_buttons(footer, self)
+        self.footer_buttons = gui_helpers.create_footer_buttons(footer, self)
+
+    # buttons that must not be pressed while a save / connect is running
+    def patient_buttons(self):
+        return [self.footer_buttons[name] for name in ("New Patient", "Save Patient", "Remove Patient")]
+
+    def connection_buttons(self):
+        return [self.connect_btn, self.quit_btn]
+
+    def show_busy(self, task_names):
+        if task_names:
+            self.busy_label.config(text=f"Working: {', '.join(task_names)}...")
+            self.config(cursor="watch")
+        else:
+            self.busy_label.config(text="")
+            self.config(cursor="")
 
     # -----------------------------
     # Visual indiciators for pacemaker connection
@@ -204,20 +210,34 @@ class Dashboard(tk.Frame):
             self.pacemaker_status_label.config(text="Pacemaker Status: Connected", fg="green")
             return
 
-        self.serial_link = PacemakerSerial(port="COM5", baud=115200)
-        success = self.serial_link.connect()
-        if success:
-            self.pacemaker_status_label.config(text="Pacemaker Status: Connected", fg="green")
-            print("Serial connection established successfully.")
-        else:
-            self.pacemaker_status_label.config(text="Pacemaker Status: Disconnected", fg="red")
-            print("Failed to connect to pacemaker.")
+        # opening the port can stall, so it happens on a worker thread
+        serial_link = PacemakerSerial(port="COM5", baud=115200)
+
+        def connected(success):
+            self.serial_link = serial_link
+            if success:
+                self.pacemaker_status_label.config(text="Pacemaker Status: Connected", fg="green")
+                print("Serial connection established successfully.")
+            else:
+                self.pacemaker_status_label.config(text="Pacemaker Status: Disconnected", fg="red")
+                print("Failed to connect to pacemaker.")
+
+        self.pacemaker_status_label.config(text="Pacemaker Status: Connecting...", fg="orange")
+        self.tasks.submit("Connect", serial_link.connect, on_done=connected,
+                          disable=self.connection_buttons() + [self.footer_buttons["Save Patient"]])
             
     def disconnect_pacemaker(self):
+        def disconnected(_):
+            self.pacemaker_status_label.config(text="Pacemaker Status: Disconnected", fg="red")
+
         if hasattr(self, "serial_link") and self.serial_link.ser:
-            self.serial_link.close()
-            print("Serial connection closed.")
-        self.pacemaker_status_label.config(text="Pacemaker Status: Disconnected", fg="red")
+            def close():
+                self.serial_link.close()
+                print("Serial connection closed.")
+            self.tasks.submit("Disconnect", close, on_done=disconnected,
+                              disable=self.connection_buttons() + [self.footer_buttons["Save Patient"]])
+        else:
+            disconnected(None)
 
     # -----------------------------
     # Patient Loading and Saving
@@ -225,15 +245,25 @@ class Dashboard(tk.Frame):
     def refresh_patient_dropdown(self):
         gui_helpers.refresh_patient_dropdown(self)
 
-    def load_selected_patient(self, name):
-        patient = storage.load_patient_by_name(name)
-        
-        # If patient found, populate fields
+    def open_patient_picker(self):
+        # searchable popup list of every patient
+        window = tk.Toplevel(self)
+        window.title("Select Patient")
+
+        def on_select(patient):
+            window.destroy()
+            self.load_selected_patient(patient)
+
+        PatientPicker(window, self.patient_index, on_select).pack(fill="both", expand=True)
+
+    def load_selected_patient(self, patient):
+        # patient: the dict the picker / patient list already holds, so no
+        # store lookup; copied so unsaved edits never reach the index
         if patient:
-            self.patient = patient
-            patient_helpers.populate_patient_fields(self.patient_entries, patient)
+            self.patient = copy.deepcopy(patient)
+            patient_helpers.populate_patient_fields(self.patient_entries, self.patient)
             self.update_mode_parameters()
-            self.patient_var.set(name)
+            self.patient_var.set(self.patient.get("name", ""))
 
     def update_mode_parameters(self):
         mode = self.current_mode.get()
@@ -309,7 +339,7 @@ class Dashboard(tk.Frame):
             messagebox.showwarning("No Patient Selected", "Please select a patient before opening the Egram screen.")
             return
 
-        screen = self.controller.frames["EgramScreen"]
+        screen = self.controller.get_frame("EgramScreen")
         screen.set_active_patient(self.patient)
         self.controller.show_frame("EgramScreen")
     
@@ -317,89 +347,27 @@ class Dashboard(tk.Frame):
     
         # Converts selected mode string into its corresponding mode byte.
         # AOO=1, VOO=2, AAI=3, VVI=4, AOOR=5, VOOR=6, AAIR=7, VVIR=8.
-        mode_map = {
-            "AOO": 1,
-            "VOO": 2,
-            "AAI": 3,
-            "VVI": 4,
-            "AOOR": 5,
-            "VOOR": 6,
-            "AAIR": 7,
-            "VVIR": 8
-        }
-
         mode_str = self.current_mode.get()
-        return mode_map.get(mode_str, 1)
+        return param_schema.MODE_CODES.get(mode_str, 1)
+
+    def read_parameter_entries(self):
+        # current (unsaved) parameter values from the form, keyed like storage
+        parameters = {}
+        for key, field_name in param_helpers.PARAMETER_MAPPING:
+            if field_name == "Activity Threshold":
+                value = self.activity_threshold_var.get().strip()
+            else:
+                value = self.param_entries[field_name].get().strip()
+            if value:
+                parameters[key] = value
+        return parameters
     
     def build_serial_packet(self):
-        print("\n====================")
-        print("BUILDING SERIAL PACKET (MODE-AWARE, SCALED, PVARP=0)")
-        print("====================")
-
-        packet_bytes = []
-
-        # Get allowed fields for the current mode
+        # scaling and mode rules live in helper/param_schema.py
         mode = self.current_mode.get()
-        allowed_fields = param_helpers.MODE_PARAMETER_MAP.get(mode, [])
-
-        for key in PACKET_ORDER:
-            byte_val = 0
-
-            if key == "Fixed16":
-                byte_val = 0x16
-                print(f"Byte 1: Fixed 0x16")
-            elif key == "Fixed55":
-                byte_val = 0x55
-                print(f"Byte 2: Fixed 0x55")
-            elif key == "mode":
-                byte_val = self.mode_to_uint8()
-                print(f"Byte 3: Mode '{mode}' -> {byte_val} (0x{byte_val:02X})")
-            elif key == "Activity Threshold":
-                if key in allowed_fields:
-                    at_val = self.activity_threshold_var.get()
-                    byte_val = ACTIVITY_THRESHOLD_MAP.get(at_val, 0)
-                    print(f"Byte {len(packet_bytes)+1}: Activity Threshold '{at_val}' -> {byte_val}")
-                else:
-                    byte_val = 0
-                    print(f"Byte {len(packet_bytes)+1}: Activity Threshold not allowed for mode {mode}, default 0")
-            elif key == "PVARP":
-                byte_val = 0
-                print(f"Byte {len(packet_bytes)+1}: PVARP forced 0")
-            elif key not in allowed_fields:
-                byte_val = 0
-                print(f"Byte {len(packet_bytes)+1}: {key} not allowed for mode {mode}, default 0")
-            else:
-                entry = self.param_entries.get(key)
-                if entry:
-                    raw_val = entry.get()
-                    print(f"Byte {len(packet_bytes)+1}: {key} raw value '{raw_val}'")
-                    try:
-                        val = float(raw_val)
-                        # Scaling rules
-                        if key in ["Atrial Amplitude", "Ventricular Amplitude",
-                                "Atrial Sensitivity", "Ventricular Sensitivity"]:
-                            send_val = int(val * 10)
-                        elif key in ["VRP", "ARP"]:
-                            send_val = int(val / 10)
-                        else:
-                            send_val = int(val)
-                        byte_val = max(0, min(send_val, 255))
-                        print(f"  -> Scaled byte: {byte_val} (0x{byte_val:02X})")
-                    except:
-                        byte_val = 0
-                        print(f"  -> Error parsing {key}, defaulting 0")
-                else:
-                    byte_val = 0
-                    print(f"  -> Entry not found for {key}, defaulting 0")
-
-            packet_bytes.append(byte_val)
-
-        # Ensure exactly 18 bytes
-        packet_bytes = packet_bytes[:18]
-        print("\nFINAL PACKET (DECIMAL):", packet_bytes)
-        print("====================\n")
-
-        return struct.pack(f"{len(packet_bytes)}B", *packet_bytes)
+        packet = param_schema.encode_packet(mode, self.read_parameter_entries())
+        print(f"[DEBUG] Serial packet for {mode}: {list(packet)}")
+        return packet
 
 
 
@@ -3,48 +3,26 @@
 # Refactored UI for real-time electrograms
 # -----------------------------------------------------------------------------
 
+import os
 import tkinter as tk
-from tkinter import ttk
+from datetime import datetime, timezone
+from tkinter import ttk, messagebox
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 
+from gui.task_executor import TaskExecutor
+from egram import session_tiers
 from egram.egram_plot import EgramPlot
-from egram.egram_storage import (
-    get_or_start_session,
-    add_samples,
-    add_marker,
-    set_telemetry
-)
-from egram.egram_utils import read_egram_packets
-from helper.serial_comm import PacemakerSerial
-import threading
-import time
-
-# ==============================================
-#  PARSE TELEMETRY PACKET (20 bytes from MCU)
-# ==============================================
-def parse_egram_packet(packet_bytes):
-    if len(packet_bytes) != 20:
-        print("[DEBUG] Packet ignored: wrong length", len(packet_bytes))
-        return None
-
-    if packet_bytes[0] != 0xAA or packet_bytes[1] != 0x22:
-        print("[DEBUG] Packet ignored: wrong header", packet_bytes[:2])
-        return None
-
-    vent_raw = int.from_bytes(packet_bytes[18:19], byteorder="big", signed=True)
-    atr_raw  = int.from_bytes(packet_bytes[19:20], byteorder="big", signed=True)
-
-    vent_mV = vent_raw / 10.0
-    atr_mV  = atr_raw / 10.0
-
-    print(f"[DEBUG] Parsed Packet → atrial: {atr_mV} mV, ventricular: {vent_mV} mV")
-
-    return {
-        "atrial": [{"t": 0, "value": atr_mV}],
-        "ventricular": [{"t": 0, "value": vent_mV}],
-        "markers": []
-    }
-    
+from egram.egram_utils import format_heart_rates
+from egram.device_supervisor import DeviceSupervisor, CHANNELS
+
+# port offered for a new device until another one is picked
+TELEMETRY_PORT = "COM7"
+RENDER_MS = 100
+
+# DCM_ACQUISITION=process reads the port in a separate acquisition process
+# (egram/acquisition.py) so a busy GUI can't slow intake down
+ACQUISITION_PROCESS = os.environ.get("DCM_ACQUISITION") == "process"
+
 class EgramScreen(tk.Frame):
     DARK_BG = "#1e1e1e"
     FG_COLOR = "#ffffff"
@@ -61,6 +39,9 @@ class EgramScreen(tk.Frame):
         self.canvas = None
         self.collecting = False
         self.active_patient = None
+        self.live_counts = {channel: 0 for channel in CHANNELS}
+        self.marker_count = 0
+        self.tasks = TaskExecutor(self)
 
 
         # UI layout
@@ -150,6 +131,16 @@ class EgramScreen(tk.Frame):
         )
         self.telemetry_label.pack(side="top", anchor="e", pady=(0, 5))
 
+        # Heart rate from the beat detectors
+        self.hr_label = tk.Label(
+            right_frame,
+            text="HR: --",
+            bg=self.DARK_BG,
+            fg=self.FG_COLOR,
+            font=("Arial", 12, "bold")
+        )
+        self.hr_label.pack(side="top", anchor="e", pady=(0, 5))
+
         # Start / Stop buttons
         start_btn = tk.Button(
             right_frame,
@@ -175,6 +166,19 @@ class EgramScreen(tk.Frame):
         )
         stop_btn.pack(side="top", anchor="e", pady=2)
 
+        # Zoomed-out view of the last recorded session
+        self.review_btn = tk.Button(
+            right_frame,
+            text="Review",
+            width=10,
+            bg=self.BTN_BG,
+            fg=self.BTN_FG,
+            activebackground=self.BTN_ACTIVE_BG,
+            activeforeground=self.BTN_ACTIVE_FG,
+            command=self.review_session
+        )
+        self.review_btn.pack(side="top", anchor="e", pady=2)
+
 
     # -------------------------------------------------------------------------
     # Control widgets
@@ -243,7 +247,29 @@ class EgramScreen(tk.Frame):
             bg=self.DARK_BG,
             fg=self.FG_COLOR,
             selectcolor=self.DARK_BG
-        ).grid(row=0, column=7, padx=(0, 0))  # last item, no extra padding
+        ).grid(row=0, column=7, padx=(0, padx_control))
+
+        # Live device (several pacemakers can be monitored at once)
+        tk.Label(controls, text="Device:", bg=self.DARK_BG, fg=self.FG_COLOR).grid(row=0, column=8, padx=(0, padx_label))
+        self.device_var = tk.StringVar(value="")
+        self.device_menu = ttk.Combobox(controls, textvariable=self.device_var, values=[], width=12, state="readonly")
+        self.device_menu.grid(row=0, column=9, padx=(0, padx_control))
+        self.device_menu.bind("<<ComboboxSelected>>", lambda e: self.switch_device(self.device_var.get()))
+
+        # Port the next started device is read from (pick one or type it)
+        tk.Label(controls, text="Port:", bg=self.DARK_BG, fg=self.FG_COLOR).grid(row=0, column=10, padx=(0, padx_label))
+        self.port_var = tk.StringVar(value=TELEMETRY_PORT)
+        self.port_menu = ttk.Combobox(controls, textvariable=self.port_var, values=[], width=14,
+                                      postcommand=self.refresh_ports)
+        self.port_menu.grid(row=0, column=11, padx=(0, 0))  # last item, no extra padding
+
+    def refresh_ports(self):
+        try:
+            from serial.tools import list_ports
+            ports = [port.device for port in list_ports.comports()]
+        except Exception:
+            ports = []
+        self.port_menu.config(values=ports)
 
     def set_active_patient(self, patient):
         # Receive patient object from Dashboard and display name.
@@ -308,140 +334,128 @@ class EgramScreen(tk.Frame):
     # -------------------------------------------------------------------------
     # Start / Stop collection
     # -------------------------------------------------------------------------
-    def start_collection(self):
-        # Ensure serial is connected only when telemetry starts
-        ser = getattr(self.controller, "serial", None)
-        if ser is None:
-            self.controller.serial = PacemakerSerial(port="COM7", baud=115200)
-            ser = self.controller.serial
-
-        if not ser.connect():
-            print("Warning: Could not connect to pacemaker. Telemetry will not start.")
-            self.collecting = False
-            return
+    def devices(self):
+        # one supervisor per app, created the first time telemetry starts
+        supervisor = getattr(self.controller, "devices", None)
+        if supervisor is None:
+            supervisor = DeviceSupervisor(publisher=getattr(self.controller, "telemetry_server", None))
+            self.controller.devices = supervisor
+        return supervisor
 
-        # Initialize session if needed
-        if self.session is None:
-            if not self.active_patient:
-                patient_id = "UNKNOWN"
-            else:
-                patient_id = self.active_patient.get("id", "UNKNOWN")
-
-            self.session = get_or_start_session(patient_id, {
-                "patient_name": self.active_patient.get("name", ""),
+    def start_collection(self):
+        patient = self.active_patient or {}
+        patient_id = patient.get("id", "UNKNOWN")
+
+        # the device pipeline owns the port, decoding and the session; this
+        # screen only renders from its live window
+        supervisor = self.devices()
+        port = self.port_var.get().strip() or TELEMETRY_PORT
+        pipeline = supervisor.get(patient_id)
+        if pipeline is not None and pipeline.port != port and not pipeline.is_running():
+            supervisor.remove(patient_id)
+            pipeline = None
+        if pipeline is None:
+            in_use = [other for other in supervisor.device_ids() if supervisor.get(other).port == port and supervisor.get(other).is_running()]
+            if in_use:
+                messagebox.showwarning("Port In Use", f"{port} is already being read for {in_use[0]}.")
+                return
+            pipeline = supervisor.add_device(patient_id, port, patient_id, process=ACQUISITION_PROCESS, settings={
+                "patient_name": patient.get("name", ""),
                 "egm_gain": self.egm_gain_var.get(),
                 "ecg_gain": self.ecg_gain_var.get(),
                 "high_pass_filter": self.hpf_var.get(),
                 "channels_selected": self.channel_var.get()
             })
+        pipeline.start()
 
-        self.collecting = True
-        self.telemetry_label.config(text="Telemetry: Connected", fg="green")
-
-        # -----------------------------
-        # Unified read loop
-        # -----------------------------
-        def read_loop():
-            buffer = bytearray()
-            while self.collecting:
-                try:
-                    if not ser or not ser.ser or not ser.ser.is_open:
-                        time.sleep(0.01)
-                        continue
-
-                    # Read all available bytes
-                    in_waiting = ser.ser.in_waiting
-                    if in_waiting:
-                        buffer += ser.ser.read(in_waiting)
-
-                        # Extract full 20-byte packets
-                        while len(buffer) >= 20:
-                            # Check header
-                            if not (buffer[0] == 0xAA and buffer[1] == 0x22):
-                                buffer.pop(0)
-                                continue
-
-                            packet = buffer[:20]
-                            buffer = buffer[20:]
-
-                            # --- Parse packet and update plots ---
-                            payload = parse_egram_packet(packet)
-                            if payload:
-                                self.handle_incoming_data(payload)
-
-                            # --- Telemetry 19th/20th byte ---
-                            byte19, byte20 = packet[18], packet[19]
-                            telemetry_value = (byte19 << 8) | byte20
-
-                            mode = self.channel_var.get().lower()
-                            if mode in ["atrial", "both"]:
-                                self.update_egm_plot('atrial', telemetry_value)
-                            if mode in ["ventricular", "both"]:
-                                self.update_egm_plot('ventricular', telemetry_value)
-
-                    else:
-                        time.sleep(0.01)
-
-                except Exception as e:
-                    print("[EGRAM ERROR] read_loop:", e)
-                    time.sleep(0.05)
-
-        threading.Thread(target=read_loop, daemon=True).start()
-        
+        self.device_menu.config(values=supervisor.device_ids())
+        self.switch_device(patient_id)
+
+        if not self.collecting:
+            self.collecting = True
+            self.after(RENDER_MS, self.render_live)
+
+    def switch_device(self, device_id):
+        # show another live device; every pipeline keeps reading in the background
+        self.devices().select(device_id)
+        self.device_var.set(device_id)
+        self.port_var.set(self.devices().get(device_id).port)
+        self.live_counts = {channel: 0 for channel in CHANNELS}
+        self.marker_count = 0
+        self.plot.reset()
 
     def stop_collection(self):
         self.collecting = False
-        if self.session:
-            set_telemetry(self.session["session_id"], "disconnected")
+        self.hr_label.config(text="HR: --")
+        supervisor = getattr(self.controller, "devices", None)
+        pipeline = supervisor.selected() if supervisor else None
+        if pipeline:
+            # stopping flushes and finishes the session on the pipeline's own thread
+            pipeline.stop(wait=False)
         self.telemetry_label.config(text="Telemetry: Disconnected", fg="red")
 
     # -------------------------------------------------------------------------
-    # Update loop (periodic)
+    # Render the selected device's live window (Tk loop, every RENDER_MS)
     # -------------------------------------------------------------------------
-    def update_plot_loop(self):
+    def render_live(self):
         if not self.collecting:
             return
 
-        # Demo/fake data
-        samples = [{"t": i*2, "value": i % 10 / 10.0} for i in range(20)]
-        selected = self.channel_var.get()
+        pipeline = self.devices().selected()
+        if pipeline:
+            # a SessionHandle (id and metadata), never the samples
+            self.session = getattr(pipeline, "session", None)
+            status = pipeline.status
+            self.telemetry_label.config(text=f"Telemetry: {status}", fg="green" if status == "connected" else "orange")
 
-        if selected in ["atrial", "both"]:
-            self.plot.update_samples("atrial", samples, self.egm_gain_var.get())
-            add_samples(self.session["session_id"], "atrial", samples)
-        if selected in ["ventricular", "both"]:
-            self.plot.update_samples("ventricular", samples, self.egm_gain_var.get())
-            add_samples(self.session["session_id"], "ventricular", samples)
-        if selected == "surface":
-            self.plot.update_samples("surface", samples, self.ecg_gain_var.get())
-            add_samples(self.session["session_id"], "surface", samples)
+            for channel in CHANNELS:
+                self.live_counts[channel], samples = pipeline.samples_since(channel, self.live_counts[channel])
+                if samples:
+                    gain = self.egm_gain_var.get() if channel != "surface" else self.ecg_gain_var.get()
+                    self.plot.update_samples(channel, samples, gain)
 
-        self.plot.redraw(selected)
-        self.canvas.draw()
-        self.after(100, self.update_plot_loop)
+            self.marker_count, markers = pipeline.markers_since(self.marker_count)
+            for marker in markers:
+                self.plot.add_marker(marker)
+            self.hr_label.config(text=format_heart_rates(pipeline.heart_rates()))
+
+            self.plot.redraw(self.channel_var.get())
+            self.canvas.draw()
+
+        self.after(RENDER_MS, self.render_live)
 
     # -------------------------------------------------------------------------
-    # Handle incoming data from device
+    # Review the last session (whole recording fitted to the plot width)
     # -------------------------------------------------------------------------
-    def handle_incoming_data(self, payload):
-        if not self.collecting:
+    def review_session(self):
+        session = self.session
+        if session is None:
+            messagebox.showinfo("Review", "No session has been recorded yet.")
             return
+        supervisor = getattr(self.controller, "devices", None)
+        pipeline = supervisor.selected() if supervisor else None
+        if self.collecting:
+            self.stop_collection()
 
-        print("[DEBUG] handle_incoming_data called with payload:", payload)
-
-        for channel in ["atrial", "ventricular", "surface"]:
-            if channel in payload:
-                gain = self.egm_gain_var.get() if channel != "surface" else self.ecg_gain_var.get()
-                self.plot.update_samples(channel, payload[channel], gain)
-                add_samples(self.session["session_id"], channel, payload[channel])
-                print(f"[DEBUG] {channel} channel updated with {payload[channel]}")
-
-        if "markers" in payload:
-            for m in payload["markers"]:
-                self.plot.add_marker(m)
-                add_marker(self.session["session_id"], m)
-                print("[DEBUG] Marker added:", m)
-
-        self.canvas.draw()
-
-    
\ No newline at end of file
+        selected = self.channel_var.get()
+        channels = ["atrial", "ventricular"] if selected == "both" else [selected]
+        pixels = max(self.canvas.get_tk_widget().winfo_width(), 100)
+
+        # min/max tiers (egram/session_tiers.py), never the raw samples
+        def load():
+            if pipeline:
+                pipeline.stop()     # the session is finished once this returns
+            session_tiers.wait(session.session_id)
+            session.refresh()
+            end = datetime.fromisoformat(session.end_time) if session.end_time else datetime.now(timezone.utc)
+            duration_ms = int((end - datetime.fromisoformat(session.start_time)).total_seconds() * 1000)
+            return {channel: session.overview(channel, 0, duration_ms + 1, pixels) for channel in channels}
+
+        def loaded(overviews):
+            self.plot.reset()
+            self.plot.redraw(selected)
+            for channel, overview in overviews.items():
+                self.plot.plot_overview(channel, overview)
+            self.canvas.draw()
+
+        self.tasks.submit("Review Session", load, on_done=loaded, disable=[self.review_btn])
@@ -1,6 +1,6 @@
 import tkinter as tk
 from tkinter import messagebox
-from helper.storage import save_json
+from helper.storage import update_json
 
 
 # -----------------------------------------------------------------------------
@@ -16,11 +16,24 @@ def register_user(users, username, password, data_path):
         if u["username"] == username:
             return False, "Sorry this username already exists."
 
-    # Add new user
+    # Add new user - merged into the file as it is now, since another DCM
+    # sharing the data folder may have registered users since we loaded it
     new_user = {"username": username, "password": password}
-    users.append(new_user)
+    result = {"added": False}
 
-    save_json(data_path, {"users": users})
+    def add_user(data):
+        stored = data.setdefault("users", [])
+        if any(u["username"] == username for u in stored):
+            return data
+        stored.append(new_user)
+        result["added"] = True
+        return data
+
+    data = update_json(data_path, {"users": []}, add_user)
+    users[:] = data["users"]
+
+    if not result["added"]:
+        return False, "Sorry this username already exists."
     return True, "User registered successfully."
 
 
@@ -0,0 +1,108 @@
+# -----------------------------------------------------------------------------
+# PATIENT PICKER
+# search box + virtualized result list backed by helper/patient_index
+# only a fixed number of row labels exist; scrolling just changes their text,
+# so the widget costs the same for 10 patients or 50,000
+# -----------------------------------------------------------------------------
+
+import tkinter as tk
+
+
+class PatientPicker(tk.Frame):
+    VISIBLE_ROWS = 10
+    SEARCH_DELAY_MS = 60   # wait for a pause in typing before searching
+
+    def __init__(self, parent, index, on_select):
+        super().__init__(parent)
+        self.index = index
+        self.on_select = on_select
+        self.results = []
+        self.top = 0
+        self.pending_search = None
+
+        # search entry
+        self.query_var = tk.StringVar()
+        entry = tk.Entry(self, textvariable=self.query_var, bg="#f8f8f8", fg="black", insertbackground="black")
+        entry.grid(row=0, column=0, columnspan=2, sticky="ew", padx=5, pady=5)
+        entry.focus_set()
+        self.query_var.trace_add("write", lambda *args: self.schedule_search())
+
+        # fixed pool of row labels
+        self.rows = []
+        for i in range(self.VISIBLE_ROWS):
+            row = tk.Label(self, anchor="w", width=40, bg="white", fg="black")
+            row.grid(row=i + 1, column=0, sticky="ew", padx=(5, 0))
+            row.bind("<Button-1>", lambda e, i=i: self.select_row(i))
+            row.bind("<MouseWheel>", self.on_mousewheel)
+            row.bind("<Button-4>", lambda e: self.scroll_rows(-1))
+            row.bind("<Button-5>", lambda e: self.scroll_rows(1))
+            self.rows.append(row)
+
+        self.scrollbar = tk.Scrollbar(self, orient="vertical", command=self.on_scrollbar)
+        self.scrollbar.grid(row=1, column=1, rowspan=self.VISIBLE_ROWS, sticky="ns")
+
+        self.count_label = tk.Label(self, anchor="w")
+        self.count_label.grid(row=self.VISIBLE_ROWS + 1, column=0, sticky="w", padx=5)
+
+        self.grid_columnconfigure(0, weight=1)
+        self.search()
+
+    # -----------------------------
+    # Searching
+    # -----------------------------
+    def schedule_search(self):
+        if self.pending_search:
+            self.after_cancel(self.pending_search)
+        self.pending_search = self.after(self.SEARCH_DELAY_MS, self.search)
+
+    def search(self):
+        self.pending_search = None
+        self.results = self.index.search(self.query_var.get())
+        self.top = 0
+        self.render()
+
+    # -----------------------------
+    # Drawing only the visible slice
+    # -----------------------------
+    def render(self):
+        total = len(self.results)
+        for i, row in enumerate(self.rows):
+            pos = self.top + i
+            if pos < total:
+                patient = self.index.get(self.results[pos])
+                device = patient.get("device", {})
+                row.config(text=f"{patient.get('id', '')}  {patient.get('name', '')}  "
+                                f"({device.get('model', '')} / {device.get('serial', '')})")
+            else:
+                row.config(text="")
+
+        if total:
+            self.scrollbar.set(self.top / total, min(self.top + self.VISIBLE_ROWS, total) / total)
+        else:
+            self.scrollbar.set(0, 1)
+        self.count_label.config(text=f"{total} patient(s)")
+
+    def scroll_rows(self, delta):
+        last_top = max(len(self.results) - self.VISIBLE_ROWS, 0)
+        self.top = max(0, min(self.top + delta, last_top))
+        self.render()
+
+    def on_scrollbar(self, action, amount, unit=None):
+        if action == "moveto":
+            self.top = int(float(amount) * len(self.results))
+            self.scroll_rows(0)
+        elif unit == "pages":
+            self.scroll_rows(int(amount) * self.VISIBLE_ROWS)
+        else:
+            self.scroll_rows(int(amount))
+
+    def on_mousewheel(self, event):
+        self.scroll_rows(-1 if event.delta > 0 else 1)
+
+    # -----------------------------
+    # Selection
+    # -----------------------------
+    def select_row(self, i):
+        pos = self.top + i
+        if pos < len(self.results):
+            self.on_select(self.index.get(self.results[pos]))
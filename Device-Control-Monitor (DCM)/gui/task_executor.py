@@ -0,0 +1,100 @@
+# TASK EXECUTOR
+# runs slow storage / serial work on a small thread pool so the Tk window
+# never freezes. Tk is not thread safe, so workers never touch widgets:
+# results go on a queue that the Tk loop polls with after(), and the
+# on_done / on_error callbacks run there, on the main thread.
+
+import queue
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import messagebox
+
+POLL_MS = 30
+
+
+class TaskExecutor:
+    def __init__(self, widget, workers=2, on_busy=None):
+        # widget: any Tk widget (used for after()); on_busy(names) is called on the
+        # main thread with the names of the running tasks whenever that changes
+        self.widget = widget
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dcm-task")
+        self.results = queue.Queue()
+        self.running = {}
+        self.disabled = {}   # widget -> number of running tasks that disabled it
+        self.on_busy = on_busy
+        self.polling = False
+
+    # -----------------------------
+    # Submitting work (main thread)
+    # -----------------------------
+    def submit(self, name, func, on_done=None, on_error=None, disable=()):
+        # returns False if a task with the same name is still running
+        if name in self.running:
+            return False
+
+        for widget in disable:
+            self.disabled[widget] = self.disabled.get(widget, 0) + 1
+            widget.config(state="disabled")
+        self.running[name] = (on_done, on_error, list(disable))
+        self.notify_busy()
+
+        def work():
+            try:
+                self.results.put((name, True, func()))
+            except Exception as e:
+                traceback.print_exc()
+                self.results.put((name, False, e))
+
+        self.pool.submit(work)
+        if not self.polling:
+            self.polling = True
+            self.widget.after(POLL_MS, self.poll)
+        return True
+
+    def is_busy(self, name=None):
+        return bool(self.running) if name is None else name in self.running
+
+    def notify_busy(self):
+        if self.on_busy:
+            self.on_busy(sorted(self.running))
+
+    # -----------------------------
+    # Completion (main thread, via after)
+    # -----------------------------
+    def poll(self):
+        while True:
+            try:
+                name, ok, value = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.finish(name, ok, value)
+
+        if self.running:
+            self.widget.after(POLL_MS, self.poll)
+        else:
+            self.polling = False
+
+    def finish(self, name, ok, value):
+        on_done, on_error, disabled = self.running.pop(name)
+        for widget in disabled:
+            self.disabled[widget] -= 1
+            if self.disabled[widget]:
+                continue    # another running task still wants it disabled
+            del self.disabled[widget]
+            # the widget may have been destroyed while the task ran
+            try:
+                widget.config(state="normal")
+            except Exception:
+                pass
+        self.notify_busy()
+
+        if ok:
+            if on_done:
+                on_done(value)
+        elif on_error:
+            on_error(value)
+        else:
+            messagebox.showerror("Error", f"{name} failed:\n{value}")
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False)
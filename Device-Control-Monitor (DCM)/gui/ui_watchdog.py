@@ -0,0 +1,92 @@
+# UI WATCHDOG
+# measures how long the Tk event loop is blocked. A heartbeat is scheduled with
+# after() every interval; how late it runs is how long the loop was stuck.
+# A sampling thread watches the heartbeat and, while a stall is still going on,
+# grabs the main thread's stack so the blocking call (add_samples, canvas.draw,
+# a serial write, ...) shows up by name in the metrics export.
+
+import sys
+import threading
+import time
+import traceback
+from helper import metrics
+
+INTERVAL_MS = 100
+STALL_MS = 250
+SAMPLE_MS = 50
+STACK_LIMIT = 25
+
+
+class UIWatchdog:
+    def __init__(self, widget, interval_ms=INTERVAL_MS, stall_ms=STALL_MS, sample_ms=SAMPLE_MS):
+        self.widget = widget
+        self.interval = interval_ms / 1000
+        self.stall = stall_ms / 1000
+        self.sample = sample_ms / 1000
+        self.main_thread = None
+        self.expected = None
+        self.after_id = None
+        self.captured = False
+        self.stop_event = threading.Event()
+        self.sampler = None
+
+    # -----------------------------
+    # Start / stop (main thread)
+    # -----------------------------
+    def start(self):
+        self.main_thread = threading.current_thread()
+        self.stop_event.clear()
+        self.schedule()
+        self.sampler = threading.Thread(target=self.sample_loop, name="ui-watchdog", daemon=True)
+        self.sampler.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.after_id is not None:
+            try:
+                self.widget.after_cancel(self.after_id)
+            except Exception:
+                pass
+            self.after_id = None
+
+    def schedule(self):
+        self.expected = time.perf_counter() + self.interval
+        self.after_id = self.widget.after(int(self.interval * 1000), self.heartbeat)
+
+    # -----------------------------
+    # Heartbeat (runs on the Tk loop)
+    # -----------------------------
+    def heartbeat(self):
+        if self.stop_event.is_set():
+            return
+        late = max(0.0, time.perf_counter() - self.expected)
+        metrics.observe("ui.heartbeat_late_ms", late * 1000)
+        if late >= self.stall:
+            metrics.increment("ui.stalls")
+            metrics.observe("ui.stall_ms", late * 1000)
+        self.captured = False
+        self.schedule()
+
+    # -----------------------------
+    # Sampler thread: catch the main thread in the act
+    # -----------------------------
+    def sample_loop(self):
+        while not self.stop_event.wait(self.sample):
+            expected = self.expected
+            if expected is None or self.captured:
+                continue
+            late = time.perf_counter() - expected
+            if late >= self.stall:
+                self.captured = True
+                self.capture_stack(late)
+
+    def capture_stack(self, late):
+        frame = sys._current_frames().get(self.main_thread.ident)
+        if frame is None:
+            return
+        stack = traceback.format_stack(frame, limit=STACK_LIMIT)
+        metrics.record_event("ui.stall", {
+            "stalled_ms_at_capture": round(late * 1000, 1),
+            "stack": [line.rstrip() for line in stack],
+        })
+        print(f"[WATCHDOG] UI blocked for {late * 1000:.0f} ms in:\n{stack[-1].rstrip()}")
@@ -0,0 +1,302 @@
+# BULK PATIENT IMPORT / EXPORT
+# stream patients in from CSV or JSON Lines, validate them (in a process pool
+# for big files) and save every valid patient in one storage commit.
+# Export streams the patient store back out the same way.
+#
+#   python -m helper.bulk_io import clinic.csv [--workers 4] [--report errors.csv] [--update]
+#   python -m helper.bulk_io export patients.jsonl
+#
+# CSV layout: one row per patient + mode
+#   id,name,model,serial,mode,[dcm_serial,]lower_rate_limit,upper_rate_limit,...
+# (id / dcm_serial may be blank to get new ones; rows with the same id/name are merged)
+# JSON Lines layout: one patient per line, same shape as patients.json
+
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from helper import storage, param_helpers, id_allocator
+
+# below this many rows the pool costs more than it saves
+PARALLEL_MIN_ROWS = 2000
+CHUNK_ROWS = 500
+
+PATIENT_COLUMNS = ["id", "name", "model", "serial", "mode"]
+PARAMETER_KEYS = [key for key, _ in param_helpers.PARAMETER_MAPPING]
+
+
+# -----------------------------
+# Reading input rows lazily
+# -----------------------------
+def is_csv(path):
+    return os.fspath(path).lower().endswith(".csv")
+
+
+def read_rows(path):
+    # yields (row_number, record) where record is a patient dict
+    with open(path, "r", newline="") as f:
+        if is_csv(path):
+            for row_number, row in enumerate(csv.DictReader(f), start=2):
+                yield row_number, csv_row_to_patient(row)
+        else:
+            for row_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield row_number, json.loads(line)
+                except ValueError as e:
+                    yield row_number, {"_error": f"Invalid JSON: {e}"}
+
+
+def csv_row_to_patient(row):
+    parameters = {}
+    for key in PARAMETER_KEYS:
+        value = (row.get(key) or "").strip()
+        if value:
+            parameters[key] = value
+
+    return {
+        "id": (row.get("id") or "").strip(),
+        "name": (row.get("name") or "").strip(),
+        "device": {
+            "model": (row.get("model") or "").strip(),
+            "serial": (row.get("serial") or "").strip(),
+            "dcm_serial": (row.get("dcm_serial") or "").strip(),
+            "modes": {(row.get("mode") or "").strip(): {"parameters": parameters}}
+        }
+    }
+
+
+# -----------------------------
+# Validation (runs in worker processes for big files)
+# -----------------------------
+def validate_record(record):
+    # a JSON line can hold anything; only the expected shape gets further
+    if not isinstance(record, dict):
+        return ["A patient must be a JSON object."]
+    if "_error" in record:
+        return [record["_error"]]
+
+    errors = []
+    device = record.get("device", {})
+    if not isinstance(device, dict):
+        return ["'device' must be an object."]
+    for owner, key in ((record, "id"), (device, "dcm_serial")):
+        if not isinstance(owner.get(key) or "", str):
+            errors.append(f"'{key}' must be a string.")
+    if not record.get("name") or not device.get("model") or not device.get("serial"):
+        errors.append("Patient Name, Model, and Serial are required.")
+
+    modes = device.get("modes", {})
+    if not isinstance(modes, dict):
+        return errors + ["'modes' must be an object."]
+    if not modes:
+        errors.append("At least one mode with parameters is required.")
+
+    for mode, mode_data in modes.items():
+        if mode not in param_helpers.MODE_PARAMETER_MAP:
+            errors.append(f"Unknown pacing mode '{mode}'.")
+            continue
+        if not isinstance(mode_data, dict) or not isinstance(mode_data.get("parameters", {}), dict):
+            errors.append(f"{mode}: parameters must be an object.")
+            continue
+
+        parameters = mode_data.get("parameters", {})
+        unknown = [k for k in parameters if k not in PARAMETER_KEYS]
+        if unknown:
+            errors.append(f"{mode}: unknown parameters {', '.join(unknown)}.")
+
+        # the store keeps every value as the string typed into the Dashboard
+        parameters = {k: str(v) for k, v in parameters.items() if v not in (None, "")}
+        mode_data["parameters"] = parameters
+        for error in param_helpers.check_parameters(parameters):
+            errors.append(f"{mode}: {error}")
+
+    return errors
+
+
+def validate_chunk(chunk):
+    # chunk is a list of (row_number, record); returns (row_number, record, errors)
+    return [(row_number, record, validate_record(record)) for row_number, record in chunk]
+
+
+def chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def validated_rows(rows, workers):
+    # first chunk decides if a pool is worth starting
+    chunks = chunked(rows, CHUNK_ROWS)
+    head = []
+    for chunk in chunks:
+        head.append(chunk)
+        if len(head) * CHUNK_ROWS >= PARALLEL_MIN_ROWS:
+            break
+
+    if len(head) * CHUNK_ROWS < PARALLEL_MIN_ROWS or workers <= 1:
+        for chunk in head:
+            yield from validate_chunk(chunk)
+        for chunk in chunks:
+            yield from validate_chunk(chunk)
+        return
+
+    # keep a bounded number of chunks in flight so huge files stream through
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = []
+
+        def all_chunks():
+            yield from head
+            yield from chunks
+
+        for chunk in all_chunks():
+            pending.append(pool.submit(validate_chunk, chunk))
+            if len(pending) >= workers * 2:
+                yield from pending.pop(0).result()
+        for future in pending:
+            yield from future.result()
+
+
+# -----------------------------
+# Import
+# -----------------------------
+def merge_into(patients, record):
+    # rows for the same patient (CSV: one per mode) are combined
+    key = record.get("id") or ("name", record.get("name"))
+    existing = patients.get(key)
+    if existing is None:
+        patients[key] = record
+        return
+    existing["device"].setdefault("modes", {}).update(record["device"].get("modes", {}))
+
+
+def import_patients(path, workers=None, update=False):
+    # returns (saved_patients, report) with report = [(row_number, error), ...]
+    workers = workers or os.cpu_count() or 1
+    existing_ids = {p.get("id") for p in storage.iter_patients()}
+
+    patients = {}
+    report = []
+    for row_number, record, errors in validated_rows(read_rows(path), workers):
+        if not errors and record.get("id") in existing_ids and not update:
+            errors = [f"Patient {record['id']} already exists (use --update to overwrite)."]
+        if errors:
+            report.extend((row_number, e) for e in errors)
+            continue
+        merge_into(patients, record)
+
+    batch = list(patients.values())
+    assign_ids(batch)
+    if batch:
+        storage.save_patients_batch(batch)
+    return batch, report
+
+
+def assign_ids(batch):
+    # patients without an id / dcm serial get one from a single reserved block;
+    # the counters first move past every id / serial the file brings along
+    highest = {"patient_id": 0, "dcm_serial": 0}
+    for patient in batch:
+        patient_id = patient.get("id") or ""
+        if patient_id.startswith("P") and patient_id[1:].isdigit():
+            highest["patient_id"] = max(highest["patient_id"], int(patient_id[1:]))
+        dcm_serial = patient["device"].get("dcm_serial") or ""
+        if dcm_serial.startswith("DCM-") and dcm_serial[4:].isdigit():
+            highest["dcm_serial"] = max(highest["dcm_serial"], int(dcm_serial[4:]))
+    for name, value in highest.items():
+        if value:
+            id_allocator.advance_to(name, value)
+
+    missing_ids = [p for p in batch if not p.get("id")]
+    if missing_ids:
+        first = id_allocator.allocate("patient_id", len(missing_ids))
+        for n, patient in enumerate(missing_ids):
+            patient["id"] = f"P{first + n:03d}"
+
+    missing_serials = [p for p in batch if not p["device"].get("dcm_serial")]
+    if missing_serials:
+        first = id_allocator.allocate("dcm_serial", len(missing_serials))
+        for n, patient in enumerate(missing_serials):
+            patient["device"]["dcm_serial"] = "DCM-" + str(first + n).zfill(3)
+
+
+def write_report(report, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["row", "error"])
+        writer.writerows(report)
+
+
+# -----------------------------
+# Export
+# -----------------------------
+def export_patients(path):
+    count = 0
+    with open(path, "w", newline="") as f:
+        if is_csv(path):
+            writer = csv.DictWriter(f, fieldnames=PATIENT_COLUMNS + ["dcm_serial"] + PARAMETER_KEYS)
+            writer.writeheader()
+        for patient in storage.iter_patients():
+            count += 1
+            if not is_csv(path):
+                f.write(json.dumps(patient) + "\n")
+                continue
+            device = patient.get("device", {})
+            for mode, mode_data in device.get("modes", {}).items():
+                row = {
+                    "id": patient.get("id", ""),
+                    "name": patient.get("name", ""),
+                    "model": device.get("model", ""),
+                    "serial": device.get("serial", ""),
+                    "mode": mode,
+                    "dcm_serial": device.get("dcm_serial", ""),
+                }
+                row.update(mode_data.get("parameters", {}))
+                writer.writerow(row)
+    return count
+
+
+# -----------------------------
+# Command line entry point
+# -----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import / export DCM patients")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    imp = sub.add_parser("import", help="import patients from .csv or .jsonl")
+    imp.add_argument("path")
+    imp.add_argument("--workers", type=int, default=None)
+    imp.add_argument("--report", help="write per-row errors to this CSV file")
+    imp.add_argument("--update", action="store_true", help="overwrite patients that already exist")
+
+    exp = sub.add_parser("export", help="export patients to .csv or .jsonl")
+    exp.add_argument("path")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "export":
+        count = export_patients(args.path)
+        print(f"Exported {count} patient(s) to {args.path}")
+        return 0
+
+    saved, report = import_patients(args.path, args.workers, args.update)
+    print(f"Imported {len(saved)} patient(s), {len(report)} error(s)")
+    for row_number, error in report[:20]:
+        print(f"  row {row_number}: {error}")
+    if len(report) > 20:
+        print(f"  ... {len(report) - 20} more")
+    if args.report:
+        write_report(report, args.report)
+    return 1 if report else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+# DURABILITY HELPERS
+# how data files reach the disk so a power cut never leaves one half written:
+#  - snapshots (whole JSON files) are written to a temp file, fsynced and
+#    renamed over the old one; a crash leaves either the old or the new file
+#  - append logs (patient journal, egram segments) are fsynced in groups:
+#    one fsync covers every append made before it, so many small appends
+#    don't each pay for a disk flush
+
+import json
+import os
+import threading
+import time
+
+
+# -----------------------------
+# Whole files
+# -----------------------------
+def fsync_dir(path):
+    # makes a rename in the directory durable; Windows can't open directories
+    if os.name == "nt":
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def atomic_write(path, write, mode="w"):
+    # write(f) fills a temp file which then replaces path in one step
+    path = os.fspath(path)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, mode) as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_dir(path)
+
+
+def atomic_write_json(path, data):
+    atomic_write(path, lambda f: json.dump(data, f, indent=4))
+
+
+# -----------------------------
+# Append logs with group commit
+# -----------------------------
+class GroupCommitLog:
+    # an append-only file. append() writes (to the OS) at once and returns a
+    # ticket; commit(ticket) returns once that append is on disk. Whoever
+    # fsyncs covers every append made before it, so threads committing at the
+    # same time share one fsync. With an interval, append() also commits by
+    # itself once the oldest pending append is that many seconds old.
+    def __init__(self, path, interval=None):
+        self.path = os.fspath(path)
+        self.interval = interval
+        self.f = open(self.path, "ab")
+        self.write_lock = threading.Lock()
+        self.sync_lock = threading.Lock()
+        self.appended = 0
+        self.synced = 0
+        self.pending_since = None
+        self.fsyncs = 0
+
+    def append(self, data):
+        with self.write_lock:
+            self.f.write(data)
+            self.f.flush()
+            self.appended += 1
+            ticket = self.appended
+            if self.pending_since is None:
+                self.pending_since = time.monotonic()
+            due = self.interval is not None and time.monotonic() - self.pending_since >= self.interval
+        if due:
+            self.commit(ticket)
+        return ticket
+
+    def commit(self, ticket=None):
+        with self.sync_lock:
+            with self.write_lock:
+                if ticket is None:
+                    ticket = self.appended
+                if self.synced >= ticket:
+                    return
+                upto = self.appended
+                self.pending_since = None
+            os.fsync(self.f.fileno())
+            self.synced = upto
+            self.fsyncs += 1
+
+    def close(self):
+        if self.f.closed:
+            return
+        self.commit()
+        self.f.close()
+
+
+# one log per file and process, so every writer of a file shares its commits
+_logs = {}
+_logs_lock = threading.Lock()
+
+
+def open_log(path, interval=None):
+    path = os.path.abspath(path)
+    with _logs_lock:
+        log = _logs.get(path)
+        if log is None or log.f.closed:
+            log = _logs[path] = GroupCommitLog(path, interval)
+        return log
+
+
+def close_log(path):
+    with _logs_lock:
+        log = _logs.pop(os.path.abspath(path), None)
+    if log is not None:
+        log.close()
@@ -0,0 +1,69 @@
+# FILE LOCK HELPERS
+# advisory locks so several DCM processes sharing one data folder
+# don't interleave their read-modify-write cycles
+
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import ctypes
+    import msvcrt
+    from ctypes import wintypes
+
+    class _Overlapped(ctypes.Structure):
+        # the byte range to lock starts at Offset; hEvent is unused for blocking calls
+        _fields_ = [("Internal", ctypes.c_void_p), ("InternalHigh", ctypes.c_void_p),
+                    ("Offset", wintypes.DWORD), ("OffsetHigh", wintypes.DWORD),
+                    ("hEvent", wintypes.HANDLE)]
+
+    _kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    _kernel32.LockFileEx.argtypes = [wintypes.HANDLE, wintypes.DWORD, wintypes.DWORD,
+                                     wintypes.DWORD, wintypes.DWORD, ctypes.POINTER(_Overlapped)]
+    _kernel32.LockFileEx.restype = wintypes.BOOL
+    _kernel32.UnlockFileEx.argtypes = [wintypes.HANDLE, wintypes.DWORD,
+                                       wintypes.DWORD, wintypes.DWORD, ctypes.POINTER(_Overlapped)]
+    _kernel32.UnlockFileEx.restype = wintypes.BOOL
+    LOCKFILE_EXCLUSIVE_LOCK = 0x2
+
+
+# -----------------------------
+# Lock a file for reading (shared) or writing (exclusive)
+# -----------------------------
+# the lock is taken on a sidecar "<file>.lock" so the data file itself can
+# still be replaced atomically while the lock is held.
+# Locks are not re-entrant: don't take the same file's lock twice in one call chain.
+@contextmanager
+def locked(path, shared=False):
+    lock_file = open(os.fspath(path) + ".lock", "a+")
+    try:
+        _acquire(lock_file, shared)
+        yield
+    finally:
+        _release(lock_file)
+        lock_file.close()
+
+
+def _acquire(lock_file, shared):
+    if fcntl:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        return
+
+    # LockFileEx on the first byte waits until it is granted; without
+    # LOCKFILE_EXCLUSIVE_LOCK any number of readers share it, as with flock
+    flags = 0 if shared else LOCKFILE_EXCLUSIVE_LOCK
+    handle = msvcrt.get_osfhandle(lock_file.fileno())
+    if not _kernel32.LockFileEx(handle, flags, 0, 1, 0, ctypes.byref(_Overlapped())):
+        raise ctypes.WinError(ctypes.get_last_error())
+
+
+def _release(lock_file):
+    if fcntl:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        return
+
+    handle = msvcrt.get_osfhandle(lock_file.fileno())
+    if not _kernel32.UnlockFileEx(handle, 0, 1, 0, ctypes.byref(_Overlapped())):
+        raise ctypes.WinError(ctypes.get_last_error())
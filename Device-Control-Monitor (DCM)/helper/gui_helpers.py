@@ -28,32 +28,31 @@ def create_labeled_entry(parent, label_text, row, entry_dict, read_only=False, d
 # Create footer buttons
 def create_footer_buttons(parent, dashboard):
     # Create buttons and link them to dashboard methods
-    tk.Button(parent, text="New Patient", command=dashboard.clear_fields).grid(row=0, column=0, padx=5)
-    tk.Button(parent, text="Save Patient", command=dashboard.save_patient).grid(row=0, column=1, padx=5)
-    tk.Button(parent, text="Remove Patient", command=dashboard.remove_patient).grid(row=0, column=2, padx=5)
-    tk.Button(parent, text="Clock", command=dashboard.show_clock).grid(row=0, column=3, padx=5)
-    tk.Button(parent, text="About", command=dashboard.show_about).grid(row=0, column=4, padx=5)
-    tk.Button(parent, text="Logout", command=lambda: dashboard.controller.show_frame("Login"), fg="black").grid(row=0, column=5, padx=5)
+    # returns the buttons by label so they can be disabled while work is running
+    buttons = {
+        "New Patient": tk.Button(parent, text="New Patient", command=dashboard.clear_fields),
+        "Save Patient": tk.Button(parent, text="Save Patient", command=dashboard.save_patient),
+        "Remove Patient": tk.Button(parent, text="Remove Patient", command=dashboard.remove_patient),
+        "Clock": tk.Button(parent, text="Clock", command=dashboard.show_clock),
+        "About": tk.Button(parent, text="About", command=dashboard.show_about),
+        "Logout": tk.Button(parent, text="Logout", command=lambda: dashboard.controller.show_frame("Login"), fg="black"),
+    }
+    for column, button in enumerate(buttons.values()):
+        button.grid(row=0, column=column, padx=5)
+    return buttons
 
 # Refresh patient dropdown menu
 def refresh_patient_dropdown(dashboard):
-    menu = dashboard.patient_dropdown["menu"]
-    menu.delete(0, "end")
-    
+    # the picker reads from dashboard.patient_index, which the save, remove
+    # and reload paths keep up to date themselves
     # placeholder if no patients exist
     if not dashboard.patients:
         dashboard.patient_var.set("No patients found")
         return
-    
-    # populate dropdown with patient names
-    for p in dashboard.patients:
-        name = p.get("name", "Unnamed")
-        menu.add_command(label=name, command=lambda n=name: dashboard.load_selected_patient(n))
         
     # set the currently loaded patient in the dropdown, and load their data once selected
     if dashboard.patient:
         dashboard.patient_var.set(dashboard.patient.get("name", ""))
     else:
-        first_name = dashboard.patients[0].get("name", "")
-        dashboard.patient_var.set(first_name)
-        dashboard.load_selected_patient(first_name)
+        dashboard.patient_var.set(dashboard.patients[0].get("name", ""))
+        dashboard.load_selected_patient(dashboard.patients[0])
@@ -0,0 +1,78 @@
+# ID ALLOCATOR
+# hands out patient ids and DCM serials from persistent counters stored
+# next to patients.json, so ids never repeat even after a patient is deleted
+
+import json
+import os
+from helper import storage
+from helper.file_lock import locked
+
+
+# -----------------------------
+# Location of the counters file
+# -----------------------------
+def sequences_path():
+    return os.path.join(os.path.dirname(os.fspath(storage.PATIENTS_FILE)), "sequences.json")
+
+
+# -----------------------------
+# First run - start the counters after the highest ids already stored
+# -----------------------------
+def _seed_sequences():
+    sequences = {"patient_id": 0, "dcm_serial": 0}
+
+    for patient in storage.load_all_patients():
+        patient_id = patient.get("id", "")
+        if patient_id.startswith("P") and patient_id[1:].isdigit():
+            sequences["patient_id"] = max(sequences["patient_id"], int(patient_id[1:]))
+
+        dcm_serial = patient.get("device", {}).get("dcm_serial", "")
+        if dcm_serial.startswith("DCM-") and dcm_serial[4:].isdigit():
+            sequences["dcm_serial"] = max(sequences["dcm_serial"], int(dcm_serial[4:]))
+
+    return sequences
+
+
+def _read_sequences(path):
+    if not os.path.exists(path):
+        return _seed_sequences()
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+# -----------------------------
+# Take the next value(s) of a counter
+# -----------------------------
+# the file lock makes read + increment + write atomic across DCM instances.
+# count > 1 reserves a block and returns its first value
+def allocate(name, count=1):
+    path = sequences_path()
+    with locked(path):
+        sequences = _read_sequences(path)
+        first = sequences.get(name, 0) + 1
+        sequences[name] = first + count - 1
+        storage.replace_json(path, sequences)
+    return first
+
+
+# -----------------------------
+# Make sure a counter is past a value that was assigned elsewhere (imports)
+# -----------------------------
+def advance_to(name, value):
+    path = sequences_path()
+    with locked(path):
+        sequences = _read_sequences(path)
+        if sequences.get(name, 0) < value:
+            sequences[name] = value
+            storage.replace_json(path, sequences)
+
+
+# -----------------------------
+# Formatted ids
+# -----------------------------
+def next_patient_id():
+    return f"P{allocate('patient_id'):03d}"
+
+
+def next_dcm_serial():
+    return "DCM-" + str(allocate("dcm_serial")).zfill(3)
@@ -0,0 +1,122 @@
+# STREAMING JSON HELPERS
+# read the items of a big top-level JSON array one at a time instead of
+# json.load-ing the whole file, e.g. the "patients" list of patients.json.
+# StreamReader is a pull parser: members() / items() walk an object / array
+# and the caller decides for every member or item whether to load it with
+# value(), descend into it, or skip() it without building it.
+
+import json
+import re
+
+CHUNK_SIZE = 64 * 1024
+SKIP_WHITESPACE = re.compile(r"[ \t\r\n]*").match
+NUMBER_CHARS = "0123456789.eE+-"
+
+
+class StreamReader:
+    # rolling text buffer over a file, decoding one JSON value at a time
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        # drop what has already been consumed so memory stays bounded
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        # next non-whitespace character, or "" at end of file
+        while True:
+            self.pos = SKIP_WHITESPACE(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"Expected '{char}' at offset {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # a number cut off at the end of the buffer would decode "fine",
+                # also when the cut is right after its "." or "e"
+                if self.eof or (end < len(self.buf) and self.buf[end] not in NUMBER_CHARS):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+    def members(self):
+        # yields the names of an object's members; the caller must consume
+        # each member's value before asking for the next name
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            name = self.value()
+            self.expect(":")
+            yield name
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("}")
+            return
+
+    def items(self):
+        # yields the index of every array item; the caller consumes each item
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        index = 0
+        while True:
+            yield index
+            index += 1
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("]")
+            return
+
+    def skip(self):
+        # step over the next value; containers are walked, never built whole
+        char = self.peek()
+        if char == "{":
+            for _ in self.members():
+                self.skip()
+        elif char == "[":
+            for _ in self.items():
+                self.skip()
+        else:
+            self.value()
+
+
+# -----------------------------
+# Yield the items of data[key] from a file holding a JSON object
+# -----------------------------
+def iter_array_items(filepath, key):
+    with open(filepath, "r") as f:
+        reader = StreamReader(f)
+        for name in reader.members():
+            if name != key:
+                reader.skip()   # some other member
+                continue
+            for _ in reader.items():
+                yield reader.value()
@@ -0,0 +1,96 @@
+# METRICS
+# in-process counters, gauges, histograms and a short log of notable events
+# (e.g. UI stalls with the stack that caused them). Any thread may record;
+# export() gives one JSON-ready snapshot, write_export() saves it to disk.
+
+import json
+import os
+import threading
+import time
+from collections import deque
+
+METRICS_FILE = os.path.join("data", "metrics.json")
+
+# events kept per name (oldest dropped first)
+MAX_EVENTS = 50
+
+# default histogram buckets in milliseconds (upper bounds, last one catches the rest)
+MS_BUCKETS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf")]
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+_events = {}
+
+
+def increment(name, amount=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def set_gauge(name, value):
+    with _lock:
+        _gauges[name] = value
+
+
+# -----------------------------
+# Histograms: count per bucket plus count / sum / max
+# -----------------------------
+def observe(name, value, buckets=MS_BUCKETS):
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = {"buckets": list(buckets), "counts": [0] * len(buckets), "count": 0, "sum": 0.0, "max": 0.0}
+            _histograms[name] = hist
+        for i, bound in enumerate(hist["buckets"]):
+            if value <= bound:
+                hist["counts"][i] += 1
+                break
+        hist["count"] += 1
+        hist["sum"] += value
+        hist["max"] = max(hist["max"], value)
+
+
+def record_event(name, data):
+    with _lock:
+        _events.setdefault(name, deque(maxlen=MAX_EVENTS)).append(dict(data, time=time.time()))
+
+
+# -----------------------------
+# Export
+# -----------------------------
+def export():
+    with _lock:
+        histograms = {}
+        for name, hist in _histograms.items():
+            histograms[name] = {
+                "buckets": ["inf" if b == float("inf") else b for b in hist["buckets"]],
+                "counts": list(hist["counts"]),
+                "count": hist["count"],
+                "sum": hist["sum"],
+                "max": hist["max"],
+            }
+        return {
+            "exported_at": time.time(),
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "histograms": histograms,
+            "events": {name: list(events) for name, events in _events.items()},
+        }
+
+
+def write_export(path=None):
+    path = path or METRICS_FILE
+    os.makedirs(os.path.dirname(os.fspath(path)) or ".", exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(export(), f, indent=2)
+    return path
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+        _events.clear()
@@ -0,0 +1,62 @@
+# PACKET CACHE
+# encoded 18-byte parameter packets built from the stored
+# device.modes[mode].parameters of a patient (never from the Dashboard widgets),
+# cached per (patient id, mode) and keyed by a hash of the parameters.
+# storage drops a patient's packets whenever it is saved or deleted; the hash
+# also catches a patient dict that was changed and saved by another process.
+
+import hashlib
+import json
+import threading
+from helper import param_schema
+
+_packets = {}
+_lock = threading.Lock()
+
+
+def parameters_digest(params):
+    text = json.dumps(params, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+
+def stored_parameters(patient, mode):
+    try:
+        return patient["device"]["modes"][mode]["parameters"]
+    except (KeyError, TypeError):
+        raise KeyError(f"Patient {patient.get('id')} has no stored parameters for {mode}") from None
+
+
+# -----------------------------
+# Packet for a stored patient + mode
+# -----------------------------
+def packet_for(patient, mode):
+    params = stored_parameters(patient, mode)
+    key = (patient.get("id"), mode)
+    digest = parameters_digest(params)
+
+    with _lock:
+        cached = _packets.get(key)
+        if cached and cached[0] == digest:
+            return cached[1]
+
+    packet = param_schema.encode_packet(mode, params)
+    with _lock:
+        _packets[key] = (digest, packet)
+    return packet
+
+
+# -----------------------------
+# Invalidation (called by storage on save / delete)
+# -----------------------------
+def invalidate(patient_id=None):
+    with _lock:
+        if patient_id is None:
+            _packets.clear()
+            return
+        for key in [key for key in _packets if key[0] == patient_id]:
+            del _packets[key]
+
+
+def cached_keys():
+    with _lock:
+        return sorted(_packets)
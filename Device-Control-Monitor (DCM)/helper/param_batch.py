@@ -0,0 +1,215 @@
+# BATCH PARAMETER VALIDATION
+# re-validates many parameter sets at once with NumPy, for fleet audits after a
+# rule change. Rules come from helper/param_schema, compiled once into column
+# checks. Every row gets a uint64 error bitmask, one bit per (parameter, error code).
+#
+#   python -m helper.param_batch [--mode AAI] [--show 20]
+#
+# Table layout: {parameter key: column}, all columns the same length.
+#   numeric columns   float64, NaN = not set, inf = not a number
+#   hysteresis        float64 as above, -inf = "Off"
+#   choice columns    int16 index into the choices, -1 = not set, -2 = not allowed
+
+import argparse
+import sys
+import numpy as np
+from helper import storage, param_schema
+
+NOT_SET = -1
+NOT_ALLOWED = -2
+OFF = -np.inf
+
+# -----------------------------------------------------------------------------
+# Error bits, in the same order validate() reports errors
+# -----------------------------------------------------------------------------
+def error_codes(spec):
+    if "choices" in spec:
+        return ["choice"]
+    if "off_or_equal" in spec:
+        return ["hysteresis"]
+    return ["range", "order", "increment"] if "above" in spec else ["range", "increment"]
+
+
+ERROR_BITS = [(spec["key"], code) for spec in param_schema.PARAMETER_SCHEMA for code in error_codes(spec)]
+BIT = {pair: i for i, pair in enumerate(ERROR_BITS)}
+assert len(ERROR_BITS) <= 64
+
+
+def describe(mask):
+    # list of (key, code) set in one row's bitmask
+    mask = int(mask)
+    return [pair for i, pair in enumerate(ERROR_BITS) if mask >> i & 1]
+
+
+def error_counts(masks):
+    # {(key, code): number of rows with that error}
+    counts = {}
+    for i, pair in enumerate(ERROR_BITS):
+        hits = int(np.count_nonzero(masks >> np.uint64(i) & np.uint64(1)))
+        if hits:
+            counts[pair] = hits
+    return counts
+
+
+# -----------------------------------------------------------------------------
+# Building columns
+# text is parsed once per distinct value (a fleet only uses a handful per field)
+# -----------------------------------------------------------------------------
+def text_array(values):
+    return np.array(["" if v is None else str(v) for v in values], dtype=str)
+
+
+def parse_number(text, off_allowed=False):
+    if text == "":
+        return np.nan
+    if off_allowed and text.lower() == "off":
+        return OFF
+    num = param_schema.to_number(text)
+    return np.inf if num is None else num
+
+
+def number_column(values, off_allowed=False):
+    if isinstance(values, np.ndarray) and values.dtype.kind in "fiu":
+        return values.astype(np.float64)
+    distinct, inverse = np.unique(text_array(values), return_inverse=True)
+    parsed = np.array([parse_number(text, off_allowed) for text in distinct], dtype=np.float64)
+    return parsed[inverse].reshape(-1)
+
+
+def choice_column(values, choices):
+    if isinstance(values, np.ndarray) and values.dtype.kind == "i":
+        return values.astype(np.int16)
+    index = {choice: i for i, choice in enumerate(choices)}
+    distinct, inverse = np.unique(text_array(values), return_inverse=True)
+    codes = np.array([NOT_SET if text == "" else index.get(text, NOT_ALLOWED) for text in distinct], dtype=np.int16)
+    return codes[inverse].reshape(-1)
+
+
+def build_table(columns, rows=None):
+    # columns: {key: sequence of raw values}; missing parameters become "not set"
+    if rows is None:
+        rows = len(next(iter(columns.values()))) if columns else 0
+    table = {}
+    for spec in param_schema.PARAMETER_SCHEMA:
+        values = columns.get(spec["key"])
+        if values is None:
+            values = [None] * rows
+        if "choices" in spec:
+            table[spec["key"]] = choice_column(values, spec["choices"])
+        else:
+            table[spec["key"]] = number_column(values, off_allowed="off_or_equal" in spec)
+        if len(table[spec["key"]]) != rows:
+            raise ValueError(f"column {spec['key']} has {len(table[spec['key']])} rows, expected {rows}")
+    return table
+
+
+def table_from_dicts(param_dicts):
+    param_dicts = list(param_dicts)
+    columns = {spec["key"]: [d.get(spec["key"]) for d in param_dicts] for spec in param_schema.PARAMETER_SCHEMA}
+    return build_table(columns, len(param_dicts))
+
+
+# -----------------------------------------------------------------------------
+# Compile one column check per parameter
+# each check is check(table) -> [(bit, bad rows), ...]
+# -----------------------------------------------------------------------------
+def compile_column_check(spec):
+    key = spec["key"]
+
+    if "choices" in spec:
+        bit = BIT[(key, "choice")]
+        return lambda table: [(bit, table[key] == NOT_ALLOWED)]
+
+    if "off_or_equal" in spec:
+        bit = BIT[(key, "hysteresis")]
+        other = spec["off_or_equal"]
+
+        def check_off_or_equal(table):
+            num, target = table[key], table[other]
+            is_set = ~np.isnan(num) & (num != OFF)
+            with np.errstate(invalid="ignore"):
+                bad = is_set & (~np.isfinite(num) | ~np.isfinite(target) | (np.abs(num - target) > 0.1))
+            return [(bit, bad)]
+        return check_off_or_equal
+
+    low, high = spec["range"]
+    required = spec.get("required", False)
+    above = spec.get("above")
+    band_highs = np.array([band_high for band_high, _ in spec["steps"]], dtype=np.float64)
+    band_steps = np.array([step for _, step in spec["steps"]], dtype=np.float64)
+    range_bit = BIT[(key, "range")]
+    step_bit = BIT[(key, "increment")]
+    order_bit = BIT[(key, "order")] if above else None
+
+    def check_number(table):
+        num = table[key]
+        checked = np.ones(len(num), dtype=bool) if required else ~np.isnan(num)
+        with np.errstate(invalid="ignore"):
+            in_range = (num >= low) & (num <= high)
+        results = [(range_bit, checked & ~in_range)]
+        ok = checked & in_range
+
+        if above:
+            other = table[above]
+            results.append((order_bit, ok & np.isfinite(other) & (num <= np.where(np.isfinite(other), other, 0))))
+
+        band = np.minimum(np.searchsorted(band_highs, np.where(ok, num, low)), len(band_steps) - 1)
+        quotient = np.where(ok, num, 0) / band_steps[band]
+        results.append((step_bit, ok & (np.abs(quotient - np.round(quotient)) >= 1e-6)))
+        return results
+    return check_number
+
+
+COLUMN_CHECKS = [compile_column_check(spec) for spec in param_schema.PARAMETER_SCHEMA]
+
+
+def validate_table(table):
+    # returns one uint64 error bitmask per row (0 = valid)
+    rows = len(next(iter(table.values())))
+    masks = np.zeros(rows, dtype=np.uint64)
+    for check in COLUMN_CHECKS:
+        for bit, bad in check(table):
+            masks |= bad.astype(np.uint64) << np.uint64(bit)
+    return masks
+
+
+# -----------------------------------------------------------------------------
+# Fleet audit over the patient store: one row per patient + programmed mode
+# -----------------------------------------------------------------------------
+def patient_rows(mode=None):
+    for patient in storage.iter_patients():
+        for mode_name, mode_data in patient.get("device", {}).get("modes", {}).items():
+            if mode is None or mode_name == mode:
+                yield patient.get("id", ""), mode_name, mode_data.get("parameters", {})
+
+
+def audit_store(mode=None):
+    labels, param_dicts = [], []
+    for patient_id, mode_name, params in patient_rows(mode):
+        labels.append((patient_id, mode_name))
+        param_dicts.append(params)
+    return labels, validate_table(table_from_dicts(param_dicts))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-validate every stored parameter set")
+    parser.add_argument("--mode", choices=param_schema.MODES, help="only audit this pacing mode")
+    parser.add_argument("--show", type=int, default=20, help="failing rows to list")
+    args = parser.parse_args(argv)
+
+    labels, masks = audit_store(args.mode)
+    failing = np.flatnonzero(masks)
+    print(f"Checked {len(labels)} parameter set(s), {len(failing)} invalid")
+    for (key, code), hits in sorted(error_counts(masks).items(), key=lambda item: -item[1]):
+        print(f"  {hits:>7}  {param_schema.SCHEMA_BY_KEY[key]['label']}: {code}")
+    for row in failing[:args.show]:
+        patient_id, mode_name = labels[row]
+        errors = ", ".join(f"{key} {code}" for key, code in describe(masks[row]))
+        print(f"  {patient_id} {mode_name}: {errors}")
+    if len(failing) > args.show:
+        print(f"  ... {len(failing) - args.show} more")
+    return 1 if len(failing) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
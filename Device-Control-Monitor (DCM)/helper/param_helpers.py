@@ -1,130 +1,18 @@
 # PARAM HELPERS
 
 # place to define parameter fields and mappings
-PARAM_FIELDS = [
-    "Model", "Serial",
-    "Lower Rate Limit", "Upper Rate Limit",
-    "Maximum Sensor Rate",
-    "Atrial Amplitude", "Ventricular Amplitude",
-    "Atrial Pulse Width", "Ventricular Pulse Width",
-    "ARP", "VRP",
-    "Atrial Sensitivity", "Ventricular Sensitivity",
-    "PVARP", "Hysteresis",
-    "Rate Smoothing", "Activity Threshold",
-    "Reaction Time", "Response Factor",
-    "Recovery Time"
-]
+# (all derived from helper/param_schema.py, which holds the actual rules)
+from helper import param_schema
+
+PARAM_FIELDS = ["Model", "Serial"] + [spec["label"] for spec in param_schema.PARAMETER_SCHEMA]
 
 # Mapping between internal parameter keys and UI field names
-PARAMETER_MAPPING = [
-    ("lower_rate_limit", "Lower Rate Limit"),
-    ("upper_rate_limit", "Upper Rate Limit"),
-    ("maximum_sensor_rate", "Maximum Sensor Rate"),
-    ("atrial_amplitude", "Atrial Amplitude"),
-    ("ventricular_amplitude", "Ventricular Amplitude"),
-    ("atrial_pulse_width", "Atrial Pulse Width"),
-    ("ventricular_pulse_width", "Ventricular Pulse Width"),
-    ("arp", "ARP"),
-    ("vrp", "VRP"),
-    ("atrial_sensitivity", "Atrial Sensitivity"),
-    ("ventricular_sensitivity", "Ventricular Sensitivity"),
-    ("pvarp", "PVARP"),
-    ("hysteresis", "Hysteresis"),
-    ("rate_smoothing", "Rate Smoothing"),
-    ("activity_threshold", "Activity Threshold"),
-    ("reaction_time", "Reaction Time"),
-    ("response_factor", "Response Factor"),
-    ("recovery_time", "Recovery Time")
-]
+PARAMETER_MAPPING = [(spec["key"], spec["label"]) for spec in param_schema.PARAMETER_SCHEMA]
 
 # Define which parameters are editable for each pacing mode
 MODE_PARAMETER_MAP = {
-    "AOO": [
-        "Lower Rate Limit",
-        "Upper Rate Limit",
-        "Atrial Amplitude",
-        "Atrial Pulse Width"
-    ],
-    "VOO": [
-        "Lower Rate Limit",
-        "Upper Rate Limit",
-        "Ventricular Amplitude",
-        "Ventricular Pulse Width"
-    ],
-    "AAI": [
-        "Lower Rate Limit",
-        "Upper Rate Limit",
-        "Atrial Amplitude",
-        "Atrial Pulse Width",
-        "Atrial Sensitivity",
-        "ARP",
-        "PVARP",
-        "Hysteresis",
-        "Rate Smoothing"
-    ],
-    "VVI": [
-        "Lower Rate Limit",
-        "Upper Rate Limit",
-        "Ventricular Amplitude",
-        "Ventricular Pulse Width",
-        "Ventricular Sensitivity",
-        "VRP",
-        "Hysteresis",
-        "Rate Smoothing"
-    ],
-    "AOOR": [
-        "Lower Rate Limit",
-        "Upper Rate Limit",
-        "Maximum Sensor Rate",
-        "Atrial Amplitude",
-        "Atrial Pulse Width",
-        "Activity Threshold",
-        "Reaction Time",
-        "Response Factor",
-        "Recovery Time"
-    ],
-    "VOOR": [
-        "Lower Rate Limit",
-        "Upper Rate Limit",
-        "Maximum Sensor Rate",
-        "Ventricular Amplitude",
-        "Ventricular Pulse Width",
-        "Activity Threshold",
-        "Reaction Time",
-        "Response Factor",
-        "Recovery Time"
-    ],
-    "AAIR": [
-        "Lower Rate Limit",
-        "Upper Rate Limit",
-        "Maximum Sensor Rate",
-        "Atrial Amplitude",
-        "Atrial Sensitivity",
-        "ARP",
-        "PVARP",
-        "Hysteresis",
-        "Rate Smoothing",
-        "Atrial Pulse Width",
-        "Activity Threshold",
-        "Reaction Time",
-        "Response Factor",
-        "Recovery Time"
-    ],
-    "VVIR": [
-        "Lower Rate Limit",
-        "Upper Rate Limit",
-        "Maximum Sensor Rate",
-        "Ventricular Amplitude",
-        "Ventricular Pulse Width",
-        "Ventricular Sensitivity",
-        "VRP",
-        "Hysteresis",
-        "Rate Smoothing",
-        "Activity Threshold",
-        "Reaction Time",
-        "Response Factor",
-        "Recovery Time"
-    ],
+    mode: [spec["label"] for spec in param_schema.PARAMETER_SCHEMA if mode in spec["modes"]]
+    for mode in param_schema.MODES
 }
 
 
@@ -144,3 +32,13 @@ def populate_parameter_entries(entries, device):
     for key, field_name in PARAMETER_MAPPING:
         entries[field_name].delete(0, "end")
         entries[field_name].insert(0, parameters.get(key, ""))
+
+
+# -----------------------------
+# Validation of parameter ranges
+# returns a list of error messages (empty when everything is valid)
+# no GUI here so it can also run headless, e.g. for bulk imports;
+# use param_schema.validate() for structured errors
+# -----------------------------
+def check_parameters(params):
+    return [error["message"] for error in param_schema.validate(params)]
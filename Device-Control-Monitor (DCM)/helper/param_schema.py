@@ -0,0 +1,247 @@
+# PARAMETER SCHEMA
+# single description of every programmable parameter: UI label, legal values,
+# which pacing modes use it and how it is packed into the 18-byte serial packet.
+# Validators and packet encoders are compiled from it once at import time.
+# No GUI imports here so it can run headless (bulk import, CLI, audits).
+
+import math
+import struct
+
+# pacing modes and their mode byte in the packet
+MODES = ["AOO", "VOO", "AAI", "VVI", "AOOR", "VOOR", "AAIR", "VVIR"]
+MODE_CODES = {mode: i + 1 for i, mode in enumerate(MODES)}
+
+ATRIAL = ["AOO", "AAI", "AOOR", "AAIR"]
+VENTRICULAR = ["VOO", "VVI", "VOOR", "VVIR"]
+RATE_ADAPTIVE = ["AOOR", "VOOR", "AAIR", "VVIR"]
+DEMAND = ["AAI", "VVI", "AAIR", "VVIR"]
+
+PACKET_HEADER = [0x16, 0x55]
+PACKET_LENGTH = 18
+
+ACTIVITY_THRESHOLDS = ["V-Low", "Low", "Med-Low", "Med", "Med-High", "High", "V-High"]
+
+# -----------------------------------------------------------------------------
+# The schema, in Dashboard field order
+#   range      (low, high) inclusive
+#   steps      [(band_high, step), ...] - first band whose high >= value decides the step
+#   choices    allowed string values
+#   required   missing / blank is an error (otherwise blank means "not set")
+#   packet     (byte number, multiplier, divisor) - byte = round(value * mul / div)
+#   codes      packet byte for each choice
+# -----------------------------------------------------------------------------
+PARAMETER_SCHEMA = [
+    {"key": "lower_rate_limit", "label": "Lower Rate Limit", "unit": "ppm", "modes": MODES,
+     "required": True, "range": (30, 175), "steps": [(50, 5), (90, 1), (175, 5)],
+     "increment_message": "Lower Rate Limit increment invalid. Must follow:\n"
+                          "• 30–50: increments of 5\n"
+                          "• 50–90: increments of 1\n"
+                          "• 90–175: increments of 5",
+     "packet": (4, 1, 1)},
+    {"key": "upper_rate_limit", "label": "Upper Rate Limit", "unit": "ppm", "modes": MODES,
+     "required": True, "range": (50, 175), "steps": [(175, 5)], "above": "lower_rate_limit",
+     "packet": (5, 1, 1)},
+    {"key": "maximum_sensor_rate", "label": "Maximum Sensor Rate", "unit": "ppm", "modes": RATE_ADAPTIVE,
+     "range": (50, 175), "steps": [(175, 5)], "packet": (6, 1, 1)},
+    {"key": "atrial_amplitude", "label": "Atrial Amplitude", "unit": "V", "modes": ATRIAL,
+     "range": (0, 5.0), "steps": [(5.0, 0.1)], "packet": (7, 10, 1)},
+    {"key": "ventricular_amplitude", "label": "Ventricular Amplitude", "unit": "V", "modes": VENTRICULAR,
+     "range": (0, 5.0), "steps": [(5.0, 0.1)], "packet": (8, 10, 1)},
+    {"key": "atrial_pulse_width", "label": "Atrial Pulse Width", "unit": "ms", "modes": ATRIAL,
+     "range": (1, 30), "steps": [(30, 1)], "packet": (9, 1, 1)},
+    {"key": "ventricular_pulse_width", "label": "Ventricular Pulse Width", "unit": "ms", "modes": VENTRICULAR,
+     "range": (1, 30), "steps": [(30, 1)], "packet": (10, 1, 1)},
+    {"key": "arp", "label": "ARP", "unit": "ms", "modes": ["AAI", "AAIR"],
+     "range": (150, 500), "steps": [(500, 10)], "packet": (14, 1, 10)},
+    {"key": "vrp", "label": "VRP", "unit": "ms", "modes": ["VVI", "VVIR"],
+     "range": (150, 500), "steps": [(500, 10)], "packet": (13, 1, 10)},
+    {"key": "atrial_sensitivity", "label": "Atrial Sensitivity", "unit": "mV", "modes": ["AAI", "AAIR"],
+     "range": (0, 5.0), "steps": [(5.0, 0.1)], "packet": (11, 10, 1)},
+    {"key": "ventricular_sensitivity", "label": "Ventricular Sensitivity", "unit": "mV", "modes": ["VVI", "VVIR"],
+     "range": (0, 5.0), "steps": [(5.0, 0.1)], "packet": (12, 10, 1)},
+    {"key": "pvarp", "label": "PVARP", "unit": "ms", "modes": ["AAI", "AAIR"],
+     "range": (150, 500), "steps": [(500, 10)]},
+    {"key": "hysteresis", "label": "Hysteresis", "modes": DEMAND, "off_or_equal": "lower_rate_limit"},
+    {"key": "rate_smoothing", "label": "Rate Smoothing", "modes": DEMAND,
+     "choices": ["0", "3", "6", "9", "12", "15", "18", "21", "25"]},
+    {"key": "activity_threshold", "label": "Activity Threshold", "modes": RATE_ADAPTIVE,
+     "choices": ACTIVITY_THRESHOLDS, "default": "Med",
+     "codes": {name: i + 1 for i, name in enumerate(ACTIVITY_THRESHOLDS)}, "packet": (15,)},
+    {"key": "reaction_time", "label": "Reaction Time", "unit": "s", "modes": RATE_ADAPTIVE,
+     "range": (10, 50), "steps": [(50, 10)], "packet": (16, 1, 1)},
+    {"key": "response_factor", "label": "Response Factor", "unit": "", "modes": RATE_ADAPTIVE,
+     "range": (1, 16), "steps": [(16, 1)], "packet": (17, 1, 1)},
+    {"key": "recovery_time", "label": "Recovery Time", "unit": "min", "modes": RATE_ADAPTIVE,
+     "range": (2, 16), "steps": [(16, 1)], "packet": (18, 1, 1)},
+]
+
+SCHEMA_BY_KEY = {spec["key"]: spec for spec in PARAMETER_SCHEMA}
+SCHEMA_BY_LABEL = {spec["label"]: spec for spec in PARAMETER_SCHEMA}
+
+
+# -----------------------------------------------------------------------------
+# Structured validation errors
+# code is one of "range", "increment", "choice", "order", "hysteresis"
+# -----------------------------------------------------------------------------
+def make_error(spec, code, message):
+    return {"key": spec["key"], "label": spec["label"], "code": code, "message": message}
+
+
+def to_number(value):
+    # "nan" / "inf" are not settings, treat them like any other non-number
+    try:
+        num = float(value)
+    except (TypeError, ValueError):
+        return None
+    return num if math.isfinite(num) else None
+
+
+def on_step(num, step):
+    return abs((num / step) - round(num / step)) < 1e-6
+
+
+# -----------------------------------------------------------------------------
+# Compile one validator per parameter
+# each validator is check(value, numbers) -> list of errors, where numbers holds
+# the already-parsed float of every parameter (None when not numeric)
+# -----------------------------------------------------------------------------
+def compile_validator(spec):
+    label = spec["label"]
+
+    if "choices" in spec:
+        allowed = frozenset(spec["choices"])
+        message = f"{label} must be one of: {', '.join(spec['choices'])}."
+
+        def check_choice(value, numbers):
+            if value not in allowed:
+                return [make_error(spec, "choice", message)]
+            return []
+        return check_choice
+
+    if "off_or_equal" in spec:
+        other = spec["off_or_equal"]
+
+        def check_off_or_equal(value, numbers):
+            if str(value).lower() == "off":
+                return []
+            num, target = numbers.get(spec["key"]), numbers.get(other)
+            if num is None or target is None:
+                return [make_error(spec, "hysteresis", f"{label} must be 'Off' or a numeric value equal to LRL.")]
+            if abs(num - target) > 0.1:
+                return [make_error(spec, "hysteresis", f"{label} must be 'Off' or equal to the Lower Rate Limit.")]
+            return []
+        return check_off_or_equal
+
+    low, high = spec["range"]
+    unit = spec["unit"]
+    steps = spec["steps"]
+    above = spec.get("above")
+    range_message = f"{label} must be between {low} and {high} {unit}."
+    step_message = spec.get("increment_message", f"{label} must increase in steps of {steps[0][1]} {unit}.")
+    above_message = f"{label} must be higher than {SCHEMA_BY_KEY[above]['label']}." if above else None
+
+    def check_number(value, numbers):
+        num = numbers.get(spec["key"])
+        if num is None or not (low <= num <= high):
+            return [make_error(spec, "range", range_message)]
+
+        errors = []
+        if above and numbers.get(above) is not None and num <= numbers[above]:
+            errors.append(make_error(spec, "order", above_message))
+        for band_high, step in steps:
+            if num <= band_high:
+                if not on_step(num, step):
+                    errors.append(make_error(spec, "increment", step_message))
+                break
+        return errors
+    return check_number
+
+
+VALIDATORS = [(spec["key"], spec.get("required", False), compile_validator(spec)) for spec in PARAMETER_SCHEMA]
+REQUIRED_KEYS = [spec["key"] for spec in PARAMETER_SCHEMA if spec.get("required")]
+
+
+# -----------------------------------------------------------------------------
+# Validate a parameter dict (values as typed in the Dashboard)
+# -----------------------------------------------------------------------------
+def validate(params):
+    numbers = {key: to_number(value) for key, value in params.items()}
+    # a missing required rate counts as 0 when other rules compare against it
+    for key in REQUIRED_KEYS:
+        numbers.setdefault(key, 0.0)
+    errors = []
+    for key, required, check in VALIDATORS:
+        value = params.get(key)
+        if not value and not required:
+            continue
+        errors.extend(check(value, numbers))
+    return errors
+
+
+# -----------------------------------------------------------------------------
+# Compile the packet encoder
+# one (byte position, encode) pair per packet parameter, encode(value) -> 0..255
+# -----------------------------------------------------------------------------
+def compile_encoder(spec):
+    if "codes" in spec:
+        codes = spec["codes"]
+        return lambda value: codes.get(value, 0)
+
+    _, mul, div = spec["packet"]
+
+    def encode(value):
+        num = to_number(value)
+        if num is None:
+            return 0
+        return max(0, min(int(round(num * mul / div)), 255))
+    return encode
+
+
+PACKET_FIELDS = sorted(
+    (spec["packet"][0], spec["key"], compile_encoder(spec))
+    for spec in PARAMETER_SCHEMA if "packet" in spec
+)
+
+# per mode: (byte index, parameter key, encoder) for the parameters it uses
+MODE_ENCODERS = {
+    mode: [(byte - 1, key, encode) for byte, key, encode in PACKET_FIELDS if mode in SCHEMA_BY_KEY[key]["modes"]]
+    for mode in MODES
+}
+
+
+def encode_packet(mode, params):
+    # parameters the mode doesn't use are sent as 0
+    packet = [0] * PACKET_LENGTH
+    packet[0], packet[1] = PACKET_HEADER
+    packet[2] = MODE_CODES.get(mode, 1)
+    for index, key, encode in MODE_ENCODERS.get(mode, []):
+        packet[index] = encode(params.get(key))
+    return struct.pack(f"{PACKET_LENGTH}B", *packet)
+
+
+# -----------------------------------------------------------------------------
+# Decode a packet back into (mode, {key: value}) - numbers as floats,
+# activity threshold as its name. Only the parameters the mode sends are returned.
+# -----------------------------------------------------------------------------
+def compile_decoder(spec):
+    if "codes" in spec:
+        names = {code: name for name, code in spec["codes"].items()}
+        return lambda byte: names.get(byte)
+
+    _, mul, div = spec["packet"]
+    return lambda byte: byte * div / mul
+
+
+MODE_DECODERS = {
+    mode: [(index, key, compile_decoder(SCHEMA_BY_KEY[key])) for index, key, _ in MODE_ENCODERS[mode]]
+    for mode in MODES
+}
+MODES_BY_CODE = {code: mode for mode, code in MODE_CODES.items()}
+
+
+def decode_packet(packet):
+    packet = bytes(packet)
+    if len(packet) != PACKET_LENGTH or list(packet[:2]) != PACKET_HEADER or packet[2] not in MODES_BY_CODE:
+        raise ValueError(f"not a parameter packet: {packet.hex()}")
+    mode = MODES_BY_CODE[packet[2]]
+    return mode, {key: decode(packet[index]) for index, key, decode in MODE_DECODERS[mode]}
@@ -0,0 +1,214 @@
+# PARAMETER SPACE
+# the legal parameter space is finite: every field has discrete steps and
+# every mode a fixed set of fields. This enumerates it lazily from
+# helper/param_schema - in order, by index (so it can be split across
+# processes) or by random sample - and checks two properties per combination:
+#   1. param_schema.validate() accepts it
+#   2. the 18-byte packet decodes back to exactly the programmed values
+#
+#   python -m helper.param_space [--mode AAIR] [--samples 200000] [--workers 4]
+#   python -m helper.param_space --mode AOO --exhaustive
+#
+# A combination programs every field of its mode. URL must be above LRL and
+# hysteresis is "Off" or equal to LRL, so LRL/URL are enumerated as one
+# dimension and hysteresis as (Off, same as LRL).
+
+import argparse
+import itertools
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from helper import param_schema
+
+SAME_AS_LRL = object()
+CHUNK_SIZE = 20000
+
+
+# -----------------------------------------------------------------------------
+# Legal values of one field, as the Dashboard would hold them (strings)
+# -----------------------------------------------------------------------------
+def tenths(num):
+    return int(round(num * 10))
+
+
+def legal_values(spec):
+    if "choices" in spec:
+        return list(spec["choices"])
+
+    low, high = spec["range"]
+    decimals = any(step != int(step) for _, step in spec["steps"]) or low != int(low) or high != int(high)
+    values = []
+    band_low = tenths(low)
+    for band_high, step in spec["steps"]:
+        step_t = tenths(step)
+        first = max(band_low, math.ceil(band_low / step_t) * step_t)
+        for value in range(first, tenths(band_high) + 1, step_t):
+            if value > tenths(high):
+                break
+            if not values or value > values[-1]:
+                values.append(value)
+        band_low = tenths(band_high) + 1
+    return [f"{value / 10:.1f}" if decimals else str(value // 10) for value in values]
+
+
+def rate_pairs():
+    lrl = legal_values(param_schema.SCHEMA_BY_KEY["lower_rate_limit"])
+    url = legal_values(param_schema.SCHEMA_BY_KEY["upper_rate_limit"])
+    return [(low, up) for low in lrl for up in url if float(up) > float(low)]
+
+
+# -----------------------------------------------------------------------------
+# Dimensions of a mode: [(keys, [value tuple, ...]), ...]
+# -----------------------------------------------------------------------------
+def mode_dimensions(mode):
+    dims = [(("lower_rate_limit", "upper_rate_limit"), rate_pairs())]
+    for spec in param_schema.PARAMETER_SCHEMA:
+        if mode not in spec["modes"] or spec["key"] in ("lower_rate_limit", "upper_rate_limit"):
+            continue
+        if "off_or_equal" in spec:
+            dims.append(((spec["key"],), [("Off",), (SAME_AS_LRL,)]))
+        else:
+            dims.append(((spec["key"],), [(value,) for value in legal_values(spec)]))
+    return dims
+
+
+DIMENSIONS = {mode: mode_dimensions(mode) for mode in param_schema.MODES}
+
+
+def space_size(mode):
+    return math.prod(len(values) for _, values in DIMENSIONS[mode])
+
+
+def combination(dims, picks):
+    params = {}
+    for (keys, _), pick in zip(dims, picks):
+        for key, value in zip(keys, pick):
+            params[key] = value
+    if params.get("hysteresis") is SAME_AS_LRL:
+        params["hysteresis"] = params["lower_rate_limit"]
+    return params
+
+
+def combination_at(mode, index):
+    # mixed radix, last dimension varies fastest (same order as iter_mode)
+    dims = DIMENSIONS[mode]
+    picks = []
+    for _, values in reversed(dims):
+        index, digit = divmod(index, len(values))
+        picks.append(values[digit])
+    return combination(dims, reversed(picks))
+
+
+def iter_mode(mode, start=0, stop=None):
+    dims = DIMENSIONS[mode]
+    if start == 0:
+        combos = itertools.product(*(values for _, values in dims))
+        for picks in itertools.islice(combos, stop):
+            yield combination(dims, picks)
+        return
+    for index in range(start, space_size(mode) if stop is None else stop):
+        yield combination_at(mode, index)
+
+
+def sample_mode(mode, count, seed=None):
+    rng = random.Random(seed)
+    size = space_size(mode)
+    for _ in range(count):
+        yield combination_at(mode, rng.randrange(size))
+
+
+# -----------------------------------------------------------------------------
+# Properties
+# -----------------------------------------------------------------------------
+def round_trips(mode, params):
+    decoded_mode, decoded = param_schema.decode_packet(param_schema.encode_packet(mode, params))
+    if decoded_mode != mode:
+        return False
+    for key, value in decoded.items():
+        if isinstance(value, str):
+            if value != params[key]:
+                return False
+        elif abs(value - float(params[key])) > 1e-9:
+            return False
+    return True
+
+
+def check_combinations(mode, combos):
+    # returns (checked, [(params, problem), ...]) - at most a few failures are kept
+    checked, failures = 0, []
+    for params in combos:
+        checked += 1
+        errors = param_schema.validate(params)
+        if errors:
+            failures.append((params, errors[0]["message"]))
+        elif not round_trips(mode, params):
+            failures.append((params, "packet does not round-trip"))
+        if len(failures) >= 10:
+            break
+    return checked, failures
+
+
+def check_range(job):
+    mode, start, stop = job
+    return check_combinations(mode, iter_mode(mode, start, stop))
+
+
+def check_sample(job):
+    mode, count, seed = job
+    return check_combinations(mode, sample_mode(mode, count, seed))
+
+
+def run_checks(mode, count=None, exhaustive=False, workers=None, seed=0):
+    # returns (checked, failures, seconds)
+    workers = workers or os.cpu_count() or 1
+    if exhaustive:
+        size = space_size(mode) if count is None else min(count, space_size(mode))
+        jobs = [(mode, start, min(start + CHUNK_SIZE, size)) for start in range(0, size, CHUNK_SIZE)]
+        worker = check_range
+    else:
+        count = count or 100000
+        jobs = [(mode, min(CHUNK_SIZE, count - start), seed * 1000003 + i)
+                for i, start in enumerate(range(0, count, CHUNK_SIZE))]
+        worker = check_sample
+
+    started = time.perf_counter()
+    checked, failures = 0, []
+    if workers <= 1 or len(jobs) == 1:
+        results = map(worker, jobs)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(worker, jobs)
+    for job_checked, job_failures in results:
+        checked += job_checked
+        failures.extend(job_failures)
+    if workers > 1 and len(jobs) > 1:
+        pool.shutdown()
+    return checked, failures, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enumerate the legal parameter space and check it")
+    parser.add_argument("--mode", choices=param_schema.MODES, help="only this pacing mode (default: all)")
+    parser.add_argument("--samples", type=int, default=None, help="combinations to check per mode")
+    parser.add_argument("--exhaustive", action="store_true", help="walk the space in order instead of sampling")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    failed = False
+    for mode in [args.mode] if args.mode else param_schema.MODES:
+        checked, failures, seconds = run_checks(mode, args.samples, args.exhaustive, args.workers, args.seed)
+        rate = checked / seconds if seconds else float("inf")
+        print(f"{mode:<5} space {space_size(mode):.3e}  checked {checked}  "
+              f"{rate:,.0f} combinations/s  failures {len(failures)}")
+        for params, problem in failures[:5]:
+            print(f"  {problem}: {params}")
+        failed = failed or bool(failures)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
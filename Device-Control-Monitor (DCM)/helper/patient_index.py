@@ -0,0 +1,141 @@
+# PATIENT SEARCH INDEX
+# as-you-type lookup of patients by name, id, device model and serial
+#   - prefix matches come from a sorted token list (bisect gives the same
+#     contiguous prefix range a trie would, without a dict per character)
+#   - fuzzy matches come from trigram postings, built the first time they're needed
+
+from array import array
+from bisect import bisect_left, insort
+
+
+# -----------------------------
+# Tokenizing helpers
+# -----------------------------
+def patient_tokens(patient):
+    device = patient.get("device", {})
+    text = " ".join([
+        str(patient.get("name", "")),
+        str(patient.get("id", "")),
+        str(device.get("model", "")),
+        str(device.get("serial", "")),
+    ])
+    return set(text.lower().split())
+
+
+def trigrams(token):
+    # pad so short words and word starts still produce trigrams
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class PatientIndex:
+    # fuzzy matches need at least this share of the query's trigrams
+    FUZZY_MIN_SCORE = 0.4
+
+    def __init__(self, patients=()):
+        self.rebuild(patients)
+
+    # -----------------------------
+    # Building / updating
+    # -----------------------------
+    def rebuild(self, patients):
+        # every stored patient gets an ordinal; ordinals are never reused so stale
+        # trigram postings can simply be skipped after a patient is removed
+        self._records = {}
+        self._ordinal_by_id = {}
+        self._next_ordinal = 0
+        self._trigram_postings = None
+
+        entries = []
+        for patient in patients:
+            ordinal = self._add_record(patient)
+            for token in patient_tokens(patient):
+                entries.append((token, ordinal))
+        entries.sort()
+        self._tokens = entries
+
+    def _add_record(self, patient):
+        ordinal = self._next_ordinal
+        self._next_ordinal += 1
+        self._records[ordinal] = patient
+        self._ordinal_by_id[patient.get("id")] = ordinal
+        return ordinal
+
+    def upsert(self, patient):
+        self.remove(patient.get("id"))
+        ordinal = self._add_record(patient)
+        for token in patient_tokens(patient):
+            insort(self._tokens, (token, ordinal))
+            if self._trigram_postings is not None:
+                self._add_trigrams(token, ordinal)
+
+    def remove(self, patient_id):
+        ordinal = self._ordinal_by_id.pop(patient_id, None)
+        if ordinal is None:
+            return
+        patient = self._records.pop(ordinal)
+        for token in patient_tokens(patient):
+            i = bisect_left(self._tokens, (token, ordinal))
+            if i < len(self._tokens) and self._tokens[i] == (token, ordinal):
+                del self._tokens[i]
+
+    def _add_trigrams(self, token, ordinal):
+        for gram in trigrams(token):
+            postings = self._trigram_postings.get(gram)
+            if postings is None:
+                postings = self._trigram_postings[gram] = array("l")
+            postings.append(ordinal)
+
+    def _build_trigrams(self):
+        self._trigram_postings = {}
+        for token, ordinal in self._tokens:
+            self._add_trigrams(token, ordinal)
+
+    # -----------------------------
+    # Lookups
+    # -----------------------------
+    def __len__(self):
+        return len(self._records)
+
+    def get(self, ordinal):
+        return self._records[ordinal]
+
+    def prefix_matches(self, prefix):
+        start = bisect_left(self._tokens, (prefix,))
+        end = bisect_left(self._tokens, (prefix + "￿",))
+        return {ordinal for _, ordinal in self._tokens[start:end]}
+
+    def fuzzy_matches(self, term):
+        if self._trigram_postings is None:
+            self._build_trigrams()
+
+        grams = trigrams(term)
+        counts = {}
+        for gram in grams:
+            for ordinal in self._trigram_postings.get(gram, ()):
+                counts[ordinal] = counts.get(ordinal, 0) + 1
+
+        needed = len(grams) * self.FUZZY_MIN_SCORE
+        return {o: c for o, c in counts.items() if c >= needed and o in self._records}
+
+    def search(self, query):
+        # returns ordinals, prefix hits in store order, else fuzzy hits best first
+        terms = query.lower().split()
+        if not terms:
+            return sorted(self._records)
+
+        hits = None
+        for term in terms:
+            matches = self.prefix_matches(term)
+            hits = matches if hits is None else hits & matches
+            if not hits:
+                break
+        if hits:
+            return sorted(hits)
+
+        # nothing starts with the query, fall back to typo tolerant matching
+        scores = {}
+        for term in terms:
+            for ordinal, count in self.fuzzy_matches(term).items():
+                scores[ordinal] = scores.get(ordinal, 0) + count
+        return sorted(scores, key=lambda o: (-scores[o], o))
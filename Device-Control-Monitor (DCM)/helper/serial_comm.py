@@ -1,5 +1,5 @@
 # Serial Comm
-import serial
+# pyserial is imported on connect so headless tools that never open a port start fast
 import struct
 import time
 
@@ -14,7 +14,9 @@ class PacemakerSerial:
         print(f"Attempting to connect to {self.port} @ {self.baud}...")
 
         try:
-            self.ser = serial.Serial(self.port, self.baud, timeout=1)
+            import serial
+            # serial_for_url also takes loop:// and socket://host:port for bench setups
+            self.ser = serial.serial_for_url(self.port, self.baud, timeout=1)
             print("SUCCESS: Serial connected.\n")
             return True
         except Exception as e:
@@ -35,8 +37,6 @@ class PacemakerSerial:
             print("ERROR: Serial not connected. Cannot send packet.\n")
             return
 
-        print("\n=== SENDING PACKET ===")
-
         # Build packet using dashboard method
         try:
             packet = dashboard.build_serial_packet()
@@ -44,12 +44,26 @@ class PacemakerSerial:
             print("[ERROR] Failed to build packet:", e)
             return
 
+        self.write_packet(packet)
+
+    def write_packet(self, packet):
+        """
+        Send an already encoded packet (e.g. from helper/packet_cache).
+        Returns the response bytes, or None if nothing was received / sent.
+        """
+        if not self.ser or not self.ser.is_open:
+            print("ERROR: Serial not connected. Cannot send packet.\n")
+            return None
+
+        print("\n=== SENDING PACKET ===")
+
         # Show packet contents for debugging
         packet_bytes = list(packet)
         print(f"[DEBUG] Packet ({len(packet_bytes)} bytes): {packet_bytes}")
         print(f"[DEBUG] Packet HEX: {[f'0x{b:02X}' for b in packet_bytes]}")
 
         # Send packet
+        resp = None
         try:
             bytes_written = self.ser.write(packet)
             self.ser.flush()
@@ -68,6 +82,7 @@ class PacemakerSerial:
             print("[ERROR] Failed to send packet:", e)
 
         print("=== END SEND PACKET ===\n")
+        return resp
 
     def read_telemetry_bytes(self):
         """
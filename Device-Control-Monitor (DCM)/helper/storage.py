@@ -1,41 +1,283 @@
 # STORAGE HELPERS
 # place to read/write user data and parameter data
 
+import copy
 import json
 import os
+import threading
+from helper import durability, packet_cache
+from helper.file_lock import locked
+from helper.json_stream import iter_array_items
 
 
 PATIENTS_FILE = os.path.join("data", "patients.json")
 
+# "journal" appends one record per patient change to a write-ahead journal next to
+# patients.json and replays it on load; "snapshot" rewrites patients.json every time
+PATIENT_STORAGE_MODE = "journal"
+
+# once the journal grows past this size it is folded back into patients.json
+JOURNAL_COMPACT_BYTES = 256 * 1024
+
+
+# raised when a record was changed by someone else since it was loaded
+class VersionConflictError(Exception):
+    pass
+
+
+# raised when a data file exists but can't be parsed; its contents are never
+# taken to be empty, which would wipe them on the next save
+class CorruptFileError(ValueError):
+    pass
+
+
+def _read_json(filepath):
+    with open(filepath, "r") as f:
+        try:
+            return json.load(f)
+        except ValueError as e:
+            raise CorruptFileError(f"{filepath} could not be read: {e}") from e
+
+
 # helper function to load the user data from user.json 
 def load_json(filepath, default_data):
     if not os.path.exists(filepath):
         os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        with open(filepath, "w") as f:
-            json.dump(default_data, f, indent=4)
-    with open(filepath, "r") as f:
-        return json.load(f)
+        with locked(filepath):
+            if not os.path.exists(filepath):
+                replace_json(filepath, default_data)
+
+    # shared lock - readers never block each other, only a writer
+    with locked(filepath, shared=True):
+        return _read_json(filepath)
 
 
 # helper function that saves new user data to file
 def save_json(filepath, data):
 
-    with open(filepath, "w") as f:
-        json.dump(data, f, indent=4)
+    with locked(filepath):
+        replace_json(filepath, data)
+
+
+# helper function for read-modify-write of a json file shared with other DCMs
+# update() gets the current contents from disk and returns what should be saved
+def update_json(filepath, default_data, update):
+    load_json(filepath, default_data)
+    with locked(filepath):
+        data = _read_json(filepath)
+        data = update(data)
+        replace_json(filepath, data)
+    return data
+
+
+# helper function that swaps in a new version of a json file in one step
+# (written to a temp file first so a crash never leaves a half written file)
+def replace_json(filepath, data):
+    durability.atomic_write_json(filepath, data)
         
         
+# -----------------------------
+# Patient journal helpers
+# -----------------------------
+# patients.json is the last compacted snapshot; patients.journal holds one JSON
+# record per line ({"op": "upsert", "patient": {...}} or {"op": "delete", "id": ...})
+# written after that snapshot. Replaying the journal over the snapshot gives the
+# current patient list.
+
+# replayed state kept between loads so only new journal records are read
+_patient_cache = {"key": None, "offset": 0, "patients": {}}
+_patient_cache_lock = threading.RLock()
+
+
+def journal_path():
+    base, _ = os.path.splitext(os.fspath(PATIENTS_FILE))
+    return base + ".journal"
+
+
+def _file_signature(path):
+    # identifies a snapshot file so a compaction by someone else invalidates the cache
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _read_snapshot(path):
+    patients = {}
+    if not os.path.exists(path):
+        return patients
+    for p in _read_json(path).get("patients", []):
+        patients[p.get("id")] = p
+    return patients
+
+
+def _apply_record(patients, record):
+    op = record.get("op")
+    if op == "upsert":
+        patient = record["patient"]
+        patients[patient.get("id")] = patient
+    elif op == "delete":
+        patients.pop(record.get("id"), None)
+
+
+def _replay_journal(path, offset, patients):
+    # apply every complete record after offset, return the new offset
+    with open(path, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            # a record without its newline was cut off mid-write, ignore it
+            if not line.endswith(b"\n"):
+                break
+            offset += len(line)
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            _apply_record(patients, record)
+    return offset
+
+
+# callers hold the patients file lock (shared or exclusive)
+def _load_patient_state():
+    with _patient_cache_lock:
+        return _refresh_patient_cache()
+
+
+def _refresh_patient_cache():
+    key = (os.fspath(PATIENTS_FILE), _file_signature(PATIENTS_FILE))
+    jpath = journal_path()
+    jsize = os.path.getsize(jpath) if os.path.exists(jpath) else 0
+
+    # start over from the snapshot if it changed or the journal was truncated
+    if _patient_cache["key"] != key or jsize < _patient_cache["offset"]:
+        # read first: a snapshot that fails to parse must not leave the cache marked fresh
+        patients = _read_snapshot(PATIENTS_FILE)
+        _patient_cache["key"] = key
+        _patient_cache["offset"] = 0
+        _patient_cache["patients"] = patients
+
+    if jsize > _patient_cache["offset"]:
+        _patient_cache["offset"] = _replay_journal(jpath, _patient_cache["offset"], _patient_cache["patients"])
+
+    return _patient_cache["patients"]
+
+
+def _write_snapshot(patients):
+    replace_json(PATIENTS_FILE, {"patients": patients})
+
+
+# callers hold the patients file lock; the records are written at once but only
+# durable after _commit_journal(ticket), which is called once the lock is
+# released so saves running at the same time share one fsync (group commit)
+def _append_journal(records):
+    jpath = journal_path()
+    _repair_journal_tail(jpath)
+    lines = "".join(json.dumps(r) + "\n" for r in records)
+    ticket = durability.open_log(jpath).append(lines.encode("utf-8"))
+
+    if os.path.getsize(jpath) > JOURNAL_COMPACT_BYTES:
+        _compact_locked()
+    return ticket
+
+
+def _commit_journal(ticket):
+    durability.open_log(journal_path()).commit(ticket)
+
+
+def _repair_journal_tail(jpath):
+    # a record cut off by a crash would swallow the next one appended after it
+    if not os.path.exists(jpath) or not os.path.getsize(jpath):
+        return
+    with open(jpath, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) == b"\n":
+            return
+        f.seek(0)
+        data = f.read()
+        f.truncate(data.rfind(b"\n") + 1)
+
+
+# next version for a patient about to be written, or fail if the copy being saved
+# was loaded before someone else's save / delete (expected=None skips the check)
+def _check_version(patients, patient_id, expected):
+    current = patients.get(patient_id)
+    stored = current.get("version", 0) if current else 0
+    if expected is not None and expected != stored:
+        raise VersionConflictError(
+            f"Patient {patient_id} was changed by another DCM since it was loaded."
+        )
+    return stored + 1
+
+
+# -----------------------------
+# Fold the journal into a fresh snapshot
+# -----------------------------
+def compact_patients():
+    with locked(PATIENTS_FILE):
+        _compact_locked()
+
+
+def _compact_locked():
+    patients = list(_load_patient_state().values())
+    _write_snapshot(patients)
+
+    # the snapshot now holds every record, start an empty journal
+    open(journal_path(), "w").close()
+
+
 # -----------------------------
 # Load all patients from file
 # -----------------------------
 def load_all_patients():
+    with locked(PATIENTS_FILE, shared=True):
+        return _load_all_patients_locked()
+
+
+# -----------------------------
+# Stream every patient without loading the whole store
+# -----------------------------
+# only the journal (kept small by compaction) is held in memory; the snapshot
+# is read one patient at a time. Writers wait until the iteration finishes.
+def iter_patients():
+    with locked(PATIENTS_FILE, shared=True):
+        overlay = {}
+        jpath = journal_path()
+        if PATIENT_STORAGE_MODE == "journal" and os.path.exists(jpath):
+            _replay_journal(jpath, 0, overlay)
+            # remember deletes too, they hide snapshot entries
+            with open(jpath, "rb") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get("op") == "delete" and record.get("id") not in overlay:
+                        overlay[record.get("id")] = None
+
+        if os.path.exists(PATIENTS_FILE):
+            for patient in iter_array_items(PATIENTS_FILE, "patients"):
+                patient_id = patient.get("id")
+                if patient_id in overlay:
+                    patient = overlay.pop(patient_id)
+                    if patient is None:
+                        continue
+                yield patient
+
+        for patient in overlay.values():
+            if patient is not None:
+                yield patient
+
+
+def _load_all_patients_locked():
+    if PATIENT_STORAGE_MODE == "journal":
+        # copies so callers editing a patient dict never touch the cached state
+        with _patient_cache_lock:
+            return copy.deepcopy(list(_load_patient_state().values()))
+
     if not os.path.exists(PATIENTS_FILE):
         return []
-    try:
-        with open(PATIENTS_FILE, "r") as f:
-            data = json.load(f)
-            return data.get("patients", [])
-    except:
-        return []
+    return _read_json(PATIENTS_FILE).get("patients", [])
 
 # -----------------------------
 # Load a patient by name
@@ -50,8 +292,28 @@ def load_patient_by_name(name):
 # -----------------------------
 # Save or update a patient
 # -----------------------------
+# patient["version"] is the version that was loaded (missing for a new patient);
+# if the stored copy moved on since then VersionConflictError is raised,
+# otherwise the patient is written and its version bumped in place
 def save_patient_to_file(patient):
-    patients = load_all_patients()
+    ticket = None
+    with locked(PATIENTS_FILE):
+        if PATIENT_STORAGE_MODE == "journal":
+            with _patient_cache_lock:
+                version = _check_version(_load_patient_state(), patient["id"], patient.get("version"))
+            ticket = _append_journal([{"op": "upsert", "patient": dict(patient, version=version)}])
+        else:
+            patients = _load_all_patients_locked()
+            version = _check_version({p.get("id"): p for p in patients}, patient["id"], patient.get("version"))
+            _save_snapshot_patient(patients, dict(patient, version=version))
+    if ticket:
+        _commit_journal(ticket)
+
+    packet_cache.invalidate(patient["id"])
+    patient["version"] = version
+
+
+def _save_snapshot_patient(patients, patient):
     updated = False
     
     for i in range(len(patients)):
@@ -63,15 +325,69 @@ def save_patient_to_file(patient):
     if not updated:
         patients.append(patient)
 
-    with open(PATIENTS_FILE, "w") as f:
-        json.dump({"patients": patients}, f, indent=4)
+    _write_snapshot(patients)
+
+# -----------------------------
+# Save many patients in one go (bulk import)
+# -----------------------------
+# one lock, one journal append and one fsync for the whole batch;
+# existing patients are overwritten and their versions bumped
+def save_patients_batch(patients):
+    ticket = None
+    with locked(PATIENTS_FILE):
+        if PATIENT_STORAGE_MODE == "journal":
+            with _patient_cache_lock:
+                current = _load_patient_state()
+                records = []
+                for patient in patients:
+                    version = _check_version(current, patient["id"], None)
+                    records.append({"op": "upsert", "patient": dict(patient, version=version)})
+            ticket = _append_journal(records)
+        else:
+            stored = _load_all_patients_locked()
+            current = {p.get("id"): p for p in stored}
+            for patient in patients:
+                version = _check_version(current, patient["id"], None)
+                patient = dict(patient, version=version)
+                if patient["id"] in current:
+                    stored[stored.index(current[patient["id"]])] = patient
+                else:
+                    stored.append(patient)
+                current[patient["id"]] = patient
+            _write_snapshot(stored)
+    if ticket:
+        _commit_journal(ticket)
+
+    for patient in patients:
+        packet_cache.invalidate(patient["id"])
 
 # -----------------------------
 # Delete a patient by ID
 # -----------------------------
-def delete_patient(patient_id):
+# pass the version that was loaded to refuse deleting a patient someone else just edited
+def delete_patient(patient_id, version=None):
+    ticket = None
+    with locked(PATIENTS_FILE):
+        if PATIENT_STORAGE_MODE == "journal":
+            with _patient_cache_lock:
+                current = _load_patient_state()
+                if version is not None:
+                    _check_version(current, patient_id, version)
+            ticket = _append_journal([{"op": "delete", "id": patient_id}])
+        else:
+            _delete_snapshot_patient(patient_id, version)
+    if ticket:
+        _commit_journal(ticket)
+
+    packet_cache.invalidate(patient_id)
+    print(f"Patient with ID {patient_id} has been deleted.")
+
+
+def _delete_snapshot_patient(patient_id, version):
     # Load all patients
-    patients = load_all_patients()
+    patients = _load_all_patients_locked()
+    if version is not None:
+        _check_version({p.get("id"): p for p in patients}, patient_id, version)
     updated_patients = []
     
     for patient in patients:
@@ -80,7 +396,4 @@ def delete_patient(patient_id):
             updated_patients.append(patient)
     
     # Save the updated list back to the JSON file
-    with open(PATIENTS_FILE, "w") as f:
-        json.dump({"patients": updated_patients}, f, indent=4)
-
-    print(f"Patient with ID {patient_id} has been deleted.")
+    _write_snapshot(updated_patients)
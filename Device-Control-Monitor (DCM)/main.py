@@ -8,12 +8,20 @@
 # have the mainloop running 
 
 import tkinter as tk
+import importlib
 import os
+from helper import metrics
 from helper.storage import load_json
-from gui.login_screen import LoginFrame
-from gui.register_screen import RegisterFrame
-from gui.dashboard import Dashboard
-from gui.egram_screen import EgramScreen
+from gui.ui_watchdog import UIWatchdog
+
+# Frames are only imported and built the first time they are shown
+# (the egram screen pulls in matplotlib, which is slow to import)
+FRAME_MODULES = {
+    "Login": ("gui.login_screen", "LoginFrame"),
+    "Register": ("gui.register_screen", "RegisterFrame"),
+    "Dashboard": ("gui.dashboard", "Dashboard"),
+    "EgramScreen": ("gui.egram_screen", "EgramScreen"),
+}
 
 
 class DCMApp:
@@ -24,33 +32,58 @@ class DCMApp:
         self.active_user = None #start the program with no one logged in
         
 
+        # optional live telemetry for other local viewers: DCM_TELEMETRY_PORT=8765
+        self.telemetry_server = None
+        if os.environ.get("DCM_TELEMETRY_PORT"):
+            from egram.telemetry_server import TelemetryServer
+            self.telemetry_server = TelemetryServer(port=int(os.environ["DCM_TELEMETRY_PORT"]))
+            self.telemetry_server.start()
+
         # Load data from the json file
         self.data_path = os.path.join("data", "users.json")
         self.data = load_json(self.data_path, {"users": []})
 
         # Container frame - essentially holding all frames as cards which can be cycled through
-        container = tk.Frame(self.root)
-        container.pack(fill="both", expand=True)
+        self.container = tk.Frame(self.root)
+        self.container.pack(fill="both", expand=True)
         
-        container.grid_rowconfigure(0, weight=1)
-        container.grid_columnconfigure(0, weight=1)
+        self.container.grid_rowconfigure(0, weight=1)
+        self.container.grid_columnconfigure(0, weight=1)
 
-        # Initialize all GUI frames - for loop creates a new instance of each frame on startup
-        # then places ontop of each other in the same spot using the grid function
+        # GUI frames are created on first use by get_frame and then placed ontop
+        # of each other in the same spot using the grid function
         self.frames = {}
-        for FrameClass in (LoginFrame, RegisterFrame, Dashboard, EgramScreen):
-            name = FrameClass.__name__.replace("Frame", "")
-            frame = FrameClass(container, self)
-            self.frames[name] = frame
-            frame.grid(row=0, column=0, sticky="nsew")
 
         # Start at login screen
         self.show_frame("Login")
 
+        # measure event-loop stalls; written to the metrics export on exit
+        self.watchdog = UIWatchdog(self.root)
+        self.watchdog.start()
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
+
+    def get_frame(self, name):   #build the frame the first time it is asked for
+        if name not in self.frames:
+            module_name, class_name = FRAME_MODULES[name]
+            FrameClass = getattr(importlib.import_module(module_name), class_name)
+            frame = FrameClass(self.container, self)
+            self.frames[name] = frame
+            frame.grid(row=0, column=0, sticky="nsew")
+        return self.frames[name]
+
     def show_frame(self, name):   #function used to show which frame is visible
-        frame = self.frames[name]
+        frame = self.get_frame(name)
         frame.tkraise()
 
+    def close(self):
+        self.watchdog.stop()
+        if getattr(self, "devices", None):
+            self.devices.stop_all()
+        if self.telemetry_server:
+            self.telemetry_server.stop()
+        print(f"Metrics written to {metrics.write_export()}")
+        self.root.destroy()
+
     def run(self):
         self.root.mainloop()
 
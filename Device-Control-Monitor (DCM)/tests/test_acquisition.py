@@ -0,0 +1,138 @@
+import socket
+import threading
+import time
+import numpy as np
+import pytest
+from egram import egram_storage
+from egram.acquisition import SampleRing, AcquisitionProcess, FIELD
+from egram.device_supervisor import DeviceSupervisor
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+@pytest.fixture
+def ring():
+    writer = SampleRing.create(capacity=8)
+    reader = SampleRing.attach(writer.name)
+    yield writer, reader
+    reader.close()
+    writer.close()
+    writer.unlink()
+
+
+@pytest.fixture
+def bench_port(tmp_path, monkeypatch):
+    # a fake pacemaker on socket://; the acquisition child inherits the cwd,
+    # so its session lands in tmp_path/data/egram.json
+    monkeypatch.chdir(tmp_path)
+    server = socket.create_server(("127.0.0.1", 0))
+    packets = []
+
+    def serve():
+        conn, _ = server.accept()
+        with conn:
+            time.sleep(0.5)     # pyserial drops whatever arrives before open() returns
+            conn.sendall(b"".join(packets))
+            time.sleep(5)
+
+    threading.Thread(target=serve, daemon=True).start()
+    yield packets, f"socket://127.0.0.1:{server.getsockname()[1]}"
+    server.close()
+
+
+def samples(start, stop):
+    return [{"t": i, "value": i / 2} for i in range(start, stop)]
+
+
+def wait_for(condition, timeout=20):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return condition()
+
+
+# -----------------------------
+# Ring buffer tests
+# -----------------------------
+def test_ring_reads_only_new_samples(ring):
+    writer, reader = ring
+    writer.write("atrial", samples(0, 5))
+
+    seq, block = reader.read_since("atrial", 0)
+    assert seq == 5 and block[:, 0].tolist() == [0, 1, 2, 3, 4]
+    assert reader.read_since("atrial", 5)[1].size == 0
+    assert reader.seq("ventricular") == 0
+
+
+def test_ring_skips_overwritten_samples_when_reader_falls_behind(ring):
+    writer, reader = ring
+    writer.write("atrial", samples(0, 5))
+    writer.write("atrial", samples(5, 20))
+
+    seq, block = reader.read_since("atrial", 3)
+    assert seq == 20
+    assert block[:, 0].tolist() == list(range(12, 20))
+    assert block[:, 1].tolist() == [i / 2 for i in range(12, 20)]
+
+
+def test_ring_skips_slots_a_write_in_progress_is_overwriting(ring):
+    writer, reader = ring
+    writer.write("atrial", samples(0, 8))
+
+    # the next write (samples 8..11) starts while the reader is copying: the
+    # writing counter is raised and slots 0..3 are overwritten, seq not bumped yet
+    data = reader.data
+
+    class WriterRacesTheCopy:
+        def __getitem__(self, key):
+            writer.header[FIELD["writing_atrial"]] = 12
+            writer.data[0, :4] = -1.0
+            return data[key]
+    reader.data = WriterRacesTheCopy()
+
+    seq, block = reader.read_since("atrial", 0)
+    reader.data = data
+    assert seq == 8
+    assert block[:, 0].tolist() == [4, 5, 6, 7]
+
+
+def test_ring_is_read_only_for_the_gui(ring):
+    writer, reader = ring
+    with pytest.raises(ValueError):
+        reader.data[0, 0, 0] = 1.0
+    with pytest.raises(ValueError):
+        reader.header[0] = 1
+
+
+# -----------------------------
+# Acquisition child process
+# -----------------------------
+def test_acquisition_process_fills_the_ring_and_the_session(bench_port):
+    packets, port = bench_port
+    packets.extend(bytes([0xAA, 0x22] + [0] * 16 + [i, 0]) for i in range(50))
+
+    supervisor = DeviceSupervisor()
+    device = supervisor.add_device("bench", port, "P001", process=True)
+    assert isinstance(device, AcquisitionProcess)
+    device.start()
+    try:
+        assert wait_for(lambda: device.view.seq("ventricular") == 50)
+        count, live = device.samples_since("ventricular", 40)
+        assert count == 50
+        assert [s["value"] for s in live] == [i / 10 for i in range(40, 50)]
+        assert device.status == "connected"
+        assert device.stats()["packets"] == 50 and device.stats()["pid"] != 0
+        assert wait_for(lambda: device.session is not None)
+    finally:
+        supervisor.stop_all()
+
+    assert device.view is None and not device.is_running()
+    session = egram_storage.load_sessions()["egram_sessions"][0]
+    assert session["patient_id"] == "P001"
+    # the GUI can review the child's session once the child has finished it
+    assert device.session.session_id == session["session_id"]
+    assert device.session.refresh().end_time is not None
+    assert session["settings"]["device_id"] == "bench"
+    stored = egram_storage.open_channel(session["session_id"], "ventricular")
+    assert np.allclose(stored["value"], [i / 10 for i in range(50)])
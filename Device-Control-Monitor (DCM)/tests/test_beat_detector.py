@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from egram.beat_detector import BeatDetector, MAX_RR_MS
+from egram.egram_utils import format_heart_rates
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+def ecg(rr_ms, seconds=30, fs=500, seed=50):
+    # R wave 300 ms into every beat, with P and T waves, baseline wander,
+    # noise, and the device's 0.1 mV resolution
+    t = np.arange(0, seconds * 1000, 1000 // fs)
+    phase = t % rr_ms
+    v = (1.5 * np.exp(-((phase - 300) / 8.0) ** 2) - 0.3 * np.exp(-((phase - 315) / 6.0) ** 2)
+         + 0.15 * np.exp(-((phase - 180) / 20.0) ** 2) + 0.35 * np.exp(-((phase - 550) / 45.0) ** 2)
+         + 0.3 * np.sin(2 * np.pi * 0.3 * t / 1000) + np.random.default_rng(seed).normal(0, 0.03, len(t)))
+    return [{"t": int(a), "value": float(b)} for a, b in zip(t, np.round(v * 10) / 10)]
+
+
+def detect(samples, batch):
+    detector = BeatDetector("ventricular", 500)
+    beats = []
+    for start in range(0, len(samples), batch):
+        beats.extend(detector.process(samples[start:start + batch]))
+    return detector, beats
+
+
+# -----------------------------
+# Detection
+# -----------------------------
+@pytest.mark.parametrize("rr_ms", [400, 800, 1200])
+def test_beats_and_rate_match_the_rhythm(rr_ms):
+    detector, beats = detect(ecg(rr_ms), 97)
+
+    # one beat per R wave (none for P or T waves), every R wave after the
+    # 2 s learning period found
+    r_waves = list(range(300, 30_000, rr_ms))
+    matched = []
+    for beat in beats:
+        nearest = min(r_waves, key=lambda r: abs(r - beat["timestamp_ms"]))
+        assert abs(beat["timestamp_ms"] - nearest) < 100
+        matched.append(nearest)
+    assert len(set(matched)) == len(matched)
+    assert set(r for r in r_waves if r > 2000) <= set(matched)
+    assert beats[-1]["abbr"] == "R" and beats[-1]["channel"] == "ventricular"
+    assert detector.current_rate() == pytest.approx(60_000 / rr_ms, rel=0.03)
+    assert beats[-1]["heart_rate_bpm"] == pytest.approx(60_000 / rr_ms, rel=0.03)
+
+
+def test_results_do_not_depend_on_batch_size():
+    samples = ecg(700, seconds=12)
+    _, one_by_one = detect(samples, 1)
+    _, batched = detect(samples, 500)
+    assert one_by_one == batched and one_by_one
+
+
+def test_rate_goes_stale_without_beats_and_gaps_are_flat():
+    samples = ecg(800, seconds=10)
+    detector, _ = detect(samples, 250)
+    assert detector.current_rate() == pytest.approx(75, rel=0.03)
+
+    # signal lost (None samples): no beats, and the rate is dropped after MAX_RR_MS
+    gap = [{"t": 10_000 + i * 2, "value": None} for i in range(MAX_RR_MS // 2 + 10)]
+    assert detector.process(gap) == []
+    assert detector.current_rate() is None
+
+
+def test_heart_rate_label():
+    assert format_heart_rates({"ventricular": 72.4, "atrial": None}) == "HR: V 72 bpm"
+    assert format_heart_rates({"ventricular": 72.4, "atrial": 71.6}) == "HR: V 72  A 72 bpm"
+    assert format_heart_rates({}) == "HR: --"
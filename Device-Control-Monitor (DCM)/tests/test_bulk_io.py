@@ -0,0 +1,106 @@
+import json
+import pytest
+from helper import storage, bulk_io, id_allocator
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+@pytest.fixture
+def patient_store(tmp_path, monkeypatch):
+    path = tmp_path / "patients.json"
+    with open(path, "w") as f:
+        json.dump({"patients": []}, f)
+    monkeypatch.setattr(storage, "PATIENTS_FILE", path)
+    return path
+
+
+def write_csv(path, rows):
+    header = "id,name,model,serial,mode,lower_rate_limit,upper_rate_limit,atrial_amplitude,atrial_pulse_width"
+    path.write_text("\n".join([header] + rows) + "\n")
+
+
+# -----------------------------
+# Import / export tests
+# -----------------------------
+def test_csv_import_reports_bad_rows_and_saves_the_rest(tmp_path, patient_store):
+    src = tmp_path / "clinic.csv"
+    write_csv(src, [
+        ",Alice,Dr1,A1,AOO,60,120,3.5,10",
+        ",Alice,Dr1,A1,VOO,60,120,,",
+        ",Bob,Dr1,B1,AOO,61.5,120,3.5,10",     # LRL increment invalid
+        ",,Dr1,C1,AOO,60,120,3.5,10",           # missing name
+        ",Dave,Dr1,D1,XYZ,60,120,3.5,10",       # unknown mode
+    ])
+
+    saved, report = bulk_io.import_patients(src, workers=1)
+
+    assert [p["name"] for p in saved] == ["Alice"]
+    assert set(saved[0]["device"]["modes"]) == {"AOO", "VOO"}
+    assert saved[0]["id"] == "P001"
+    assert saved[0]["device"]["dcm_serial"] == "DCM-001"
+    assert sorted(row for row, _ in report) == [4, 5, 6]
+
+    stored = storage.load_all_patients()
+    assert [p["name"] for p in stored] == ["Alice"]
+
+
+def test_existing_patients_need_update_flag(tmp_path, patient_store):
+    storage.save_patient_to_file({"id": "P007", "name": "Old", "device": {"modes": {}}})
+    src = tmp_path / "clinic.jsonl"
+    src.write_text(json.dumps({
+        "id": "P007", "name": "New",
+        "device": {"model": "Dr1", "serial": "S", "modes": {"AOO": {"parameters": {
+            "lower_rate_limit": 60, "upper_rate_limit": 120}}}}
+    }) + "\n")
+
+    saved, report = bulk_io.import_patients(src, workers=1)
+    assert saved == [] and len(report) == 1
+
+    saved, report = bulk_io.import_patients(src, workers=1, update=True)
+    assert report == []
+    stored = storage.load_all_patients()[0]
+    assert stored["name"] == "New"
+    assert stored["device"]["modes"]["AOO"]["parameters"]["lower_rate_limit"] == "60"
+
+
+def test_large_import_uses_pool_and_export_round_trips(tmp_path, patient_store, monkeypatch):
+    monkeypatch.setattr(bulk_io, "PARALLEL_MIN_ROWS", 20)
+    monkeypatch.setattr(bulk_io, "CHUNK_ROWS", 10)
+    src = tmp_path / "clinic.csv"
+    write_csv(src, [f"P{i:03d},Name{i},Dr1,S{i},AOO,60,120,3.5,10" for i in range(1, 61)])
+
+    saved, report = bulk_io.import_patients(src, workers=2)
+    assert report == [] and len(saved) == 60
+
+    out = tmp_path / "export.jsonl"
+    assert bulk_io.export_patients(out) == 60
+    exported = [json.loads(line) for line in out.read_text().splitlines()]
+    assert exported == storage.load_all_patients()
+
+    # new ids continue after the imported ones
+    storage.delete_patient("P060")
+    assert bulk_io.export_patients(out) == 59
+    assert id_allocator.next_patient_id() == "P061"
+
+
+def test_malformed_json_lines_are_reported_per_row(tmp_path, patient_store):
+    good = {"name": "Ann", "device": {"model": "Dr1", "serial": "A1", "dcm_serial": "DCM-005", "modes": {
+        "AOO": {"parameters": {"lower_rate_limit": 60, "upper_rate_limit": 120}}}}}
+    src = tmp_path / "clinic.jsonl"
+    src.write_text("\n".join(json.dumps(line) for line in [
+        "just a string",
+        [1],
+        {"name": "B", "device": "Dr1"},
+        {"name": "C", "device": {"model": "Dr1", "serial": "C1", "modes": ["AOO"]}},
+        {"name": "D", "device": {"model": "Dr1", "serial": "D1", "modes": {"AOO": 60}}},
+        {"id": 7, "name": "E", "device": {"model": "Dr1", "serial": "E1", "modes": {"AOO": {"parameters": {}}}}},
+        good,
+    ]) + "\n")
+
+    saved, report = bulk_io.import_patients(src, workers=1)
+    assert [p["name"] for p in saved] == ["Ann"]
+    assert sorted({row for row, _ in report}) == [1, 2, 3, 4, 5, 6]
+
+    # imported serials are never handed out again
+    assert id_allocator.next_dcm_serial() == "DCM-006"
@@ -29,12 +29,14 @@ def dashboard(mock_controller):
 def test_load_selected_patient(dashboard):
     patient_data = {"name": "John", "device": {"model": "X", "serial": "123"}}
 
-    with mock.patch("helper.storage.load_patient_by_name", return_value=patient_data):
+    with mock.patch("helper.storage.load_all_patients") as load_mock:
         with mock.patch("helper.patient_helpers.populate_patient_fields") as pop_mock:
-            dashboard.load_selected_patient("John")
+            dashboard.load_selected_patient(patient_data)
             pop_mock.assert_called_once_with(dashboard.patient_entries, patient_data)
             assert dashboard.patient == patient_data
+            assert dashboard.patient is not patient_data
             assert dashboard.patient_var.get() == "John"
+            load_mock.assert_not_called()
 
 # -----------------------------
 # Mode parameter update test
@@ -0,0 +1,100 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+import dcm_cli
+from helper import storage, param_schema, packet_cache
+from helper.serial_comm import PacemakerSerial
+from egram import egram_storage
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+@pytest.fixture
+def patient_store(tmp_path, monkeypatch):
+    path = tmp_path / "patients.json"
+    patients = [
+        {"id": "P001", "name": "Alice", "device": {"model": "Dr1", "serial": "A1", "modes": {
+            "AOO": {"parameters": {"lower_rate_limit": "60", "upper_rate_limit": "120",
+                                   "atrial_amplitude": "3.5", "atrial_pulse_width": "10"}},
+        }}},
+        {"id": "P002", "name": "Bob", "device": {"model": "Dr1", "serial": "B1", "modes": {
+            "VOO": {"parameters": {"lower_rate_limit": "61.5", "upper_rate_limit": "120"}},
+        }}},
+    ]
+    with open(path, "w") as f:
+        json.dump({"patients": patients}, f)
+    monkeypatch.setattr(storage, "PATIENTS_FILE", path)
+    monkeypatch.setattr(egram_storage, "EGRAM_FILE", str(tmp_path / "egram.json"))
+    packet_cache.invalidate()
+    return path
+
+
+def egram_packet(ventricular, atrial):
+    return bytes([0xAA, 0x22] + [0] * 16 + [ventricular & 0xFF, atrial & 0xFF])
+
+
+# -----------------------------
+# Headless start
+# -----------------------------
+def test_cli_never_imports_gui_libraries():
+    code = "import sys, dcm_cli; print(sorted(m for m in ('tkinter', 'matplotlib', 'numpy', 'serial') if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(dcm_cli.__file__)))
+    assert result.stdout.strip() == "[]"
+
+
+# -----------------------------
+# Commands
+# -----------------------------
+def test_list_and_validate(patient_store, capsys):
+    assert dcm_cli.main(["list"]) == 0
+    out = capsys.readouterr().out
+    assert "P001" in out and "2 patient(s)" in out
+
+    assert dcm_cli.main(["validate", "P001"]) == 0
+    assert dcm_cli.main(["validate"]) == 1
+    assert "P002 VOO:" in capsys.readouterr().out
+    assert dcm_cli.main(["validate", "P999"]) == 1
+
+
+def test_program_sends_stored_packet(patient_store, capsys):
+    # loop:// echoes the packet back as the "response"
+    assert dcm_cli.main(["program", "P001", "AOO", "--port", "loop://"]) == 0
+    expected = param_schema.encode_packet("AOO", {"lower_rate_limit": "60", "upper_rate_limit": "120",
+                                                  "atrial_amplitude": "3.5", "atrial_pulse_width": "10"})
+    assert f"Programmed AOO for P001: {list(expected)}" in capsys.readouterr().out
+
+    assert dcm_cli.main(["program", "P002", "VOO", "--port", "loop://"]) == 1
+    assert dcm_cli.main(["program", "P001", "VVI", "--port", "loop://"]) == 1
+
+
+def test_record_session_from_serial(patient_store):
+    link = PacemakerSerial(port="loop://")
+    assert link.connect()
+    link.ser.write(b"\x00" + egram_packet(25, -10) + egram_packet(30, 5))
+
+    class Publisher:
+        payloads = []
+
+        def publish_payload(self, payload):
+            self.payloads.append(payload)
+
+        def publish_status(self, status):
+            pass
+
+    session = dcm_cli.record_session(link, "P001", 0.2, publisher=Publisher())
+    link.close()
+
+    # the same stamped payloads the GUI pipeline publishes
+    assert [p["ventricular"][0]["value"] for p in Publisher.payloads] == [2.5, 3.0]
+    assert all("t" in p["atrial"][0] and "heart_rate" in p for p in Publisher.payloads)
+
+    stored = egram_storage.get_session(session["session_id"])
+    assert session["packets_received"] == 2
+    assert [s["value"] for s in stored["channels"]["ventricular"]["samples"]] == [2.5, 3.0]
+    assert [s["value"] for s in stored["channels"]["atrial"]["samples"]] == [-1.0, 0.5]
+    assert stored["end_time"] is not None
+    assert [entry["status"] for entry in stored["telemetry_status_log"]] == ["created", "connected", "disconnected"]
@@ -0,0 +1,142 @@
+import time
+import numpy as np
+import pytest
+from helper import metrics
+from helper.serial_comm import PacemakerSerial
+from egram import egram_storage, device_supervisor
+from egram.egram_utils import PacketFramer
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+@pytest.fixture
+def egram_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(egram_storage, "EGRAM_FILE", str(tmp_path / "egram.json"))
+    monkeypatch.setattr(device_supervisor, "FLUSH_SECONDS", 0.05)
+    monkeypatch.setattr(device_supervisor, "RECONNECT_SECONDS", 0.05)
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def egram_packet(ventricular, atrial):
+    return bytes([0xAA, 0x22] + [0] * 16 + [ventricular & 0xFF, atrial & 0xFF])
+
+
+def wait_for(condition, timeout=3):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+# -----------------------------
+# Framer tests
+# -----------------------------
+def test_framer_resyncs_and_keeps_partial_packets():
+    framer = PacketFramer(20)
+    packet = egram_packet(10, 20)
+
+    assert framer.feed(b"\x01\x02\xaa" + packet[:7]) == []
+    assert framer.feed(packet[7:] + packet + b"\xaa") == [packet, packet]
+    assert framer.skipped == 3
+    assert bytes(framer.buffer) == b"\xaa"
+
+
+# -----------------------------
+# Supervisor tests (loop:// ports, one per device)
+# -----------------------------
+def test_devices_run_concurrently_with_their_own_sessions_and_metrics(egram_file):
+    supervisor = device_supervisor.DeviceSupervisor()
+    links = {}
+    for device_id, value in (("bench-1", 10), ("bench-2", 20)):
+        link = PacemakerSerial(port="loop://")
+        assert link.connect()
+        link.ser.write(egram_packet(value, -value) * 3)
+        links[device_id] = link
+        supervisor.add_device(device_id, "loop://", "P00" + device_id[-1], transport=link)
+        supervisor.start(device_id)
+
+    assert wait_for(lambda: all(p.counts["packets"] == 3 for p in supervisor.pipelines.values()))
+
+    # switching the selected device doesn't disturb intake
+    assert supervisor.selected().device_id == "bench-1"
+    supervisor.select("bench-2")
+    links["bench-1"].ser.write(egram_packet(40, 0))
+    assert wait_for(lambda: supervisor.get("bench-1").counts["packets"] == 4)
+
+    count, samples = supervisor.get("bench-2").samples_since("ventricular", 0)
+    assert count == 3 and [s["value"] for s in samples] == [2.0, 2.0, 2.0]
+    assert supervisor.get("bench-1").samples_since("ventricular", 3)[1][0]["value"] == 4.0
+
+    stats = supervisor.stats()
+    supervisor.stop_all()
+
+    assert metrics.export()["counters"]["device.bench-1.packets"] == 4
+    assert metrics.export()["counters"]["device.bench-2.packets"] == 3
+    assert stats["bench-1"]["session_id"] != stats["bench-2"]["session_id"]
+    for device_id, patient_id, expected in (("bench-1", "P001", 4), ("bench-2", "P002", 3)):
+        session = egram_storage.get_session(stats[device_id]["session_id"])
+        assert session["patient_id"] == patient_id
+        assert session["settings"]["device_id"] == device_id
+        assert len(session["channels"]["ventricular"]["samples"]) == expected
+        assert session["end_time"] is not None
+
+
+def test_start_right_after_a_non_blocking_stop_restarts(egram_file):
+    link = PacemakerSerial(port="loop://")
+    assert link.connect()
+    pipeline = device_supervisor.DevicePipeline("bench", "loop://", "P001", transport=link)
+    pipeline.start()
+    assert wait_for(lambda: pipeline.status == "connected")
+    first = pipeline.session.session_id
+
+    pipeline.stop(wait=False)
+    pipeline.start()
+    assert pipeline.is_running()
+    assert wait_for(lambda: pipeline.status == "connected" and pipeline.session is not None)
+    assert pipeline.session.session_id != first
+    pipeline.stop()
+
+
+def test_missing_port_keeps_retrying(egram_file):
+    supervisor = device_supervisor.DeviceSupervisor()
+    pipeline = supervisor.add_device("ghost", "/dev/does-not-exist", "P009")
+    pipeline.start()
+
+    assert wait_for(lambda: pipeline.counts["reconnects"] >= 2)
+    assert pipeline.status == "reconnecting"
+    supervisor.stop_all()
+    assert pipeline.status == "stopped" and pipeline.session is None
+
+    with pytest.raises(ValueError):
+        supervisor.add_device("ghost", "COM9", "P009")
+
+
+def test_detected_beats_become_live_and_stored_markers(egram_file):
+    # 12 s of a 75 bpm ventricular signal, R wave every 800 ms
+    t = np.arange(0, 12_000, 2)
+    phase = t % 800
+    counts = np.round(15 * np.exp(-((phase - 300) / 8.0) ** 2) + 3 * np.exp(-((phase - 550) / 45.0) ** 2)).astype(int)
+
+    link = PacemakerSerial(port="loop://")
+    assert link.connect()
+    supervisor = device_supervisor.DeviceSupervisor()
+    pipeline = supervisor.add_device("bench", "loop://", "P001", transport=link)
+    pipeline.start()
+    # loop:// queues at most 4096 bytes: write in batches the pipeline drains
+    for start in range(0, len(counts), 100):
+        link.ser.write(b"".join(egram_packet(int(c), 0) for c in counts[start:start + 100]))
+
+    assert wait_for(lambda: pipeline.counts["packets"] == len(t), timeout=10)
+    _, markers = pipeline.markers_since(0)
+    beats = [m for m in markers if m.get("source") == "detector"]
+    assert {m["abbr"] for m in beats} == {"R"} and len(beats) >= 12
+    assert pipeline.heart_rates()["ventricular"] == pytest.approx(75, rel=0.03)
+    assert pipeline.heart_rates()["atrial"] is None
+
+    session_id = pipeline.session.session_id
+    supervisor.stop_all()
+    stored = egram_storage.get_session(session_id)["markers"]
+    assert [m for m in stored if m.get("source") == "detector"] == beats
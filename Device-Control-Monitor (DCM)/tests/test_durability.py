@@ -0,0 +1,197 @@
+import json
+import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+import numpy as np
+import pytest
+from helper import durability, storage
+from egram import egram_storage, session_segments
+
+DCM_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "PATIENTS_FILE", str(tmp_path / "patients.json"))
+    monkeypatch.setattr(storage, "PATIENT_STORAGE_MODE", "journal")
+    monkeypatch.setattr(egram_storage, "EGRAM_FILE", str(tmp_path / "egram.json"))
+    return tmp_path
+
+
+class PowerCut(Exception):
+    pass
+
+
+def crash_in_dump(monkeypatch):
+    # half the JSON reaches the temp file, then the power goes
+    def dump(data, f, **kwargs):
+        f.write(json.dumps(data)[:10])
+        raise PowerCut()
+    monkeypatch.setattr(durability.json, "dump", dump)
+
+
+def crash_in_fsync(monkeypatch):
+    def fsync(fd):
+        raise PowerCut()
+    monkeypatch.setattr(durability.os, "fsync", fsync)
+
+
+def crash_in_replace(monkeypatch):
+    def replace(src, dst):
+        raise PowerCut()
+    monkeypatch.setattr(durability.os, "replace", replace)
+
+
+# -----------------------------
+# Snapshots
+# -----------------------------
+@pytest.mark.parametrize("crash", [crash_in_dump, crash_in_fsync, crash_in_replace])
+def test_a_crash_while_saving_leaves_the_previous_file(data_dir, monkeypatch, crash):
+    path = str(data_dir / "users.json")
+    storage.save_json(path, {"users": [{"name": "a"}]})
+
+    with monkeypatch.context() as m:
+        crash(m)
+        with pytest.raises(PowerCut):
+            storage.save_json(path, {"users": [{"name": "a"}, {"name": "b"}]})
+        with pytest.raises(PowerCut):
+            storage.update_json(path, {"users": []}, lambda data: {"users": []})
+
+    assert storage.load_json(path, {"users": []}) == {"users": [{"name": "a"}]}
+    # the leftover temp file doesn't get in the way of the next save
+    storage.save_json(path, {"users": []})
+    assert storage.load_json(path, {"users": [{"name": "x"}]}) == {"users": []}
+
+
+def test_a_damaged_patients_file_is_reported_not_emptied(data_dir):
+    storage.save_patients_batch([{"id": "P001", "name": "A"}, {"id": "P002", "name": "B"}])
+    storage.compact_patients()
+    with open(storage.PATIENTS_FILE, "r+") as f:
+        f.truncate(20)      # what an in-place write cut by a power loss leaves
+
+    with pytest.raises(storage.CorruptFileError):
+        storage.load_all_patients()
+    with pytest.raises(storage.CorruptFileError):
+        storage.compact_patients()
+    assert os.path.getsize(storage.PATIENTS_FILE) == 20
+    with pytest.raises(storage.CorruptFileError):
+        storage.load_json(storage.PATIENTS_FILE, {"patients": []})
+
+
+# -----------------------------
+# Append logs
+# -----------------------------
+def test_concurrent_saves_share_journal_fsyncs(data_dir, monkeypatch):
+    fsync = os.fsync
+
+    def slow_fsync(fd):
+        time.sleep(0.005)
+        fsync(fd)
+    monkeypatch.setattr(durability.os, "fsync", slow_fsync)
+
+    def save(worker):
+        for i in range(25):
+            storage.save_patient_to_file({"id": f"P{worker}{i:02d}", "name": "x"})
+
+    threads = [threading.Thread(target=save, args=(w,)) for w in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    log = durability.open_log(storage.journal_path())
+    assert log.synced == log.appended
+    assert log.fsyncs < 200
+    assert len(storage.load_all_patients()) == 200
+
+
+def test_a_journal_record_cut_off_by_a_crash_is_dropped_cleanly(data_dir):
+    storage.save_patient_to_file({"id": "P001", "name": "A"})
+    with open(storage.journal_path(), "a") as f:
+        f.write('{"op": "upsert", "patient": {"id": "P0')
+    storage.save_patient_to_file({"id": "P002", "name": "B"})
+
+    storage._patient_cache["key"] = None
+    assert sorted(p["id"] for p in storage.load_all_patients()) == ["P001", "P002"]
+
+
+def test_segment_appends_are_fsynced_in_groups(data_dir):
+    sid = egram_storage.create_session("P001", {})["session_id"]
+    for i in range(200):
+        egram_storage.add_samples(sid, "atrial", [{"t": i * 10 + k, "value": 0.1} for k in range(5)])
+
+    directory = egram_storage.session_dir(sid)
+    log = durability.open_log(session_segments.segment_file(directory, "atrial", 0, ".open"))
+    assert log.appended == 200 and log.fsyncs <= 1
+
+    egram_storage.finish_session(sid)
+    assert log.f.closed and log.synced == log.appended
+    assert egram_storage.get_samples(sid, "atrial")["t"].size == 1000
+
+
+# -----------------------------
+# Killed writers
+# -----------------------------
+WRITER = """
+import sys, time
+from helper import storage
+from egram import egram_storage, session_segments
+
+data, epoch = sys.argv[1], float(sys.argv[2])
+storage.PATIENTS_FILE = data + "/patients.json"
+storage.JOURNAL_COMPACT_BYTES = 4096
+egram_storage.EGRAM_FILE = data + "/egram.json"
+session_segments.SEGMENT_MS = 200
+
+# picks up the session the previous (killed) writer left open
+session = egram_storage.get_or_start_session("P001")
+print("ready", flush=True)
+i = 0
+while True:
+    storage.save_patient_to_file({"id": "P%03d" % (i % 40), "name": "n%d" % i})
+    storage.save_json(data + "/users.json", {"users": [{"name": "u%d" % i}] * (i % 50)})
+    t = int((time.time() - epoch) * 1000)
+    session.add_samples("atrial", [{"t": t, "value": (k % 256 - 128) / 10} for k in range(50)])
+    if i % 10 == 0:
+        session.add_marker({"abbr": "AS", "timestamp_ms": t})
+    i += 1
+"""
+
+
+@pytest.mark.skipif(os.name == "nt", reason="needs SIGKILL")
+def test_data_survives_writers_killed_at_random_points(data_dir):
+    env = dict(os.environ, PYTHONPATH=DCM_ROOT)
+    epoch = time.time()
+    rng = random.Random(49)
+    for _ in range(6):
+        writer = subprocess.Popen([sys.executable, "-c", WRITER, str(data_dir), str(epoch)],
+                                  env=env, stdout=subprocess.PIPE, text=True)
+        assert writer.stdout.readline().strip() == "ready"
+        time.sleep(rng.uniform(0.05, 0.4))
+        writer.send_signal(signal.SIGKILL)
+        writer.wait()
+        writer.stdout.close()
+
+    # every file still parses; nothing was replaced by an empty default
+    assert len(storage.load_all_patients()) == 40
+    assert "users" in storage.load_json(str(data_dir / "users.json"), {"users": None})
+    sessions = egram_storage.load_sessions()["egram_sessions"]
+    assert len(sessions) == 1 and sessions[0]["markers"]
+
+    # one session across all writers, samples in time order up to the last kill
+    sid = sessions[0]["session_id"]
+    t = egram_storage.get_samples(sid, "atrial")["t"]
+    assert t.size and np.all(np.diff(t) >= 0)
+
+    # the next writer recovers the segments and finishes the session
+    egram_storage.add_samples(sid, "atrial", [{"t": int(t[-1]) + 1, "value": 1.0}])
+    egram_storage.finish_session(sid)
+    stored = egram_storage.get_samples(sid, "atrial")
+    assert stored["t"].size == t.size + 1 and stored["value"][-1] == 1.0
@@ -0,0 +1,180 @@
+import os
+import numpy as np
+import pytest
+from helper import storage
+from egram import egram_storage, column_store
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+@pytest.fixture
+def egram_file(tmp_path, monkeypatch):
+    path = tmp_path / "egram.json"
+    monkeypatch.setattr(egram_storage, "EGRAM_FILE", str(path))
+    return path
+
+
+# -----------------------------
+# Session storage tests
+# -----------------------------
+def test_session_round_trip(egram_file):
+    session = egram_storage.create_session("P001", {"egm_gain": "2X"})
+    sid = session["session_id"]
+
+    egram_storage.add_samples(sid, "atrial", [{"t": 0, "value": 0.1}, {"t": 2, "value": 0.2}])
+    egram_storage.add_marker(sid, {"channel": "atrial", "abbr": "AS", "timestamp_ms": 2})
+    egram_storage.set_telemetry(sid, "connected")
+
+    stored = egram_storage.get_session(sid)
+    assert stored["settings"]["egm_gain"] == "2X"
+    assert stored["channels"]["atrial"]["samples"][-1] == {"t": 2, "value": 0.2}
+    assert stored["markers"][0]["abbr"] == "AS"
+    assert stored["telemetry_status_log"][-1]["status"] == "connected"
+
+    assert egram_storage.get_or_start_session("P001").session_id == sid
+    egram_storage.finish_session(sid)
+    assert egram_storage.get_or_start_session("P001").session_id != sid
+
+
+def test_save_sessions_merges_and_detects_conflicts(egram_file):
+    a = egram_storage.create_session("P001", {})
+    mine = egram_storage.load_sessions()
+
+    # another writer adds session b, then we save our edit of a
+    b = egram_storage.create_session("P002", {})
+    mine["egram_sessions"][0]["markers"].append({"abbr": "AS"})
+    egram_storage.save_sessions(mine)
+
+    ids = [s["session_id"] for s in egram_storage.load_sessions()["egram_sessions"]]
+    assert ids == [a["session_id"], b["session_id"]]
+    assert egram_storage.get_session(a["session_id"])["markers"] == [{"abbr": "AS"}]
+
+    # another writer changes a again, our copy is now stale
+    egram_storage.add_marker(a["session_id"], {"abbr": "VS"})
+    mine["egram_sessions"][0]["markers"].append({"abbr": "AP"})
+    with pytest.raises(storage.VersionConflictError):
+        egram_storage.save_sessions(mine)
+    assert egram_storage.get_session(a["session_id"])["markers"] == [{"abbr": "AS"}, {"abbr": "VS"}]
+
+
+# -----------------------------
+# Sample files of finished sessions
+# -----------------------------
+def test_finish_moves_samples_to_compressed_files(egram_file):
+    sid = egram_storage.create_session("P001", {})["session_id"]
+    egram_storage.add_samples(sid, "atrial", [{"t": t, "value": t / 4} for t in range(0, 2000, 2)])
+    egram_storage.add_samples(sid, "ventricular", [{"t": 0, "value": -1.2}, {"t": 2, "value": None}])
+    egram_storage.finish_session(sid)
+
+    raw = egram_storage.load_sessions()["egram_sessions"][0]["channels"]["atrial"]
+    assert raw["samples"] == [] and raw["storage"] == "compressed" and raw["count"] == 1000
+    assert os.path.exists(egram_storage.channel_file(sid, "atrial"))
+
+    columns = egram_storage.open_channel(sid, "atrial")
+    window = column_store.time_slice(columns, 500, 510)
+    assert window["t"].tolist() == [500, 502, 504, 506, 508]
+    assert window["value"].tolist() == [125.0, 125.5, 126.0, 126.5, 127.0]
+
+    # existing callers still see plain sample dicts
+    session = egram_storage.get_session(sid)
+    assert session["channels"]["atrial"]["samples"][1] == {"t": 2, "value": 0.5}
+    assert session["channels"]["ventricular"]["samples"] == [{"t": 0, "value": -1.2}, {"t": 2, "value": None}]
+    assert egram_storage.open_channel(sid, "surface")["t"].size == 0
+
+
+def test_sessions_finished_as_column_files_still_read(egram_file):
+    sid = egram_storage.create_session("P001", {})["session_id"]
+    column_store.write_samples(egram_storage.channel_file(sid, "atrial", ".col"), [{"t": 0, "value": 0.5}])
+    egram_storage.update_session(sid, lambda s: s["channels"]["atrial"].update(storage="columns", count=1))
+
+    assert isinstance(egram_storage.open_channel(sid, "atrial")["t"], np.memmap)
+    assert egram_storage.get_session(sid)["channels"]["atrial"]["samples"] == [{"t": 0, "value": 0.5}]
+
+
+def test_saving_an_expanded_session_keeps_samples_out_of_the_json(egram_file):
+    sid = egram_storage.create_session("P001", {})["session_id"]
+    egram_storage.add_samples(sid, "atrial", [{"t": 0, "value": 1.0}])
+    egram_storage.finish_session(sid)
+    egram_storage.add_samples(sid, "atrial", [{"t": 2, "value": 2.0}])
+
+    session = egram_storage.get_session(sid)
+    assert [s["t"] for s in session["channels"]["atrial"]["samples"]] == [0, 2]
+    session["markers"].append({"abbr": "AS"})
+    egram_storage.save_sessions({"egram_sessions": [session]})
+
+    raw = egram_storage.load_sessions()["egram_sessions"][0]
+    assert raw["channels"]["atrial"]["samples"] == [{"t": 2, "value": 2.0}]
+    assert [s["t"] for s in egram_storage.get_session(sid)["channels"]["atrial"]["samples"]] == [0, 2]
+
+
+def test_column_file_round_trip(tmp_path):
+    path = tmp_path / "x.col"
+    column_store.write_columns(path, {"a": [1, 2, 3], "b": [0.5, 1.5, 2.5]}, [("a", "<i8"), ("b", "<f4")], {"k": 1})
+    columns, meta = column_store.open_columns(path)
+    assert meta == {"k": 1}
+    assert columns["a"].tolist() == [1, 2, 3] and columns["b"].tolist() == [0.5, 1.5, 2.5]
+
+    with pytest.raises(ValueError):
+        column_store.write_columns(path, {"a": [1], "b": []}, [("a", "<i8"), ("b", "<f4")])
+
+
+def test_get_samples_reads_a_time_range(egram_file):
+    sid = egram_storage.create_session("P001", {})["session_id"]
+    egram_storage.add_samples(sid, "ventricular", [{"t": t, "value": (t % 256 - 128) / 10} for t in range(0, 20000, 2)])
+
+    # still recording: served from the open segment
+    live = egram_storage.get_samples(sid, "ventricular", 100, 106)
+    assert live["t"].tolist() == [100, 102, 104]
+
+    egram_storage.finish_session(sid)
+    window = egram_storage.get_samples(sid, "ventricular", 9990, 10010)
+    assert window["t"].tolist() == list(range(9990, 10010, 2))
+    assert window["value"].tolist() == [(t % 256 - 128) / 10 for t in range(9990, 10010, 2)]
+
+    chunks = list(egram_storage.iter_samples(sid, "ventricular", 0, 20000))
+    assert sum(len(c["t"]) for c in chunks) == 10000 and len(chunks) > 1
+    assert egram_storage.get_samples(sid, "atrial", 0, 100)["t"].size == 0
+    with pytest.raises(ValueError):
+        egram_storage.get_samples(sid, "lead3")
+
+
+# -----------------------------
+# Session handles
+# -----------------------------
+def test_handle_loads_metadata_lazily_and_resumes_from_the_index(egram_file, monkeypatch):
+    handle = egram_storage.get_or_start_session("P001", {"egm_gain": "2X"})
+    handle.add_samples("atrial", [{"t": i, "value": 0.1} for i in range(1000)])
+    handle.add_marker({"abbr": "AS"})
+    handle.set_telemetry("connected")
+
+    # resuming reads the open index only, never egram.json
+    def no_load():
+        raise AssertionError("egram.json loaded")
+    monkeypatch.setattr(egram_storage, "load_sessions", no_load)
+    resumed = egram_storage.get_or_start_session("P001")
+    assert resumed.session_id == handle.session_id
+    assert resumed.settings["egm_gain"] == "2X"
+    assert resumed.loaded is None
+
+    assert resumed.channels["atrial"]["count"] == 1000
+    assert "samples" not in resumed.channels["atrial"]
+    assert resumed.markers == [{"abbr": "AS"}]
+    assert resumed.status_log[-1]["status"] == "connected"
+    assert list(resumed.samples("atrial", 10, 13)["t"]) == [10, 11, 12]
+
+    resumed.finish()
+    assert resumed.end_time is not None
+    assert egram_storage.open_sessions() == {}
+    assert list(resumed.samples("atrial", 998)["t"]) == [998, 999]
+
+
+def test_open_index_is_rebuilt_for_existing_files(egram_file):
+    a = egram_storage.create_session("P001", {})
+    b = egram_storage.create_session("P002", {})
+    egram_storage.finish_session(b["session_id"])
+    os.remove(egram_storage.open_index_file())
+
+    assert list(egram_storage.open_sessions()) == ["P001"]
+    assert egram_storage.get_or_start_session("P001").session_id == a["session_id"]
+    assert egram_storage.get_or_start_session("P002").session_id != b["session_id"]
@@ -0,0 +1,56 @@
+import threading
+import pytest
+from helper.file_lock import locked
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+@pytest.fixture
+def data_file(tmp_path):
+    return tmp_path / "patients.json"
+
+
+def hold(path, shared, taken, release):
+    with locked(path, shared=shared):
+        taken.set()
+        release.wait(5)
+
+
+# -----------------------------
+# Lock tests
+# -----------------------------
+def test_readers_share_the_lock(data_file):
+    taken, release = threading.Event(), threading.Event()
+    reader = threading.Thread(target=hold, args=(data_file, True, taken, release))
+    reader.start()
+    try:
+        assert taken.wait(5)
+        second, done = threading.Event(), threading.Event()
+        done.set()
+        other = threading.Thread(target=hold, args=(data_file, True, second, done))
+        other.start()
+        # a second reader gets in while the first still holds the lock
+        assert second.wait(2)
+        other.join()
+    finally:
+        release.set()
+        reader.join()
+
+
+def test_writer_waits_for_readers(data_file):
+    taken, release = threading.Event(), threading.Event()
+    reader = threading.Thread(target=hold, args=(data_file, True, taken, release))
+    reader.start()
+    assert taken.wait(5)
+
+    written, done = threading.Event(), threading.Event()
+    done.set()
+    writer = threading.Thread(target=hold, args=(data_file, False, written, done))
+    writer.start()
+    assert not written.wait(0.3)
+
+    release.set()
+    reader.join()
+    assert written.wait(5)
+    writer.join()
@@ -4,7 +4,10 @@ import json
 import tkinter as tk
 from unittest.mock import Mock, patch
 
-from helper import storage, patient_helpers
+from concurrent.futures import ThreadPoolExecutor
+
+from helper import storage, patient_helpers, id_allocator
+from helper.patient_index import PatientIndex
 
 
 # -------------------------------
@@ -44,19 +47,24 @@ def dashboard_mock():
 # -------------------------------
 # TESTS FOR PATIENT HELPERS
 # -------------------------------
-def test_generate_unique_patient_id_empty(dashboard_mock):
+def test_generate_unique_patient_id_empty(dashboard_mock, temp_patient_file, monkeypatch):
+    monkeypatch.setattr(storage, "PATIENTS_FILE", temp_patient_file)
     dashboard_mock.patients = []
     result = patient_helpers.generate_unique_patient_id(dashboard_mock)
     assert result == "P001"
 
 
-def test_generate_unique_patient_id_increments(dashboard_mock):
+def test_generate_unique_patient_id_increments(dashboard_mock, temp_patient_file, monkeypatch):
+    monkeypatch.setattr(storage, "PATIENTS_FILE", temp_patient_file)
     dashboard_mock.patients = [{"id": "P001"}, {"id": "P002"}]
+    for p in dashboard_mock.patients:
+        storage.save_patient_to_file(p)
     result = patient_helpers.generate_unique_patient_id(dashboard_mock)
     assert result == "P003"
 
 
-def test_clear_fields_resets_entries(dashboard_mock):
+def test_clear_fields_resets_entries(dashboard_mock, temp_patient_file, monkeypatch):
+    monkeypatch.setattr(storage, "PATIENTS_FILE", temp_patient_file)
     # Fill entries
     for e in dashboard_mock.patient_entries.values():
         e.insert(0, "test")
@@ -67,6 +75,8 @@ def test_clear_fields_resets_entries(dashboard_mock):
     assert dashboard_mock.patient_entries["Name"].get() == ""
     assert dashboard_mock.patient_entries["Model"].get() == ""
     assert dashboard_mock.patient_var.get() == "New Patient"
+    assert dashboard_mock.patient_entries["ID"].get() == patient_helpers.NEW_PATIENT_ID
+    assert not os.path.exists(id_allocator.sequences_path())
     dashboard_mock.update_mode_parameters.assert_called_once()
 
 
@@ -120,3 +130,137 @@ def test_delete_patient(temp_patient_file, monkeypatch):
     patients = storage.load_all_patients()
     assert len(patients) == 1
     assert patients[0]["id"] == "P002"
+
+
+def test_journal_save_does_not_rewrite_snapshot(temp_patient_file, monkeypatch):
+    monkeypatch.setattr(storage, "PATIENTS_FILE", temp_patient_file)
+    before = temp_patient_file.read_text()
+    storage.save_patient_to_file({"id": "P001", "name": "A"})
+    storage.save_patient_to_file({"id": "P001", "name": "A2"})
+
+    # the change lives in the journal until compaction
+    assert temp_patient_file.read_text() == before
+    patients = storage.load_all_patients()
+    assert patients == [{"id": "P001", "name": "A2", "version": 2}]
+
+
+def test_journal_ignores_torn_last_record(temp_patient_file, monkeypatch):
+    monkeypatch.setattr(storage, "PATIENTS_FILE", temp_patient_file)
+    storage.save_patient_to_file({"id": "P001", "name": "A"})
+
+    # simulate a crash halfway through writing the next record
+    with open(storage.journal_path(), "a") as f:
+        f.write('{"op": "upsert", "patient": {"id": "P0')
+
+    patients = storage.load_all_patients()
+    assert [p["id"] for p in patients] == ["P001"]
+
+
+def test_compact_patients_writes_snapshot(temp_patient_file, monkeypatch):
+    monkeypatch.setattr(storage, "PATIENTS_FILE", temp_patient_file)
+    storage.save_patient_to_file({"id": "P001", "name": "A"})
+    storage.save_patient_to_file({"id": "P002", "name": "B"})
+    storage.delete_patient("P001")
+    storage.compact_patients()
+
+    with open(temp_patient_file) as f:
+        assert json.load(f) == {"patients": [{"id": "P002", "name": "B", "version": 1}]}
+    assert os.path.getsize(storage.journal_path()) == 0
+    assert storage.load_all_patients() == [{"id": "P002", "name": "B", "version": 1}]
+
+
+def test_journal_compacts_past_threshold(temp_patient_file, monkeypatch):
+    monkeypatch.setattr(storage, "PATIENTS_FILE", temp_patient_file)
+    monkeypatch.setattr(storage, "JOURNAL_COMPACT_BYTES", 200)
+    for i in range(10):
+        storage.save_patient_to_file({"id": f"P{i:03d}", "name": "X" * 20})
+
+    assert os.path.getsize(storage.journal_path()) <= 200
+    assert len(storage.load_all_patients()) == 10
+
+
+@pytest.mark.parametrize("mode", ["journal", "snapshot"])
+def test_stale_patient_save_raises_conflict(temp_patient_file, monkeypatch, mode):
+    monkeypatch.setattr(storage, "PATIENTS_FILE", temp_patient_file)
+    monkeypatch.setattr(storage, "PATIENT_STORAGE_MODE", mode)
+    storage.save_patient_to_file({"id": "P001", "name": "A"})
+
+    # two workstations load the same patient
+    mine = storage.load_all_patients()[0]
+    theirs = storage.load_all_patients()[0]
+
+    theirs["name"] = "Theirs"
+    storage.save_patient_to_file(theirs)
+
+    mine["name"] = "Mine"
+    with pytest.raises(storage.VersionConflictError):
+        storage.save_patient_to_file(mine)
+    with pytest.raises(storage.VersionConflictError):
+        storage.delete_patient("P001", mine["version"])
+
+    assert storage.load_all_patients()[0]["name"] == "Theirs"
+
+
+def test_different_patients_merge_without_conflict(temp_patient_file, monkeypatch):
+    monkeypatch.setattr(storage, "PATIENTS_FILE", temp_patient_file)
+    storage.save_patient_to_file({"id": "P001", "name": "A"})
+    storage.save_patient_to_file({"id": "P002", "name": "B"})
+
+    a, b = storage.load_all_patients()
+    a["name"] = "A2"
+    b["name"] = "B2"
+    storage.save_patient_to_file(a)
+    storage.save_patient_to_file(b)
+
+    assert [p["name"] for p in storage.load_all_patients()] == ["A2", "B2"]
+
+
+# -------------------------------
+# TESTS FOR ID ALLOCATOR
+# -------------------------------
+def test_allocator_never_reuses_deleted_ids(temp_patient_file, monkeypatch):
+    monkeypatch.setattr(storage, "PATIENTS_FILE", temp_patient_file)
+    storage.save_patient_to_file({"id": "P001", "name": "A", "device": {"dcm_serial": "DCM-001"}})
+    storage.save_patient_to_file({"id": "P002", "name": "B", "device": {"dcm_serial": "DCM-002"}})
+
+    # counters are seeded from the highest ids on first use, then persist
+    assert id_allocator.next_patient_id() == "P003"
+    assert id_allocator.next_dcm_serial() == "DCM-003"
+    storage.delete_patient("P002")
+    assert id_allocator.next_patient_id() == "P004"
+    assert id_allocator.next_dcm_serial() == "DCM-004"
+
+
+def test_allocator_concurrent_allocations_are_unique(temp_patient_file, monkeypatch):
+    monkeypatch.setattr(storage, "PATIENTS_FILE", temp_patient_file)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        ids = list(pool.map(lambda _: id_allocator.next_patient_id(), range(64)))
+    assert len(set(ids)) == 64
+
+
+def test_ids_are_only_allocated_when_a_new_patient_is_saved(temp_patient_file, monkeypatch):
+    monkeypatch.setattr(storage, "PATIENTS_FILE", temp_patient_file)
+    monkeypatch.setattr(patient_helpers, "messagebox", Mock())
+    form = {"ID": patient_helpers.NEW_PATIENT_ID, "Name": "alice", "Model": "x1", "Serial": "s1"}
+    dashboard = Mock(patient=None, serial_link=None)
+    dashboard.patient_entries = {key: Mock(get=Mock(return_value=form[key])) for key in ("ID", "Name")}
+    dashboard.param_entries = {key: Mock(get=Mock(return_value=form[key])) for key in ("Model", "Serial")}
+    dashboard.current_mode.get.return_value = "AOO"
+    dashboard.patient_buttons.return_value = dashboard.connection_buttons.return_value = []
+    dashboard.tasks.submit = lambda name, work, on_done, **kwargs: on_done(work())
+    dashboard.patient_index = PatientIndex()
+    dashboard.patient_index.search("alise")     # builds the fuzzy postings
+
+    # a rejected form uses up nothing
+    dashboard.read_parameter_entries.return_value = {"lower_rate_limit": "500"}
+    patient_helpers.save_patient_from_dashboard(dashboard)
+    assert not os.path.exists(id_allocator.sequences_path())
+
+    dashboard.read_parameter_entries.return_value = {"lower_rate_limit": "60", "upper_rate_limit": "120"}
+    patient_helpers.save_patient_from_dashboard(dashboard)
+    saved = storage.load_all_patients()
+    assert [(p["id"], p["device"]["dcm_serial"]) for p in saved] == [("P001", "DCM-001")]
+    assert id_allocator.next_patient_id() == "P002"
+    # the saved patient is added to the search index, which is not rebuilt
+    assert dashboard.patient_index._trigram_postings is not None
+    assert [dashboard.patient_index.get(o)["id"] for o in dashboard.patient_index.search("alise")] == ["P001"]
@@ -0,0 +1,155 @@
+import io
+import json
+import os
+import tracemalloc
+import pytest
+from helper import json_stream
+from helper.json_stream import StreamReader
+from egram import egram_storage, legacy_egram
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+@pytest.fixture
+def legacy_file(tmp_path, monkeypatch):
+    path = tmp_path / "egram.json"
+    monkeypatch.setattr(egram_storage, "EGRAM_FILE", str(path))
+    with open(os.path.join(os.path.dirname(__file__), "..", "data", "egram.json")) as f:
+        data = json.load(f)
+
+    # a longer recording next to the shipped example sessions
+    long_session = json.loads(json.dumps(data["egram_sessions"][0]))
+    long_session["session_id"] = "EGRAM_LONG"
+    long_session["channels"]["ventricular"]["samples"] = [
+        {"t": t, "value": (t % 200 - 100) / 10} for t in range(0, 100_000, 2)]
+    long_session["channels"]["atrial"]["samples"] = [{"t": 0, "value": None}, {"t": 2, "value": 0.3}]
+    data["egram_sessions"].append(long_session)
+
+    with open(path, "w") as f:
+        json.dump(data, f, indent=4)
+    return path, data
+
+
+# -----------------------------
+# Pull parser
+# -----------------------------
+def test_numbers_cut_at_the_buffer_end_are_read_whole(monkeypatch):
+    monkeypatch.setattr(json_stream, "CHUNK_SIZE", 4)
+    reader = json_stream.StreamReader(io.StringIO('[-10.0, 1e5, 22, true]'))
+    assert [reader.value() for _ in reader.items()] == [-10.0, 1e5, 22, True]
+
+
+def test_reader_skips_and_descends_without_loading_everything():
+    reader = StreamReader(io.StringIO('{"a": [1, {"b": [2, 3]}], "c": {"d": "x,]}"}, "e": []}'))
+    seen = {}
+    for name in reader.members():
+        if name == "c":
+            seen[name] = {key: reader.value() for key in reader.members()}
+        elif name == "e":
+            seen[name] = list(reader.items())
+        else:
+            reader.skip()
+    assert seen == {"c": {"d": "x,]}"}, "e": []}
+
+
+# -----------------------------
+# Reading legacy sessions
+# -----------------------------
+def test_lists_metadata_with_counts_instead_of_samples(legacy_file):
+    path, data = legacy_file
+    sessions = legacy_egram.list_session_meta()
+
+    assert [s["session_id"] for s in sessions] == [s["session_id"] for s in data["egram_sessions"]]
+    last = sessions[-1]
+    assert last["channels"]["ventricular"] == {"enabled": True, "count": 50_000}
+    assert "samples" not in json.dumps(sessions)
+    assert last["markers"] == data["egram_sessions"][0]["markers"]
+
+
+def test_streams_one_sessions_samples(legacy_file):
+    path, data = legacy_file
+    samples = legacy_egram.iter_samples("EGRAM_LONG", "ventricular")
+    assert next(samples) == {"t": 0, "value": -10.0}
+    assert sum(1 for _ in samples) == 49_999
+
+    first = data["egram_sessions"][0]
+    assert list(legacy_egram.iter_samples(first["session_id"], "atrial")) == first["channels"]["atrial"]["samples"]
+    assert list(legacy_egram.iter_samples("EGRAM_MISSING", "atrial")) == []
+
+
+def test_session_id_after_the_channels_still_works(tmp_path):
+    path = tmp_path / "egram.json"
+    path.write_text(json.dumps({"egram_sessions": [
+        {"channels": {"atrial": {"samples": [{"t": 0, "value": 1.0}]}}, "session_id": "S1"}]}))
+    assert list(legacy_egram.iter_samples("S1", "atrial", str(path))) == [{"t": 0, "value": 1.0}]
+
+
+# -----------------------------
+# Migration
+# -----------------------------
+def test_migration_moves_samples_out_with_bounded_memory(legacy_file, monkeypatch):
+    path, data = legacy_file
+    legacy_size = os.path.getsize(path)
+    monkeypatch.setattr(legacy_egram, "BATCH", 512)
+    tracemalloc.start()
+    result = legacy_egram.migrate()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    total = sum(len(c["samples"]) for s in data["egram_sessions"] for c in s["channels"].values())
+    assert result == {"sessions": len(data["egram_sessions"]), "samples": total}
+    assert peak < legacy_size / 5
+
+    raw = json.loads(path.read_text())
+    assert all(c["samples"] == [] for s in raw["egram_sessions"] for c in s["channels"].values())
+    assert os.path.getsize(path) < 20_000
+
+    long_session = egram_storage.get_session("EGRAM_LONG")
+    assert long_session["channels"]["ventricular"]["samples"] == data["egram_sessions"][-1]["channels"]["ventricular"]["samples"]
+    assert long_session["channels"]["atrial"]["samples"] == [{"t": 0, "value": None}, {"t": 2, "value": 0.3}]
+    assert egram_storage.get_samples("EGRAM_LONG", "ventricular", 1000, 1004)["value"].tolist() == [-10.0, -9.8]
+
+    # running it again changes nothing
+    assert legacy_egram.migrate()["samples"] == 0
+    assert egram_storage.get_session("EGRAM_LONG")["channels"]["atrial"]["count"] == 2
+
+
+def test_migration_keeps_samples_added_to_stored_channels(legacy_file):
+    sid = egram_storage.create_session("P001", {})["session_id"]
+    egram_storage.add_samples(sid, "atrial", [{"t": 0, "value": 0.1}])
+    egram_storage.finish_session(sid)
+    egram_storage.add_samples(sid, "atrial", [{"t": 2, "value": 0.2}])
+
+    legacy_egram.migrate()
+
+    raw = [s for s in egram_storage.load_sessions()["egram_sessions"] if s["session_id"] == sid][0]
+    assert raw["channels"]["atrial"]["samples"] == [{"t": 2, "value": 0.2}]
+    assert raw["channels"]["atrial"]["count"] == 1
+    assert [s["t"] for s in egram_storage.get_session(sid)["channels"]["atrial"]["samples"]] == [0, 2]
+
+
+def test_migrating_another_file_writes_next_to_it(legacy_file, tmp_path, monkeypatch):
+    path, data = legacy_file
+    elsewhere = tmp_path / "default" / "egram.json"
+    monkeypatch.setattr(egram_storage, "EGRAM_FILE", str(elsewhere))
+
+    assert legacy_egram.main(["migrate", str(path)]) == 0
+    assert not os.path.exists(egram_storage.sessions_dir())
+    assert os.path.exists(egram_storage.channel_file("EGRAM_LONG", "ventricular", root=str(tmp_path / "egram_sessions")))
+
+    monkeypatch.setattr(egram_storage, "EGRAM_FILE", str(path))
+    assert egram_storage.get_samples("EGRAM_LONG", "ventricular", 1000, 1004)["value"].tolist() == [-10.0, -9.8]
+
+
+def test_migrated_timestamps_that_restarted_only_increase(legacy_file, monkeypatch):
+    monkeypatch.setattr(legacy_egram, "BATCH", 7)
+    legacy_egram.migrate()
+
+    # the shipped session restarts t at 0 every 20 samples (0..38 ms)
+    t = egram_storage.get_samples("EGRAM_A2E22F57", "atrial")["t"]
+    assert t.size == 540
+    assert t.tolist() == list(range(0, 1080, 2))
+    window = egram_storage.get_samples("EGRAM_A2E22F57", "atrial", 10, 20)
+    assert window["t"].tolist() == [10, 12, 14, 16, 18]
+    assert legacy_egram.rebase([5, 6, 0, 1, 1, 0], {"raw": None, "offset": 0, "step": 1}).tolist() == [5, 6, 7, 8, 8, 9]
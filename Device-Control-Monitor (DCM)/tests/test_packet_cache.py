@@ -0,0 +1,68 @@
+import json
+import pytest
+from helper import storage, param_schema, packet_cache
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+@pytest.fixture
+def patient_store(tmp_path, monkeypatch):
+    path = tmp_path / "patients.json"
+    with open(path, "w") as f:
+        json.dump({"patients": []}, f)
+    monkeypatch.setattr(storage, "PATIENTS_FILE", path)
+    packet_cache.invalidate()
+    yield path
+    packet_cache.invalidate()
+
+
+def make_patient(lrl="60"):
+    return {
+        "id": "P001",
+        "name": "Alice",
+        "device": {"model": "Dr1", "serial": "A1", "dcm_serial": "DCM-001", "modes": {
+            "AOO": {"parameters": {"lower_rate_limit": lrl, "upper_rate_limit": "120",
+                                   "atrial_amplitude": "3.5", "atrial_pulse_width": "10"}},
+            "VVI": {"parameters": {"lower_rate_limit": lrl, "upper_rate_limit": "120",
+                                   "ventricular_amplitude": "4.0", "ventricular_pulse_width": "5",
+                                   "ventricular_sensitivity": "2.5", "vrp": "320"}},
+        }},
+    }
+
+
+# -----------------------------
+# Packet cache tests
+# -----------------------------
+def test_packet_built_from_stored_parameters(patient_store):
+    patient = make_patient()
+    packet = packet_cache.packet_for(patient, "AOO")
+
+    assert packet == param_schema.encode_packet("AOO", patient["device"]["modes"]["AOO"]["parameters"])
+    assert packet_cache.packet_for(patient, "AOO") is packet
+    assert packet_cache.cached_keys() == [("P001", "AOO")]
+
+
+def test_changed_parameters_are_re_encoded(patient_store):
+    old = packet_cache.packet_for(make_patient("60"), "AOO")
+    new = packet_cache.packet_for(make_patient("70"), "AOO")
+
+    assert old[3] == 60 and new[3] == 70
+
+
+def test_save_and_delete_invalidate(patient_store):
+    patient = make_patient()
+    packet_cache.packet_for(patient, "AOO")
+    packet_cache.packet_for(patient, "VVI")
+
+    storage.save_patient_to_file(patient)
+    assert packet_cache.cached_keys() == []
+
+    packet_cache.packet_for(storage.load_all_patients()[0], "VVI")
+    storage.delete_patient("P001")
+    assert packet_cache.cached_keys() == []
+
+
+def test_unknown_mode_raises(patient_store):
+    with pytest.raises(KeyError):
+        packet_cache.packet_for(make_patient(), "AAIR")
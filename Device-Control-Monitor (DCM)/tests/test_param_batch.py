@@ -0,0 +1,94 @@
+import json
+import numpy as np
+import pytest
+from helper import storage, param_schema, param_batch
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+@pytest.fixture
+def patient_store(tmp_path, monkeypatch):
+    path = tmp_path / "patients.json"
+    patients = [
+        {"id": "P001", "name": "Alice", "device": {"modes": {
+            "AOO": {"parameters": {"lower_rate_limit": "60", "upper_rate_limit": "120",
+                                   "atrial_amplitude": "3.5", "atrial_pulse_width": "10"}},
+            "AAI": {"parameters": {"lower_rate_limit": "60", "upper_rate_limit": "55",
+                                   "hysteresis": "61", "rate_smoothing": "3"}},
+        }}},
+        {"id": "P002", "name": "Bob", "device": {"modes": {
+            "VVIR": {"parameters": {"lower_rate_limit": "61.5", "upper_rate_limit": "120",
+                                    "activity_threshold": "Extreme"}},
+        }}},
+    ]
+    with open(path, "w") as f:
+        json.dump({"patients": patients}, f)
+    monkeypatch.setattr(storage, "PATIENTS_FILE", path)
+    return path
+
+
+ROWS = [
+    {"lower_rate_limit": "60", "upper_rate_limit": "120", "atrial_amplitude": "3.5"},
+    {"lower_rate_limit": "37", "upper_rate_limit": "120"},
+    {"lower_rate_limit": "100", "upper_rate_limit": "90", "hysteresis": "Off"},
+    {"lower_rate_limit": "abc", "upper_rate_limit": "", "arp": "155"},
+    {"lower_rate_limit": "60", "upper_rate_limit": "120", "hysteresis": "60.05", "rate_smoothing": "4"},
+    {"lower_rate_limit": "nan", "upper_rate_limit": "120", "hysteresis": "60", "activity_threshold": "Med"},
+    {"upper_rate_limit": "120", "atrial_sensitivity": "2.35", "activity_threshold": ""},
+]
+
+
+# -----------------------------
+# Batch validation tests
+# -----------------------------
+def test_bitmask_matches_scalar_validation():
+    masks = param_batch.validate_table(param_batch.table_from_dicts(ROWS))
+
+    assert masks.dtype == np.uint64
+    for row, mask in zip(ROWS, masks):
+        expected = [(e["key"], e["code"]) for e in param_schema.validate(row)]
+        assert param_batch.describe(mask) == expected, row
+    assert masks[0] == 0
+
+
+def test_numeric_columns_are_used_directly():
+    table = param_batch.build_table({
+        "lower_rate_limit": np.array([60.0, 61.5, 95.0]),
+        "upper_rate_limit": np.array([120.0, 120.0, 90.0]),
+        "activity_threshold": np.array([3, param_batch.NOT_ALLOWED, param_batch.NOT_SET]),
+    })
+    masks = param_batch.validate_table(table)
+
+    assert [param_batch.describe(m) for m in masks] == [
+        [],
+        [("lower_rate_limit", "increment"), ("activity_threshold", "choice")],
+        [("upper_rate_limit", "order")],
+    ]
+
+
+def test_mismatched_column_lengths_rejected():
+    with pytest.raises(ValueError):
+        param_batch.build_table({"lower_rate_limit": ["60", "70"], "upper_rate_limit": ["120"]})
+
+
+# -----------------------------
+# Fleet audit tests
+# -----------------------------
+def test_audit_store_checks_every_patient_mode(patient_store):
+    labels, masks = param_batch.audit_store()
+
+    results = {label: param_batch.describe(mask) for label, mask in zip(labels, masks)}
+    assert results == {
+        ("P001", "AOO"): [],
+        ("P001", "AAI"): [("upper_rate_limit", "order"), ("hysteresis", "hysteresis")],
+        ("P002", "VVIR"): [("lower_rate_limit", "increment"), ("activity_threshold", "choice")],
+    }
+    assert param_batch.error_counts(masks)[("upper_rate_limit", "order")] == 1
+    assert param_batch.audit_store("AOO")[0] == [("P001", "AOO")]
+
+
+def test_cli_exit_code(patient_store, capsys):
+    assert param_batch.main([]) == 1
+    assert "Checked 3 parameter set(s), 2 invalid" in capsys.readouterr().out
+    assert param_batch.main(["--mode", "AOO"]) == 0
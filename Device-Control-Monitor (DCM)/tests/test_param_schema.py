@@ -0,0 +1,74 @@
+from helper import param_schema, param_helpers
+
+
+# -----------------------------
+# Validation tests
+# -----------------------------
+def test_valid_aai_parameters_have_no_errors():
+    params = {
+        "lower_rate_limit": "60", "upper_rate_limit": "120",
+        "atrial_amplitude": "3.5", "atrial_pulse_width": "1",
+        "arp": "250", "atrial_sensitivity": "0.5", "pvarp": "250",
+        "hysteresis": "60", "rate_smoothing": "12",
+    }
+    assert param_schema.validate(params) == []
+
+
+def test_lrl_piecewise_increments():
+    for lrl, ok in [("35", True), ("37", False), ("51", True), ("90", True), ("93", False), ("95", True)]:
+        errors = param_schema.validate({"lower_rate_limit": lrl, "upper_rate_limit": "175"})
+        assert (errors == []) == ok, lrl
+
+
+def test_errors_are_structured():
+    errors = param_schema.validate({
+        "lower_rate_limit": "100", "upper_rate_limit": "90",
+        "activity_threshold": "Extreme", "hysteresis": "70",
+    })
+    codes = {(e["key"], e["code"]) for e in errors}
+    assert codes == {
+        ("upper_rate_limit", "order"),
+        ("activity_threshold", "choice"),
+        ("hysteresis", "hysteresis"),
+    }
+    assert param_helpers.check_parameters({"lower_rate_limit": "100", "upper_rate_limit": "90"}) == [
+        "Upper Rate Limit must be higher than Lower Rate Limit."
+    ]
+
+
+def test_missing_rates_are_required():
+    keys = {e["key"] for e in param_schema.validate({})}
+    assert keys == {"lower_rate_limit", "upper_rate_limit"}
+
+
+# -----------------------------
+# Packet encoding tests
+# -----------------------------
+def test_encode_aoo_packet():
+    packet = param_schema.encode_packet("AOO", {
+        "lower_rate_limit": "60", "upper_rate_limit": "120",
+        "atrial_amplitude": "3.5", "atrial_pulse_width": "10",
+        "ventricular_amplitude": "4.0",     # not used by AOO
+        "activity_threshold": "Med",       # not used by AOO
+    })
+    assert list(packet) == [0x16, 0x55, 1, 60, 120, 0, 35, 0, 10, 0, 0, 0, 0, 0, 0, 0, 0, 0]
+
+
+def test_encode_vvir_packet_scaling():
+    packet = param_schema.encode_packet("VVIR", {
+        "lower_rate_limit": "60", "upper_rate_limit": "120", "maximum_sensor_rate": "150",
+        "ventricular_amplitude": "2.3", "ventricular_pulse_width": "5",
+        "ventricular_sensitivity": "0.7", "vrp": "320",
+        "activity_threshold": "High", "reaction_time": "30",
+        "response_factor": "8", "recovery_time": "5",
+    })
+    # 2.3 V -> 23 (not 22 from float truncation), 320 ms -> 32
+    assert list(packet) == [0x16, 0x55, 8, 60, 120, 150, 0, 23, 0, 5, 0, 7, 32, 0, 6, 30, 8, 5]
+
+
+def test_non_finite_numbers_are_not_numbers():
+    errors = param_schema.validate({"lower_rate_limit": "nan", "upper_rate_limit": "120", "hysteresis": "60"})
+    assert [(e["key"], e["code"]) for e in errors] == [
+        ("lower_rate_limit", "range"),
+        ("hysteresis", "hysteresis"),
+    ]
@@ -0,0 +1,81 @@
+import pytest
+from helper import param_schema, param_space
+
+NUMERIC_SPECS = [spec for spec in param_schema.PARAMETER_SCHEMA if "range" in spec]
+
+
+# -----------------------------
+# The enumerated values are exactly what validate() accepts
+# -----------------------------
+@pytest.mark.parametrize("spec", NUMERIC_SPECS, ids=lambda spec: spec["key"])
+def test_legal_values_match_validator(spec):
+    legal = {float(value) for value in param_space.legal_values(spec)}
+    low, high = spec["range"]
+    base = {"lower_rate_limit": "30", "upper_rate_limit": "175"}
+
+    for twentieths in range(int(low * 20) - 40, int(high * 20) + 41):
+        value = f"{twentieths / 20:g}"
+        params = dict(base, **{spec["key"]: value})
+        if spec["key"] == "lower_rate_limit":
+            params["upper_rate_limit"] = "175" if float(value) < 175 else "180"
+        errors = [e for e in param_schema.validate(params) if e["key"] == spec["key"]]
+        assert (not errors) == (float(value) in legal), value
+
+
+def test_space_sizes():
+    # 62 LRL values x 26 URL values, keeping the pairs with URL above LRL
+    assert len(param_space.rate_pairs()) == 1117
+    # AOO: rate pairs x atrial amplitude x atrial pulse width
+    assert param_space.space_size("AOO") == 1117 * 51 * 30
+
+
+# -----------------------------
+# Enumeration order, indexing and sampling
+# -----------------------------
+def test_index_matches_enumeration_order():
+    first = list(param_space.iter_mode("VVI", stop=500))
+    assert first == [param_space.combination_at("VVI", i) for i in range(500)]
+    assert list(param_space.iter_mode("VVI", 200, 300)) == first[200:300]
+
+    size = param_space.space_size("AOO")
+    assert param_space.combination_at("AOO", size - 1) == {
+        "lower_rate_limit": "170", "upper_rate_limit": "175",
+        "atrial_amplitude": "5.0", "atrial_pulse_width": "30",
+    }
+
+
+def test_hysteresis_follows_lrl():
+    for params in param_space.sample_mode("AAIR", 200, seed=3):
+        assert params["hysteresis"] in ("Off", params["lower_rate_limit"])
+        assert float(params["upper_rate_limit"]) > float(params["lower_rate_limit"])
+
+
+# -----------------------------
+# Properties: accepted and packet round trip
+# -----------------------------
+@pytest.mark.parametrize("mode", param_schema.MODES)
+def test_sampled_combinations_are_valid_and_round_trip(mode):
+    checked, failures, _ = param_space.run_checks(mode, count=2000, workers=1, seed=7)
+    assert checked == 2000
+    assert failures == []
+
+
+def test_exhaustive_prefix_in_process_pool():
+    checked, failures, _ = param_space.run_checks("VOO", count=45000, exhaustive=True, workers=2)
+    assert checked == 45000
+    assert failures == []
+
+
+def test_neighbours_of_legal_values_are_rejected():
+    for params in param_space.sample_mode("VVIR", 50, seed=11):
+        for key in ("ventricular_amplitude", "vrp", "response_factor"):
+            low, high = param_schema.SCHEMA_BY_KEY[key]["range"]
+            for bad in (low - 1, high + 1, float(params[key]) + 0.05):
+                assert param_schema.validate(dict(params, **{key: str(bad)}))
+
+
+def test_decode_rejects_bad_packets():
+    with pytest.raises(ValueError):
+        param_schema.decode_packet(bytes(18))
+    with pytest.raises(ValueError):
+        param_schema.decode_packet(bytes([0x16, 0x55, 1]))
@@ -0,0 +1,53 @@
+import pytest
+from helper.patient_index import PatientIndex
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+@pytest.fixture
+def index():
+    return PatientIndex([
+        {"id": "P001", "name": "Johnathan", "device": {"model": "Dr1", "serial": "Abc123"}},
+        {"id": "P002", "name": "Joan", "device": {"model": "Sr2", "serial": "Xyz789"}},
+        {"id": "P003", "name": "Maria", "device": {"model": "Dr1", "serial": "Qrs456"}},
+    ])
+
+
+def names(index, ordinals):
+    return [index.get(o)["name"] for o in ordinals]
+
+
+# -----------------------------
+# Search tests
+# -----------------------------
+def test_empty_query_lists_everyone_in_order(index):
+    assert names(index, index.search("")) == ["Johnathan", "Joan", "Maria"]
+
+
+def test_prefix_search_over_all_fields(index):
+    assert names(index, index.search("jo")) == ["Johnathan", "Joan"]
+    assert names(index, index.search("p003")) == ["Maria"]
+    assert names(index, index.search("DR1")) == ["Johnathan", "Maria"]
+    assert names(index, index.search("xyz")) == ["Joan"]
+
+
+def test_multiple_terms_must_all_match(index):
+    assert names(index, index.search("dr1 ma")) == ["Maria"]
+
+
+def test_fuzzy_fallback_tolerates_typos(index):
+    assert names(index, index.search("jonathan"))[0] == "Johnathan"
+    assert index.search("zzzz") == []
+
+
+def test_upsert_and_remove(index):
+    index.upsert({"id": "P002", "name": "Mario", "device": {}})
+    assert names(index, index.search("jo")) == ["Johnathan"]
+    assert names(index, index.search("mar")) == ["Maria", "Mario"]
+
+    index.search("marioo")   # builds the trigram postings
+    index.remove("P003")
+    assert names(index, index.search("mar")) == ["Mario"]
+    assert names(index, index.search("marjo")) == ["Mario"]
+    assert len(index) == 2
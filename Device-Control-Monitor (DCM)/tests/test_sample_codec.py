@@ -0,0 +1,124 @@
+import json
+import numpy as np
+from egram import sample_codec
+from egram.egram_utils import parse_egram_packet
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def device_samples(n, seed=0):
+    # what parse_egram_packet produces: int8 counts / 10, stamped every 2 ms
+    counts = np.random.default_rng(seed).integers(-128, 128, n)
+    return np.arange(n, dtype=np.int64) * 2, counts / 10.0
+
+
+# -----------------------------
+# Varints / zigzag
+# -----------------------------
+def test_varints_round_trip_large_and_negative_values():
+    values = np.array([0, 1, -1, 63, -64, 127, 128, 2 ** 31, -2 ** 40, 2 ** 62], dtype=np.int64)
+    encoded = sample_codec.encode_varints(sample_codec.zigzag(values))
+    assert sample_codec.unzigzag(sample_codec.decode_varints(encoded)).tolist() == values.tolist()
+    assert sample_codec.encode_varints(sample_codec.zigzag(np.array([0, 2, -2]))) == b"\x00\x04\x03"
+
+
+# -----------------------------
+# Chunks
+# -----------------------------
+def test_device_values_are_stored_as_int8_counts():
+    packet = bytes([0xAA, 0x22] + [0] * 16 + [0xF3, 0x7F])
+    parsed = parse_egram_packet(packet, debug=False)
+    values = [parsed["ventricular"][0]["value"], parsed["atrial"][0]["value"], -12.8]
+
+    chunk = sample_codec.encode_chunk([0, 2, 5], values)
+    encoding, count, t_first, t_last, length = sample_codec.CHUNK.unpack_from(chunk)
+    assert (encoding, count, t_first, t_last) == (sample_codec.INT8, 3, 0, 5)
+
+    t, decoded = sample_codec.decode_chunk(encoding, count, t_first, chunk[sample_codec.CHUNK.size:])
+    assert t.tolist() == [0, 2, 5]
+    assert decoded.tolist() == values == [-1.3, 12.7, -12.8]
+
+
+def test_other_values_fall_back_to_float64_per_chunk(tmp_path):
+    path = tmp_path / "atrial.egz"
+    t = np.arange(10)
+    values = np.r_[np.arange(5) / 10.0, [0.25, np.nan, 40.0, -30.0, 1.5]]
+    sample_codec.write_channel(path, t, values, chunk_samples=5)
+
+    encodings = []
+    with open(path, "rb") as f:
+        for offset in sample_codec.read_index(path)["offset"]:
+            f.seek(offset)
+            encodings.append(sample_codec.CHUNK.unpack(f.read(sample_codec.CHUNK.size))[0])
+    assert encodings == [sample_codec.INT8, sample_codec.FLOAT64]
+
+    t_out, values_out = sample_codec.read_channel(path)
+    assert t_out.tolist() == t.tolist()
+    assert np.array_equal(values_out, values, equal_nan=True)
+
+
+# -----------------------------
+# Footprint
+# -----------------------------
+def test_long_recording_is_much_smaller_than_json(tmp_path):
+    t, values = device_samples(100_000)
+    path = sample_codec.write_channel(tmp_path / "ventricular.egz", t, values)
+
+    as_json = len(json.dumps([{"t": int(a), "value": float(b)} for a, b in zip(t, values)], indent=4))
+    assert as_json / path.stat().st_size > 20
+
+    t_out, values_out = sample_codec.read_channel(path)
+    assert np.array_equal(t_out, t) and np.array_equal(values_out, values)
+
+
+# -----------------------------
+# Time-range reads
+# -----------------------------
+def test_range_reads_decode_only_overlapping_chunks(tmp_path, monkeypatch):
+    t, values = device_samples(10_000)
+    path = sample_codec.write_channel(tmp_path / "atrial.egz", t, values, chunk_samples=1000)
+
+    decoded = []
+    original = sample_codec.decode_chunk
+    monkeypatch.setattr(sample_codec, "decode_chunk", lambda *args: decoded.append(args[2]) or original(*args))
+
+    t_out, values_out = sample_codec.read_range(path, 4990, 5010)
+    assert t_out.tolist() == list(range(4990, 5010, 2))
+    assert np.array_equal(values_out, values[2495:2505])
+    assert decoded == [4000]
+
+    decoded.clear()
+    assert [len(c) for c, _ in sample_codec.iter_range(path, 3998, 6002)] == [1, 1000, 1]
+    assert sample_codec.read_range(path, 30_000, 40_000)[0].size == 0
+    assert sample_codec.read_range(path, None, 4)[0].tolist() == [0, 2]
+
+
+def test_range_reads_filter_timestamps_that_go_back(tmp_path):
+    # old recordings restart t at 0 every 20 samples
+    t = np.tile(np.arange(0, 40, 2), 300)
+    values = np.arange(len(t)) % 256 / 10.0 - 12.8
+    path = sample_codec.write_channel(tmp_path / "atrial.egz", t, values, chunk_samples=1000)
+    assert not sample_codec.read_index(path)["sorted"]
+
+    t_out, values_out = sample_codec.read_range(path, 10, 20)
+    inside = (t >= 10) & (t < 20)
+    assert t_out.tolist() == t[inside].tolist()
+    assert np.allclose(values_out, values[inside])
+    assert sample_codec.read_range(path, 40, None)[0].size == 0
+
+
+def test_files_without_an_index_are_indexed_by_walking_chunks(tmp_path):
+    t, values = device_samples(2500)
+    path = sample_codec.write_channel(tmp_path / "atrial.egz", t, values, chunk_samples=1000)
+    index = sample_codec.read_index(path)
+
+    # files written before the index existed end right after the last chunk
+    data = path.read_bytes()
+    index_offset, _, _ = sample_codec.TRAILER.unpack(data[-sample_codec.TRAILER.size:])
+    path.write_bytes(data[:index_offset])
+
+    walked = sample_codec.read_index(path)
+    assert walked["offset"].tolist() == index["offset"].tolist()
+    assert walked["t_first"].tolist() == [0, 2000, 4000]
+    assert np.array_equal(sample_codec.read_range(path, 1990, 2004)[1], values[995:1002])
@@ -0,0 +1,125 @@
+import os
+import numpy as np
+import pytest
+from egram import egram_storage, sample_codec, session_segments
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+@pytest.fixture
+def egram_file(tmp_path, monkeypatch):
+    path = tmp_path / "egram.json"
+    monkeypatch.setattr(egram_storage, "EGRAM_FILE", str(path))
+    return path
+
+
+def samples(t_start, t_end):
+    return [{"t": t, "value": (t % 256 - 128) / 10} for t in range(t_start, t_end, 2)]
+
+
+def restart(directory):
+    # what a new DCM process knows about the session: nothing
+    for key in [key for key in session_segments._open if key[0] == directory]:
+        del session_segments._open[key]
+
+
+# -----------------------------
+# Rotation
+# -----------------------------
+def test_segments_rotate_and_seal_without_touching_the_json(egram_file, monkeypatch):
+    sid = egram_storage.create_session("P001", {})["session_id"]
+    directory = egram_storage.session_dir(sid)
+    egram_storage.add_samples(sid, "ventricular", samples(0, 1000))
+
+    # later batches go to the segment files only
+    def no_update(*args):
+        raise AssertionError("egram.json rewritten")
+    monkeypatch.setattr(egram_storage, "update_session", no_update)
+    for start in range(1000, 210_000, 1000):
+        egram_storage.add_samples(sid, "ventricular", samples(start, start + 1000))
+
+    sealed = session_segments.read_manifest(directory, "ventricular")
+    assert [entry["segment"] for entry in sealed] == [0, 1, 2]
+    assert all(entry["count"] == 30_000 for entry in sealed)
+    assert [n for n, _ in session_segments.open_segments(directory, "ventricular")] == [3]
+    assert os.path.exists(session_segments.segment_file(directory, "ventricular", 1, ".egz"))
+    assert session_segments.count(directory, "ventricular") == 105_000
+
+    # a range across a segment boundary, half sealed and half still open
+    window = egram_storage.get_samples(sid, "ventricular", 179_990, 180_010)
+    assert window["t"].tolist() == list(range(179_990, 180_010, 2))
+    assert window["value"].tolist() == [(t % 256 - 128) / 10 for t in range(179_990, 180_010, 2)]
+    assert egram_storage.get_or_start_session("P001").channels["ventricular"]["count"] == 105_000
+
+
+def test_recovery_repairs_a_crash_during_a_seal(egram_file):
+    sid = egram_storage.create_session("P001", {})["session_id"]
+    directory = egram_storage.session_dir(sid)
+    egram_storage.add_samples(sid, "atrial", samples(0, 61_000))
+
+    # crash: segment 1 sealed but its .open file not removed yet, then a torn
+    # manifest line and half a record at the end of the next segment
+    sealed_open = session_segments.segment_file(directory, "atrial", 1, ".open")
+    with open(sealed_open, "rb") as f:
+        records = f.read()
+    session_segments.seal(directory, "atrial", 1)
+    with open(sealed_open, "wb") as f:
+        f.write(records)
+    with open(session_segments.manifest_file(directory), "a") as f:
+        f.write('{"channel": "atr')
+    current = session_segments.segment_file(directory, "atrial", 2, ".open")
+    with open(current, "wb") as f:
+        f.write(np.array([(120_000, 1.0)], dtype=session_segments.RECORD).tobytes() + b"\1\2\3")
+    restart(directory)
+
+    egram_storage.add_samples(sid, "atrial", [{"t": 120_002, "value": 2.0}])
+    assert not os.path.exists(sealed_open)
+    assert [entry["segment"] for entry in session_segments.read_manifest(directory, "atrial")] == [0, 1]
+    tail = egram_storage.get_samples(sid, "atrial", 60_998)
+    assert tail["t"].tolist() == [60_998, 120_000, 120_002]
+    assert tail["value"].tolist() == [(60_998 % 256 - 128) / 10, 1.0, 2.0]
+
+
+# -----------------------------
+# Finishing
+# -----------------------------
+def test_finish_joins_the_sealed_segments_into_one_file(egram_file):
+    sid = egram_storage.create_session("P001", {})["session_id"]
+    directory = egram_storage.session_dir(sid)
+    egram_storage.add_samples(sid, "atrial", samples(0, 150_000) + [{"t": 150_000, "value": None}])
+    chunks = sum(len(sample_codec.read_index(os.path.join(session_segments.segments_dir(directory), entry["file"]))["offset"])
+                 for entry in session_segments.read_manifest(directory, "atrial"))
+    egram_storage.finish_session(sid)
+
+    assert not os.path.exists(session_segments.segments_dir(directory))
+    raw = egram_storage.load_sessions()["egram_sessions"][0]["channels"]["atrial"]
+    assert raw["storage"] == "compressed" and raw["count"] == 75_001 and raw["samples"] == []
+
+    path = egram_storage.channel_file(sid, "atrial")
+    # the sealed chunks are copied as they are, only the open segment is encoded
+    assert len(sample_codec.read_index(path)["offset"]) == chunks + -(-15_001 // sample_codec.CHUNK_SAMPLES)
+    t, values = sample_codec.read_channel(path)
+    assert t.tolist() == list(range(0, 150_002, 2))
+    assert np.isnan(values[-1]) and values[1] == (2 % 256 - 128) / 10
+
+
+def test_markers_are_logged_while_recording_and_folded_in_at_finish(egram_file, monkeypatch):
+    session = egram_storage.get_or_start_session("P001")
+    beats = [{"abbr": "R", "timestamp_ms": t, "source": "detector"} for t in range(0, 5000, 800)]
+
+    def no_update(*args):
+        raise AssertionError("egram.json rewritten")
+    with monkeypatch.context() as m:
+        m.setattr(egram_storage, "update_session", no_update)
+        session.add_markers(beats[:3])
+        session.add_markers(beats[3:])
+    with open(session_segments.markers_file(egram_storage.session_dir(session.session_id)), "a") as f:
+        f.write('{"abbr": "R", "timest')     # torn by a crash
+    session_segments._marker_logs.clear()
+    session.add_markers([{"abbr": "R", "timestamp_ms": 5600, "source": "detector"}])
+
+    assert egram_storage.read_session_meta(session.session_id)["markers"] == []
+    assert [m["timestamp_ms"] for m in session.refresh().markers] == list(range(0, 6400, 800))
+    session.finish()
+    assert [m["timestamp_ms"] for m in egram_storage.get_session(session.session_id)["markers"]] == list(range(0, 6400, 800))
@@ -0,0 +1,99 @@
+import os
+import numpy as np
+import pytest
+from egram import column_store, egram_storage, session_tiers
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+@pytest.fixture
+def egram_file(tmp_path, monkeypatch):
+    path = tmp_path / "egram.json"
+    monkeypatch.setattr(egram_storage, "EGRAM_FILE", str(path))
+    return path
+
+
+@pytest.fixture
+def finished_session(egram_file):
+    # 60 s at 500 Hz, flat 0.5 mV with a one-sample 12.7 mV pacing spike every second
+    t = np.arange(0, 60_000, 2)
+    values = np.full(len(t), 0.5)
+    values[t % 1000 == 250] = 12.7
+    sid = egram_storage.create_session("P001", {})["session_id"]
+    egram_storage.add_samples(sid, "ventricular", [{"t": int(a), "value": float(b)} for a, b in zip(t, values)])
+    egram_storage.finish_session(sid)
+    session_tiers.wait(sid)
+    return sid
+
+
+# -----------------------------
+# Building
+# -----------------------------
+def test_build_tier_keeps_extremes_and_skips_gaps():
+    t = np.array([0, 2, 4, 10, 12, 35])
+    values = np.array([1.0, 5.0, np.nan, -2.0, np.nan, 3.0])
+    tier = session_tiers.build_tier(t, values, 10)
+
+    assert tier["t"].tolist() == [0, 10, 30]
+    assert tier["min"].tolist() == [1.0, -2.0, 3.0]
+    assert tier["max"].tolist() == [5.0, -2.0, 3.0]
+    assert tier["mean"].tolist() == [3.0, -2.0, 3.0]
+
+
+def test_finish_builds_every_tier_and_spikes_survive(finished_session):
+    for bucket_ms in session_tiers.TIERS_MS:
+        overview = session_tiers.get_overview(finished_session, "ventricular", 0, 60_000, 60_000 // bucket_ms)
+        assert overview["tier"] == bucket_ms
+        assert isinstance(overview["t"], np.memmap)
+        assert len(overview["t"]) == 60_000 // bucket_ms
+        assert overview["max"].max() == pytest.approx(12.7)
+        assert overview["min"].min() == pytest.approx(0.5)
+
+
+def test_tiers_are_built_chunk_by_chunk_and_match_a_whole_channel_build(egram_file, monkeypatch):
+    t = np.arange(0, 60_000, 2)
+    values = np.round(np.sin(t / 37.0) * 5, 1)
+    values[::11] = np.nan
+    sid = egram_storage.create_session("P001", {})["session_id"]
+    egram_storage.add_samples(sid, "atrial", [{"t": int(a), "value": None if b != b else float(b)} for a, b in zip(t, values)])
+    egram_storage.finish_session(sid)
+    session_tiers.wait(sid)
+
+    def read_all(*args):
+        raise AssertionError("whole channel read")
+    monkeypatch.setattr(egram_storage, "read_channel_file", read_all)
+    session_tiers.build_session_tiers(sid)
+
+    # 4096-sample chunks end mid-bucket; those buckets are merged exactly
+    for bucket_ms in session_tiers.TIERS_MS:
+        columns, _ = column_store.open_columns(session_tiers.tier_file(sid, "atrial", bucket_ms))
+        expected = session_tiers.build_tier(t, values, bucket_ms)
+        assert columns["t"].tolist() == expected["t"].tolist()
+        for name in ("min", "max", "mean"):
+            assert np.allclose(columns[name], expected[name], atol=1e-3)
+
+
+# -----------------------------
+# Choosing a tier
+# -----------------------------
+def test_view_picks_the_coarsest_tier_that_fits_the_pixels(finished_session):
+    assert session_tiers.pick_tier(0, 60_000, 800) == 10
+    assert session_tiers.pick_tier(0, 3_600_000, 800) == 1000
+    assert session_tiers.pick_tier(0, 36_000_000, 800) == 10000
+    assert session_tiers.pick_tier(0, 2000, 800) == 0
+
+    overview = session_tiers.get_overview(finished_session, "ventricular", 10_005, 20_000, 90)
+    assert overview["tier"] == 100
+    assert overview["t"][0] == 10_000 and overview["t"][-1] == 19_900
+
+    raw = session_tiers.get_overview(finished_session, "ventricular", 1000, 1010, 800)
+    assert raw["tier"] == 0 and raw["t"].tolist() == [1000, 1002, 1004, 1006, 1008]
+
+
+def test_missing_tiers_are_computed_from_the_samples(finished_session):
+    os.remove(session_tiers.tier_file(finished_session, "ventricular", 1000))
+
+    overview = session_tiers.get_overview(finished_session, "ventricular", 0, 60_000, 50)
+    assert overview["tier"] == 1000
+    assert len(overview["t"]) == 60 and np.allclose(overview["max"], 12.7)
@@ -0,0 +1,43 @@
+import os
+import subprocess
+import sys
+
+DCM_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# cumulative import time of main.py (matplotlib alone used to be ~1 s of it)
+IMPORT_BUDGET_MS = 250
+
+DEFERRED_MODULES = ["matplotlib", "serial", "numpy", "gui.egram_screen", "gui.dashboard"]
+
+
+# -----------------------------
+# Helpers
+# -----------------------------
+def import_times(module):
+    # {module name: cumulative microseconds} from python -X importtime
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True, cwd=DCM_DIR,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+# -----------------------------
+# Startup budget tests
+# -----------------------------
+def test_main_defers_heavy_imports():
+    times = import_times("main")
+    assert [name for name in DEFERRED_MODULES if name in times] == []
+
+
+def test_main_import_budget():
+    # best of three to keep a cold disk cache from failing the test
+    best = min(import_times("main")["main"] for _ in range(3))
+    assert best / 1000 < IMPORT_BUDGET_MS
@@ -0,0 +1,91 @@
+import threading
+import time
+from gui.task_executor import TaskExecutor
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+# stand-ins for the Tk pieces the executor uses: after() and config(state=...)
+class FakeLoop:
+    def __init__(self):
+        self.callbacks = []
+
+    def after(self, ms, callback):
+        self.callbacks.append(callback)
+
+    def run_until_idle(self, timeout=5):
+        deadline = time.monotonic() + timeout
+        while self.callbacks and time.monotonic() < deadline:
+            self.callbacks.pop(0)()
+            time.sleep(0.005)
+
+
+class FakeButton:
+    def __init__(self):
+        self.state = "normal"
+
+    def config(self, state):
+        self.state = state
+
+
+# -----------------------------
+# Executor tests
+# -----------------------------
+def test_results_are_delivered_on_the_main_thread():
+    loop = FakeLoop()
+    tasks = TaskExecutor(loop)
+    seen = {}
+
+    def done(value):
+        seen["value"] = value
+        seen["thread"] = threading.current_thread()
+
+    tasks.submit("Work", lambda: threading.current_thread().name, on_done=done)
+    loop.run_until_idle()
+
+    assert seen["value"].startswith("dcm-task")
+    assert seen["thread"] is threading.main_thread()
+    assert not tasks.is_busy()
+    tasks.shutdown()
+
+
+def test_errors_go_to_on_error():
+    loop = FakeLoop()
+    tasks = TaskExecutor(loop)
+    errors = []
+
+    def fail():
+        raise IOError("disk gone")
+
+    tasks.submit("Save Patient", fail, on_done=lambda value: errors.append("done"), on_error=errors.append)
+    loop.run_until_idle()
+
+    assert len(errors) == 1 and str(errors[0]) == "disk gone"
+    tasks.shutdown()
+
+
+def test_buttons_disabled_until_every_task_finishes():
+    loop = FakeLoop()
+    busy = []
+    tasks = TaskExecutor(loop, on_busy=busy.append)
+    save, connect = FakeButton(), FakeButton()
+    release = threading.Event()
+
+    assert tasks.submit("Save Patient", release.wait, disable=[save, connect])
+    assert not tasks.submit("Save Patient", release.wait)    # already running
+    assert tasks.submit("Connect", lambda: True, disable=[connect])
+    assert save.state == "disabled" and connect.state == "disabled"
+
+    # Connect finishes first, the save still holds both buttons
+    # (the save keeps running, so the poll keeps rescheduling itself)
+    while tasks.is_busy("Connect"):
+        loop.callbacks.pop(0)()
+        time.sleep(0.005)
+    assert connect.state == "disabled"
+
+    release.set()
+    loop.run_until_idle()
+    assert save.state == "normal" and connect.state == "normal"
+    assert busy[0] == ["Save Patient"] and busy[-1] == []
+    tasks.shutdown()
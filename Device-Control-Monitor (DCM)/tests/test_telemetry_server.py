@@ -0,0 +1,123 @@
+import socket
+import sys
+import threading
+import time
+import pytest
+from egram import telemetry_server as ts
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+@pytest.fixture
+def server():
+    srv = ts.TelemetryServer(port=0)
+    srv.start()
+    yield srv
+    srv.stop()
+
+
+def connect(srv, count=1):
+    clients = [socket.create_connection((srv.host, srv.port), timeout=2) for _ in range(count)]
+    deadline = time.monotonic() + 2
+    while len(srv.subscribers) < count and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return clients
+
+
+def read_frames(sock, count):
+    frames, buffer = [], b""
+    while len(frames) < count:
+        chunk = sock.recv(65536)
+        assert chunk, "server closed the connection"
+        new, buffer = ts.decode_frames(buffer + chunk)
+        frames.extend(new)
+    return frames
+
+
+# -----------------------------
+# Framing tests
+# -----------------------------
+def test_samples_frame_round_trip_and_partial_reads():
+    samples = [{"t": 0, "value": 2.5}, {"t": 2, "value": -1.25}]
+    data = ts.encode_frame(ts.SAMPLES, 7, ts.encode_samples("ventricular", samples))
+    data += ts.encode_frame(ts.MARKER, 8, b'{"abbr": "VP"}')
+
+    frames, rest = ts.decode_frames(data[:-3])
+    assert frames == [(ts.SAMPLES, 7, {"channel": "ventricular", "samples": samples})]
+    frames, rest = ts.decode_frames(rest + data[-3:])
+    assert frames == [(ts.MARKER, 8, {"abbr": "VP"})] and rest == b""
+
+    with pytest.raises(ValueError):
+        ts.decode_frames(b"XX" + data[2:])
+
+
+# -----------------------------
+# Fan-out tests (loopback clients)
+# -----------------------------
+def test_every_subscriber_gets_every_frame(server):
+    clients = connect(server, 2)
+    server.publish_payload({
+        "atrial": [{"t": 10, "value": 0.5}],
+        "ventricular": [{"t": 10, "value": 3.0}],
+        "markers": [{"abbr": "AS", "t": 10}],
+    })
+
+    for client in clients:
+        frames = read_frames(client, 3)
+        assert [seq for _, seq, _ in frames] == [1, 2, 3]
+        assert frames[0][2] == {"channel": "atrial", "samples": [{"t": 10, "value": 0.5}]}
+        assert frames[2] == (ts.MARKER, 3, {"abbr": "AS", "t": 10})
+        client.close()
+
+
+def test_disconnected_subscriber_is_removed(server):
+    (client,) = connect(server)
+    client.close()
+    deadline = time.monotonic() + 2
+    while server.subscribers and time.monotonic() < deadline:
+        server.publish_status("connected")
+        time.sleep(0.01)
+    assert server.subscribers == []
+
+
+def test_slow_subscriber_drops_oldest_frames():
+    left, right = socket.socketpair()
+    subscriber = ts.Subscriber(left, ("local", 0), queue_frames=3)
+
+    for seq in range(1, 11):
+        subscriber.offer(ts.encode_frame(ts.STATUS, seq, b"{}"))
+
+    assert subscriber.dropped == 7
+    frames, _ = ts.decode_frames(b"".join(subscriber.queue))
+    assert [seq for _, seq, _ in frames] == [8, 9, 10]
+    left.close()
+    right.close()
+
+
+def test_frames_are_queued_in_seq_order_across_publishing_threads():
+    srv = ts.TelemetryServer(port=0)
+    left, right = socket.socketpair()
+    subscriber = ts.Subscriber(left, ("local", 0), queue_frames=20000)
+    srv.subscribers.append(subscriber)
+
+    def publish():
+        for _ in range(2000):
+            srv.publish_status("connected")
+
+    # switch threads as often as possible so the publishers interleave
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=publish) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(interval)
+
+    frames, _ = ts.decode_frames(b"".join(subscriber.queue))
+    assert [seq for _, seq, _ in frames] == list(range(1, 16001))
+    left.close()
+    right.close()
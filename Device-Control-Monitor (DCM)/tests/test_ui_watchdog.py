@@ -0,0 +1,94 @@
+import json
+import time
+import pytest
+from helper import metrics
+from gui.ui_watchdog import UIWatchdog
+
+
+# -----------------------------
+# Fixtures
+# -----------------------------
+# minimal stand-in for the Tk loop: after() callbacks run from run_for()
+class FakeLoop:
+    def __init__(self):
+        self.pending = []
+
+    def after(self, ms, callback):
+        self.pending.append((time.perf_counter() + ms / 1000, callback))
+        return len(self.pending)
+
+    def after_cancel(self, after_id):
+        self.pending.clear()
+
+    def run_for(self, seconds, work=None):
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            due = [item for item in self.pending if item[0] <= time.perf_counter()]
+            for item in due:
+                self.pending.remove(item)
+                item[1]()
+            if work:
+                work()
+                work = None
+            time.sleep(0.002)
+
+
+@pytest.fixture(autouse=True)
+def clean_metrics():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+def blocking_call():
+    time.sleep(0.4)
+
+
+# -----------------------------
+# Metrics tests
+# -----------------------------
+def test_histogram_and_export(tmp_path):
+    for value in (3, 30, 30, 700):
+        metrics.observe("save_ms", value)
+    metrics.increment("saves", 4)
+    metrics.record_event("slow_save", {"ms": 700})
+
+    path = metrics.write_export(tmp_path / "metrics.json")
+    data = json.loads(path.read_text())
+
+    hist = data["histograms"]["save_ms"]
+    assert hist["count"] == 4 and hist["max"] == 700 and hist["sum"] == 763
+    assert dict(zip(hist["buckets"], hist["counts"]))[5] == 1
+    assert dict(zip(hist["buckets"], hist["counts"]))[50] == 2
+    assert dict(zip(hist["buckets"], hist["counts"]))[1000] == 1
+    assert data["counters"] == {"saves": 4}
+    assert data["events"]["slow_save"][0]["ms"] == 700
+
+
+# -----------------------------
+# Watchdog tests
+# -----------------------------
+def test_quiet_loop_has_no_stalls():
+    loop = FakeLoop()
+    watchdog = UIWatchdog(loop, interval_ms=20, stall_ms=150, sample_ms=10)
+    watchdog.start()
+    loop.run_for(0.3)
+    watchdog.stop()
+
+    data = metrics.export()
+    assert data["histograms"]["ui.heartbeat_late_ms"]["count"] >= 5
+    assert "ui.stalls" not in data["counters"]
+
+
+def test_stall_is_measured_and_its_stack_captured():
+    loop = FakeLoop()
+    watchdog = UIWatchdog(loop, interval_ms=20, stall_ms=150, sample_ms=10)
+    watchdog.start()
+    loop.run_for(0.6, work=blocking_call)
+    watchdog.stop()
+
+    data = metrics.export()
+    assert data["counters"]["ui.stalls"] == 1
+    assert data["histograms"]["ui.stall_ms"]["max"] >= 300
+    stall = data["events"]["ui.stall"][0]
+    assert any("blocking_call" in line for line in stall["stack"])